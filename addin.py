@@ -1,20 +1,70 @@
-import win32com.client
+import time
+_import_started = time.perf_counter()
+
 import sys
 import os
-from win32com.client import constants
-import pythoncom
-import pandas as pd
 import traceback
 import logging
 import tempfile
 from datetime import datetime
 
-# Set up logging
+# Outlook times how long each add-in takes to load and disables slow ones.
+# Everything on the load path (module import, OnConnection, GetCustomUI) is
+# kept to the standard library: pandas and the export modules are imported on
+# the first button click, and the log file is only opened once Outlook has
+# finished starting up. Load timings are kept in memory until then, or
+# logged from OnConnection when the add-in is connected after startup.
+
 log_dir = os.path.join(os.path.expanduser("~"), "AppData", "Local", "OutlookContactExporter")
-os.makedirs(log_dir, exist_ok=True)
 log_file = os.path.join(log_dir, "addin_log.txt")
-logging.basicConfig(filename=log_file, level=logging.INFO, 
-                    format='%(asctime)s - %(levelname)s - %(message)s')
+
+RIBBON_XML = '''
+        <customUI xmlns="http://schemas.microsoft.com/office/2006/01/customui">
+            <ribbon>
+                <tabs>
+                    <tab id="CustomTab" label="Contact Tools">
+                        <group id="ContactGroup" label="Contact Management">
+                            <button id="ExportButton" 
+                                    label="Save Contacts" 
+                                    size="large" 
+                                    imageMso="ExportToExcel" 
+                                    onAction="OnButtonClick" />
+                        </group>
+                    </tab>
+                </tabs>
+            </ribbon>
+        </customUI>
+        '''
+
+_logging_ready = False
+
+VK_SHIFT, VK_CONTROL, VK_MENU = 0x10, 0x11, 0x12
+
+# ext_ConnectMode values passed to OnConnection
+EXT_CM_AFTER_STARTUP, EXT_CM_STARTUP = 0, 1
+
+# Hidden switch: Ctrl+Shift+click on "Save Contacts" profiles the export
+# (run_profile.py), Ctrl+Shift+Alt+click with the deterministic profiler.
+# Returns the profiling mode, or None for a normal click.
+def profile_mode_for_click():
+    try:
+        import ctypes
+        pressed = lambda key: bool(ctypes.windll.user32.GetKeyState(key) & 0x8000)
+        if not (pressed(VK_CONTROL) and pressed(VK_SHIFT)):
+            return None
+        return "deterministic" if pressed(VK_MENU) else "sampling"
+    except Exception:
+        return None
+
+# Set up logging
+def setup_logging():
+    global _logging_ready
+    if _logging_ready:
+        return
+    from run_log import setup_logging as setup_queue_logging
+    os.makedirs(log_dir, exist_ok=True)
+    setup_queue_logging(log_file)
+    _logging_ready = True
 
 class OutlookAddin:
     _reg_clsid_ = '{E3FF6600-B388-4FCA-9CFA-3A3AAF35726E}'  # Generate a unique GUID
@@ -26,18 +76,30 @@ class OutlookAddin:
     def __init__(self):
         self.application = None
         self.addin_module = None
-        logging.info("Add-in initialized")
+        self.ribbon_id = None
+        # Milliseconds spent in each step of the load path, logged later
+        self.load_timings = {"import": IMPORT_SECONDS * 1000}
 
     def OnConnection(self, application, connectMode, addin, custom):
+        started = time.perf_counter()
         try:
             self.application = application
             self.addin_module = addin
-            logging.info("Connected to Outlook")
         except Exception as e:
+            setup_logging()
             logging.error(f"Error in OnConnection: {e}")
             logging.error(traceback.format_exc())
+        self.load_timings["OnConnection"] = (time.perf_counter() - started) * 1000
+
+        # Enabled from the COM Add-ins dialog or otherwise connected after
+        # startup: OnStartupComplete will not fire, and Outlook is not timing
+        # its startup, so the timings are logged now
+        if connectMode != EXT_CM_STARTUP:
+            setup_logging()
+            self.log_load_timings()
 
     def OnDisconnection(self, Mode, custom):
+        setup_logging()
         try:
             self.application = None
             self.addin_module = None
@@ -46,43 +108,45 @@ class OutlookAddin:
             logging.error(f"Error in OnDisconnection: {e}")
 
     def OnAddInsUpdate(self, custom):
+        setup_logging()
         logging.info("Add-ins updated")
         pass
 
     def OnStartupComplete(self, custom):
+        # Outlook has stopped timing add-ins by now
+        setup_logging()
         logging.info("Outlook startup complete")
-        pass
+        self.log_load_timings()
+
+    def log_load_timings(self):
+        timings = ", ".join(f"{step} {ms:.1f}ms" for step, ms in self.load_timings.items())
+        ribbon = f" (ribbon {self.ribbon_id})" if self.ribbon_id else ""
+        logging.info(f"Add-in load timing{ribbon}: {timings}, "
+                     f"total {sum(self.load_timings.values()):.1f}ms")
 
     def OnBeginShutdown(self, custom):
+        setup_logging()
         logging.info("Outlook shutdown initiated")
         pass
 
     def GetCustomUI(self, ribbon_id):
-        logging.info(f"GetCustomUI called with ribbon_id: {ribbon_id}")
-        # Define the ribbon XML
-        return '''
-        <customUI xmlns="http://schemas.microsoft.com/office/2006/01/customui">
-            <ribbon>
-                <tabs>
-                    <tab id="CustomTab" label="Contact Tools">
-                        <group id="ContactGroup" label="Contact Management">
-                            <button id="ExportButton" 
-                                    label="Save Contacts" 
-                                    size="large" 
-                                    imageMso="ExportToExcel" 
-                                    onAction="OnButtonClick" />
-                        </group>
-                    </tab>
-                </tabs>
-            </ribbon>
-        </customUI>
-        '''
+        started = time.perf_counter()
+        self.ribbon_id = ribbon_id
+        ribbon_xml = RIBBON_XML
+        self.load_timings["GetCustomUI"] = (time.perf_counter() - started) * 1000
+        return ribbon_xml
 
     def OnButtonClick(self, control):
         # This function will be called when the button is clicked
         try:
+            setup_logging()
             logging.info("Save Contacts button clicked")
-            self.extract_sent_contacts()
+            mode = profile_mode_for_click()
+            if mode:
+                from run_profile import profiled
+                profiled("outlook_contacts", self.extract_sent_contacts, mode=mode)
+            else:
+                self.extract_sent_contacts()
             # Make sure the active explorer is displayed
             try:
                 if self.application.ActiveExplorer():
@@ -107,10 +171,19 @@ class OutlookAddin:
     def extract_sent_contacts(self):
         try:
             # Get the Outlook namespace
-            outlook = self.application.GetNamespace("MAPI")
+            # Busy and throttling errors are retried by the call scheduler
+            from com_scheduler import SCHEDULER, format_scheduler_stats
+            outlook = SCHEDULER.wrap(self.application.GetNamespace("MAPI"))
+            calls_before = SCHEDULER.stats()
             
             # Initialize contacts list and try to get Sent Items folder
             contacts = []
+            # Per-item failures are counted, not logged one by one
+            from run_log import ErrorCounter
+            from scan_memory import MemoryMonitor, iter_items
+            errors = ErrorCounter()
+            # Memory is sampled and logged per folder
+            memory = MemoryMonitor()
             
             # Try multiple approaches to get the sent folder
             sent_folder = None
@@ -135,7 +208,10 @@ class OutlookAddin:
             
             # Process each email in the Sent Items folder
             processed_count = 0
-            for item in sent_folder.Items:
+            memory.start_folder("Sent Items")
+            # One item at a time (GetFirst/GetNext), so references do not pile up
+            for item in iter_items(sent_folder.Items):
+                memory.tick()
                 processed_count += 1
                 # Process in batches of 100 to avoid long-running operations
                 if processed_count % 100 == 0:
@@ -167,26 +243,22 @@ class OutlookAddin:
                                 
                                 # Only process if we have an email address
                                 if email and "@" in email:
-                                    # Try to split name into first and last name
-                                    name_parts = name.split()
-                                    first_name = name_parts[0] if len(name_parts) > 0 else ""
-                                    last_name = " ".join(name_parts[1:]) if len(name_parts) > 1 else ""
-                                    
                                     contacts.append({
-                                        "First Name": first_name,
-                                        "Last Name": last_name,
+                                        "First Name": "",
+                                        "Last Name": "",
                                         "Full Name": name,
-                                        "Email": email.lower()  # Normalize email to lowercase
+                                        "Email": email
                                     })
                             except Exception as recipient_error:
-                                logging.error(f"Error processing recipient: {str(recipient_error)}")
+                                errors.record("Sent Items (recipient)", recipient_error)
                                 # Skip this recipient but continue processing
                                 continue
                     except Exception as item_error:
-                        logging.error(f"Error processing email item: {str(item_error)}")
+                        errors.record("Sent Items", item_error)
                         # Skip this item but continue processing
                         continue
             
+            memory.end_folder()
             logging.info(f"Finished processing {processed_count} emails")
             
             # If we didn't find any contacts, try to look in other folders
@@ -194,7 +266,9 @@ class OutlookAddin:
                 logging.info("No contacts found in Sent Items, trying Inbox")
                 try:
                     inbox = outlook.GetDefaultFolder(6)  # 6 = olFolderInbox
-                    for item in inbox.Items:
+                    memory.start_folder("Inbox")
+                    for item in iter_items(inbox.Items):
+                        memory.tick()
                         if item.Class == 43:  # olMailItem
                             try:
                                 # Get the sender info
@@ -203,26 +277,34 @@ class OutlookAddin:
                                     email = item.SenderEmailAddress
                                     
                                     if email and "@" in email:
-                                        # Split name into first and last name
-                                        name_parts = name.split()
-                                        first_name = name_parts[0] if len(name_parts) > 0 else ""
-                                        last_name = " ".join(name_parts[1:]) if len(name_parts) > 1 else ""
-                                        
                                         contacts.append({
-                                            "First Name": first_name,
-                                            "Last Name": last_name,
+                                            "First Name": "",
+                                            "Last Name": "",
                                             "Full Name": name,
-                                            "Email": email.lower()
+                                            "Email": email
                                         })
-                            except:
+                            except Exception as item_error:
+                                errors.record("Inbox", item_error)
                                 continue
+                    memory.end_folder()
                 except:
                     logging.error("Error processing Inbox")
                 
+            errors.log_summary("Extraction")
+            logging.info(f"Outlook calls: {format_scheduler_stats(SCHEDULER.stats_since(calls_before))}")
+
             # Remove duplicates
             if contacts:
                 logging.info(f"Removing duplicates from {len(contacts)} contacts")
-                contacts_df = pd.DataFrame(contacts).drop_duplicates(subset=['Email'])
+                # Loaded on first use to keep Outlook's add-in load time low
+                import pandas as pd
+                from identity import merge_identities
+                from normalize import normalize_contacts
+
+                # Clean addresses, split names and remove duplicates in one pass
+                contacts_df = normalize_contacts(pd.DataFrame(contacts))
+                # Merge addresses that belong to the same person
+                contacts_df = merge_identities(contacts_df)
                 logging.info(f"Found {len(contacts_df)} unique contacts")
                 
                 # Make sure the directory exists
@@ -266,9 +348,12 @@ class OutlookAddin:
             logging.error(traceback.format_exc())
             raise e
 
+IMPORT_SECONDS = time.perf_counter() - _import_started
+
 # Register the COM server
 if __name__ == '__main__':
     try:
+        setup_logging()
         import win32com.server.register
         logging.info("Registering COM server")
         win32com.server.register.UseCommandLine(OutlookAddin)
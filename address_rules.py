@@ -0,0 +1,241 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+
+# Learned X500 -> SMTP rewrite rules.
+#
+# Exchange hands us legacyDN addresses such as
+#   /o=ExchangeLabs/ou=Exchange Administrative Group (...)/cn=Recipients/cn=1a2b3c-jane.doe
+# for internal senders and recipients. Every X500 address that does resolve
+# (or comes with a PR_SMTP_ADDRESS) shows how this tenant builds its SMTP
+# addresses: the primary domain, and which local-part convention
+# (jane.doe, jdoe, doe.jane, the cn= segment, ...) maps names to addresses.
+# Those observations are kept on disk. Once a convention is clear, X500
+# addresses that did not resolve are rewritten with it directly, and any
+# that failed before are not sent to Resolve() again.
+
+RULES_FILE_NAME = "address_rules.json"
+DEFAULT_RULES_PATH = os.path.join(os.path.expanduser("~"), "AppData", "Local", "OutlookContactExporter",
+                                  RULES_FILE_NAME)
+
+MIN_OBSERVATIONS = 5       # resolved addresses needed before guessing
+MAX_OBSERVATIONS = 20000   # per-address observations kept on disk
+MAX_UNRESOLVABLE = 20000   # X500 addresses remembered as unresolvable
+
+# Local-part conventions, most specific first so ties favour them
+TEMPLATES = {
+    "first.last": "{first}.{last}",
+    "first_last": "{first}_{last}",
+    "first-last": "{first}-{last}",
+    "firstlast": "{first}{last}",
+    "f.last": "{f}.{last}",
+    "flast": "{f}{last}",
+    "last.first": "{last}.{first}",
+    "lastf": "{last}{f}",
+    "first.l": "{first}.{l}",
+    "first": "{first}",
+    "cn": "{cn}",
+}
+
+
+def _key(x500):
+    return hashlib.sha1(x500.lower().encode("utf-8")).hexdigest()[:16]
+
+
+def _clean_token(text):
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]", "", text.lower())
+
+
+# First/last name from a display name, handling "Last, First"
+def name_tokens(display_name):
+    display_name = (display_name or "").strip()
+    if "," in display_name:
+        last, _, first = display_name.partition(",")
+        first_parts = first.split()
+        last_parts = last.split()
+    else:
+        parts = display_name.split()
+        first_parts = parts[:1]
+        last_parts = parts[-1:] if len(parts) > 1 else []
+
+    first = _clean_token(first_parts[0]) if first_parts else ""
+    last = _clean_token(last_parts[-1]) if last_parts else ""
+    return first, last
+
+
+# The part of the last cn= segment after the leading id, e.g. "jane.doe"
+def cn_segment(x500):
+    match = re.search(r"cn=([^/]*)$", x500 or "", re.IGNORECASE)
+    if not match:
+        return ""
+    segment = match.group(1)
+    if "-" in segment:
+        segment = segment.split("-", 1)[1]
+    return segment.strip().lower().replace(" ", ".")
+
+
+def candidate_local_parts(display_name, x500):
+    first, last = name_tokens(display_name)
+    values = {"first": first, "last": last, "f": first[:1], "l": last[:1], "cn": cn_segment(x500)}
+
+    candidates = {}
+    for template_name, template in TEMPLATES.items():
+        needs = re.findall(r"{(\w+)}", template)
+        if all(values[n] for n in needs):
+            candidates[template_name] = template.format(**values)
+    return candidates
+
+
+class AddressRules:
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.observations = {}   # x500 key -> [domain, [matching templates]]
+        self.unresolvable = {}   # x500 key -> True, in insertion order
+        self.domain_counts = {}    # domain -> observations
+        self.template_counts = {}  # domain -> {template -> observations}
+        self.rule = None
+        self.dirty = False
+        self.guesses = 0
+        self.skipped = set()     # x500 keys not sent to Resolve() this run
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return self
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.observations = data.get("observations", {})
+            self.unresolvable = dict.fromkeys(data.get("unresolvable", []), True)
+            self.domain_counts = {}
+            self.template_counts = {}
+            for domain, matches in self.observations.values():
+                self._count(domain, matches, 1)
+            self._update_rule()
+            logging.info(f"Loaded {len(self.observations)} address observations, rule: {self.rule}")
+        except Exception as e:
+            logging.warning(f"Could not load address rules from {self.path}: {e}")
+        return self
+
+    def save(self):
+        if not self.path or not self.dirty:
+            return
+        with self.lock:
+            data = {
+                "rule": self.rule,
+                "observations": self.observations,
+                "unresolvable": list(self.unresolvable)[-MAX_UNRESOLVABLE:],
+            }
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        except Exception as e:
+            logging.warning(f"Could not save address rules to {self.path}: {e}")
+
+    # Record an X500 address together with the SMTP address it resolved to
+    def observe(self, x500, display_name, smtp):
+        if not x500 or not smtp or "@" not in smtp:
+            return
+        local, _, domain = smtp.lower().partition("@")
+        matches = [name for name, value in candidate_local_parts(display_name, x500).items()
+                   if value == local]
+        key = _key(x500)
+
+        with self.lock:
+            previous = self.observations.get(key)
+            if previous == [domain, matches]:
+                return
+            if previous is not None:
+                self._count(*previous, -1)
+            self.observations[key] = [domain, matches]
+            self._count(domain, matches, 1)
+            self.unresolvable.pop(key, None)
+            while len(self.observations) > MAX_OBSERVATIONS:
+                self._count(*self.observations.pop(next(iter(self.observations))), -1)
+            self.dirty = True
+            self._update_rule()
+
+    def mark_unresolvable(self, x500):
+        with self.lock:
+            self.unresolvable[_key(x500)] = True
+            self.dirty = True
+
+    # Known-unresolvable addresses are not sent to Resolve() again once a
+    # rule can rewrite them
+    def should_skip_lookup(self, x500):
+        key = _key(x500)
+        if self.rule is None or key not in self.unresolvable:
+            return False
+        with self.lock:
+            self.skipped.add(key)
+        return True
+
+    @property
+    def skipped_lookups(self):
+        return len(self.skipped)
+
+    # Keep the per-domain and per-template counts in step with the
+    # observations, so the rule never needs a pass over all of them
+    def _count(self, domain, matches, delta):
+        count = self.domain_counts.get(domain, 0) + delta
+        if count:
+            self.domain_counts[domain] = count
+        else:
+            self.domain_counts.pop(domain, None)
+
+        template_counts = self.template_counts.setdefault(domain, {})
+        for template_name in matches:
+            count = template_counts.get(template_name, 0) + delta
+            if count:
+                template_counts[template_name] = count
+            else:
+                template_counts.pop(template_name, None)
+        if not template_counts:
+            self.template_counts.pop(domain, None)
+
+    # The most common domain and, within it, the best-supported template.
+    # Confidence is the share of observations the rule would have got right,
+    # shrunk towards zero while there are only a few of them.
+    def _update_rule(self):
+        total = len(self.observations)
+        if total < MIN_OBSERVATIONS:
+            self.rule = None
+            return
+
+        domains = self.domain_counts
+        domain = max(domains, key=domains.get)
+
+        template_counts = self.template_counts.get(domain, {})
+        if not template_counts:
+            self.rule = None
+            return
+
+        order = list(TEMPLATES)
+        template = max(template_counts, key=lambda t: (template_counts[t], -order.index(t)))
+        self.rule = {
+            "domain": domain,
+            "template": template,
+            "observations": total,
+            "confidence": round(template_counts[template] / (total + MIN_OBSERVATIONS), 3),
+        }
+
+    # Returns (smtp, confidence), or (None, 0.0) when there is no usable rule
+    def guess(self, x500, display_name):
+        rule = self.rule
+        if not rule:
+            return None, 0.0
+        local = candidate_local_parts(display_name, x500).get(rule["template"])
+        if not local:
+            return None, 0.0
+        with self.lock:
+            self.guesses += 1
+        return f"{local}@{rule['domain']}", rule["confidence"]
@@ -0,0 +1,166 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from com_replay import replay_role_cache, replay_rules, session_for
+from extraction import DEFAULT_QUEUE_SIZE, run_extraction
+from progress_channel import ProgressChannel
+from scan_coverage import StopToken
+
+# Asyncio front end to the extraction engine.
+#
+#   async for contact in extract("sales@yourcompany.com", options):
+#       await crm.upsert(contact)
+#
+# COM objects belong to the single-threaded apartment of the thread that
+# created them, and every call into Outlook blocks, so each extraction runs
+# on a thread of a small executor whose threads initialise COM (STA) once and
+# keep it for their lifetime. The scan runs there exactly as in the GUI, with
+# its own resolver threads; the event loop thread never touches COM.
+#
+# Contacts are streamed back through a bounded asyncio.Queue as the
+# aggregator finds them. When the consumer falls behind, the queue fills and
+# the aggregator blocks, which in turn stops the scan through the pipeline's
+# bounded queues. An address can come again when a later email gives it a
+# role; the last record per "Email" wins. Leaving the loop early stops the
+# scan (use `async with` to have it stopped before the block is left).
+# Several extractions can run at once, up to the executor's size, alongside
+# any other work of the event loop.
+
+DEFAULT_STA_WORKERS = 2   # extractions running at the same time
+
+_DONE = object()
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _init_sta():
+    try:
+        import pythoncom
+    except ImportError:
+        # Replaying a recording (com_replay.py) works without pywin32
+        return
+    pythoncom.CoInitialize()
+
+
+# The process-wide executor of STA threads, created on first use
+def sta_executor(workers=DEFAULT_STA_WORKERS):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="outlook-sta",
+                                           initializer=_init_sta)
+        return _executor
+
+
+# Keeps the counts for AsyncExtraction.progress; nothing is queued for a GUI
+class _CountingProgress(ProgressChannel):
+    def set_status(self, text, percent=None):
+        self.status = text
+
+    def _post_progress(self, now=None):
+        pass
+
+    def finish(self, kind, title, message):
+        pass
+
+
+class AsyncExtraction:
+    # `options` is the same argparse.Namespace the command line builds
+    # (extract_contacts.parse_args); `rules` and `role_cache` are shared
+    # AddressRules/RoleCache objects when several extractions run at once
+    def __init__(self, mailbox=None, options=None, queue_size=DEFAULT_QUEUE_SIZE, executor=None,
+                 rules=None, role_cache=None):
+        self.mailbox = mailbox
+        self.options = options
+        self.queue_size = queue_size
+        self.executor = executor
+        self.rules = rules
+        self.role_cache = role_cache
+        self.stop_token = StopToken()
+        self.channel = _CountingProgress()
+        self.stats = None       # run_extraction's stats once finished
+        self.records = None     # the final deduplicated records once finished
+        self._stream = None
+
+    # Stop the scan; the contacts found so far are still delivered
+    def cancel(self, reason="cancelled"):
+        self.stop_token.cancel(reason)
+
+    # (items read, items to read)
+    @property
+    def progress(self):
+        return self.channel.items_done, self.channel.total_items
+
+    # Runs on an STA executor thread
+    def _run(self, put):
+        session = session_for(self.options)
+        namespace = None
+        try:
+            namespace = session.connect()
+            rules = self.rules if self.rules is not None else replay_rules(self.options)
+            role_cache = self.role_cache if self.role_cache is not None else replay_role_cache(self.options)
+            self.records, self.stats = run_extraction(namespace, self.channel, self.options, session.connect,
+                                                      session.disconnect, mailbox=self.mailbox, rules=rules,
+                                                      role_cache=role_cache, stop_token=self.stop_token,
+                                                      on_record=lambda record: put(dict(record)))
+        finally:
+            try:
+                if namespace is not None:
+                    session.disconnect(namespace)
+                session.close()
+            except Exception as e:
+                logging.error(f"Error closing Outlook session: {e}")
+            put(_DONE)
+
+    def __aiter__(self):
+        if self._stream is not None:
+            raise RuntimeError("An extraction can only be iterated once")
+        self._stream = self._records()
+        return self._stream
+
+    # Leaving `async with extract(...) as contacts:` stops the scan right away;
+    # a bare `async for` that breaks stops it when the loop gets round to it
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self):
+        if self._stream is not None:
+            await self._stream.aclose()
+
+    async def _records(self):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue(maxsize=max(1, self.queue_size))
+        closed = threading.Event()
+
+        # Blocks the calling (aggregator) thread while the queue is full
+        def put(item):
+            if not closed.is_set():
+                asyncio.run_coroutine_threadsafe(queue.put(item), loop).result()
+
+        future = loop.run_in_executor(self.executor or sta_executor(), self._run, put)
+        try:
+            while True:
+                item = await queue.get()
+                if item is _DONE:
+                    break
+                yield item
+            await future
+        finally:
+            if not future.done():
+                # The consumer left early: stop the scan and unblock its puts
+                closed.set()
+                self.cancel("consumer stopped")
+                while not future.done():
+                    while not queue.empty():
+                        queue.get_nowait()
+                    await asyncio.wait([future], timeout=0.05)
+
+
+def extract(mailbox=None, options=None, **kwargs):
+    return AsyncExtraction(mailbox, options, **kwargs)
@@ -0,0 +1,130 @@
+import logging
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from address_rules import DEFAULT_RULES_PATH, AddressRules
+from extraction import connect_outlook, disconnect_outlook, prepare_contacts, run_extraction
+from progress_channel import ProgressChannel, format_progress
+from role_cache import DEFAULT_ROLE_CACHE_PATH, RoleCache
+from sharded_export import export_contacts
+
+# Batch export of several mailboxes in one run.
+#
+# Every mailbox (a shared mailbox, a delegate mailbox, or another store open
+# in the profile) is scanned by the normal extraction pipeline. Up to
+# `mailbox_workers` mailboxes are scanned at the same time, each on its own
+# worker thread with its own Outlook session: COM objects cannot be shared
+# between threads, and Exchange throttles clients that open too many
+# sessions at once, so the pool is kept small. All scans share one set of
+# learned address rules and one signature role cache. One workbook is written per mailbox, plus a combined
+# workbook with a "Mailbox" column listing where each address was seen.
+
+DEFAULT_MAILBOX_WORKERS = 2
+COMBINED_OUTPUT = "(combined)"
+
+_print_lock = threading.Lock()
+
+
+# One text line per status change and every few seconds while scanning,
+# prefixed with the mailbox name
+class ConsoleProgress(ProgressChannel):
+    def __init__(self, label, post_interval=5.0):
+        super().__init__(post_interval=post_interval)
+        self.label = label
+
+    def _print(self, text):
+        with _print_lock:
+            print(f"[{self.label}] {text}", flush=True)
+
+    def set_status(self, text, percent=None):
+        self._print(text)
+
+    def _post_progress(self, now=None):
+        now = now or time.perf_counter()
+        self.last_post = now
+        self._print(format_progress(self.items_done, self.total_items, self.current_folder, self.rate(now)))
+
+    def finish(self, kind, title, message):
+        self._print(f"{title}: {message}")
+
+
+# Mailbox names or addresses from a text file, one per line; blank lines and
+# lines starting with '#' are skipped
+def read_mailbox_list(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
+
+
+def mailbox_slug(mailbox):
+    return re.sub(r"[^A-Za-z0-9]+", "_", mailbox).strip("_").lower() or "mailbox"
+
+
+# Scan all mailboxes and return (results, failures): results maps each
+# mailbox to the (records, stats) of run_extraction, failures maps mailboxes
+# that could not be scanned to the error message.
+def run_batch(mailboxes, options=None, connect=connect_outlook, disconnect=disconnect_outlook,
+              make_channel=ConsoleProgress):
+    mailboxes = list(dict.fromkeys(mailboxes))
+    workers = getattr(options, "mailbox_workers", DEFAULT_MAILBOX_WORKERS)
+    workers = max(1, min(int(workers), len(mailboxes) or 1))
+    rules = AddressRules(getattr(options, "rules_file", None) or DEFAULT_RULES_PATH).load()
+    role_cache = RoleCache(getattr(options, "role_cache_file", None) or DEFAULT_ROLE_CACHE_PATH).load()
+
+    def scan(mailbox):
+        namespace = connect()
+        try:
+            return run_extraction(namespace, make_channel(mailbox), options, connect, disconnect,
+                                  mailbox=mailbox, rules=rules, role_cache=role_cache)
+        finally:
+            disconnect(namespace)
+
+    results, failures = {}, {}
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mailbox") as pool:
+        futures = {pool.submit(scan, mailbox): mailbox for mailbox in mailboxes}
+        for future in as_completed(futures):
+            mailbox = futures[future]
+            try:
+                results[mailbox] = future.result()
+                logging.info(f"Mailbox {mailbox}: {len(results[mailbox][0])} contacts")
+            except Exception as e:
+                failures[mailbox] = str(e)
+                logging.error(f"Mailbox {mailbox} failed: {e}")
+    rules.save()
+    role_cache.save()
+
+    logging.info(f"Batch of {len(mailboxes)} mailboxes finished in {time.perf_counter() - started:.1f}s "
+                 f"with {workers} workers, {len(failures)} failed")
+    # Keep the order the mailboxes were given in
+    results = {mailbox: results[mailbox] for mailbox in mailboxes if mailbox in results}
+    return results, failures
+
+
+# Write one workbook per mailbox and a combined one (sharded when `options`
+# ask for it or they are too large). Returns a dict of mailbox (or
+# COMBINED_OUTPUT) -> file or manifest path.
+def write_batch_outputs(results, merge=True, options=None):
+    outputs = {}
+    combined = []
+    mailboxes_by_email = {}
+
+    for mailbox, (records, stats) in results.items():
+        if not records:
+            continue
+        # Scans stopped by the time budget are marked in the file name
+        suffix = "_partial" if stats.get("partial") else ""
+        outputs[mailbox] = export_contacts(prepare_contacts(records, merge), options,
+                                           f"outlook_contacts_{mailbox_slug(mailbox)}{suffix}")
+        for record in records:
+            combined.append(dict(record, Mailbox=mailbox))
+            mailboxes_by_email.setdefault(record["Email"], set()).add(mailbox)
+
+    if combined:
+        result_df = prepare_contacts(combined, merge)
+        seen_in = result_df["Email"].map(lambda email: "; ".join(sorted(mailboxes_by_email.get(email, ()))))
+        result_df["Mailbox"] = seen_in.where(seen_in != "", result_df["Mailbox"])
+        outputs[COMBINED_OUTPUT] = export_contacts(result_df, options, "outlook_contacts_combined")
+
+    return outputs
@@ -0,0 +1,427 @@
+import datetime
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import types
+
+from address_rules import AddressRules
+from com_scheduler import ScheduledMethod
+from extraction import connect_outlook, disconnect_outlook
+from role_cache import RoleCache
+
+# Record and replay Outlook object-model sessions.
+#
+# Recording wraps the MAPI namespace in proxies that pass every property
+# read, method call and collection iteration through to Outlook and note the
+# result and how long it took. Replaying serves the same results from the
+# capture, sleeping for the recorded latency, so a slow customer mailbox can
+# be reproduced with the normal extraction code on any machine, Linux
+# included.
+#
+# Every object is identified by how it was reached (parent object, property
+# or method, arguments), not by the order of calls, so replay does not depend
+# on thread timing. The exception are cursor methods (Items.GetFirst/GetNext),
+# whose calls on one collection are numbered. All namespaces opened during a recording count as the
+# same root object. Each read is stored once, with its call count and mean
+# latency.
+#
+# Strings are sanitised before they are stored: every word, in any script, is
+# replaced by an ASCII pseudo-word derived from a random per-recording salt,
+# keeping its length, case and the punctuation around it, so addresses still
+# look like addresses and a sender's name still matches the signature in the
+# body. Words the extractor relies on (Exchange address markers, job-title
+# words, HTML tags) are kept. Strings the extractor passes back as arguments,
+# such as a display name handed to CreateRecipient, are mapped the same way so
+# the replay finds them. Long texts keep only their last MAX_TEXT characters.
+
+FORMAT_VERSION = 1
+MAX_TEXT = 4000
+MIN_SLEEP = 0.001  # replay latency is paid in slices of at least this much
+
+ROOT_ID = 0
+
+KEEP_WORDS = {
+    # Exchange addresses, address types and MAPI property names
+    "o", "ou", "cn", "exchangelabs", "exchange", "administrative", "group", "recipients",
+    "fydibohf23spdlt", "ex", "smtp", "sip", "mailto", "http", "https", "schemas", "microsoft",
+    "com", "mapi", "proptag",
+    # Structure the signature parser looks for
+    "html", "head", "body", "div", "span", "p", "br", "table", "tr", "td", "font", "style",
+    "at", "of", "for", "and", "the",
+    # Job-title words from extraction.extract_role_from_body
+    "senior", "junior", "chief", "assistant", "associate", "lead", "principal", "director",
+    "manager", "officer", "president", "ceo", "cto", "cfo", "coo", "vp", "head", "founder",
+    "owner", "specialist", "supervisor", "coordinator", "analyst", "engineer", "developer",
+    "architect", "designer", "consultant", "executive", "administrator", "technician",
+    "marketing", "sales", "finance", "hr", "operations", "it", "product", "software",
+    "network", "data", "ai", "business", "project", "program", "customer", "research",
+    "quality", "technical", "support",
+}
+
+# Letters and digits of any script; "_" counts as punctuation
+_WORD = re.compile(r"[^\W_]+")
+# Arguments written in the code rather than read from the mailbox
+_CONSTANT_ARGUMENT = re.compile(r"^(https?://schemas\.microsoft\.com/\S*|\[.*|[A-Za-z]+)$")
+_LETTERS = "abcdefghijklmnopqrstuvwxyz"
+
+
+class Sanitizer:
+    def __init__(self, salt=None):
+        self.salt = salt or os.urandom(16)
+        self.words = {}
+        self.strings = {}  # original -> sanitised, for strings used as arguments later
+        self.lock = threading.Lock()
+
+    def _word(self, match):
+        word = match.group(0)
+        lower = word.lower()
+        if lower in KEEP_WORDS:
+            return word
+        pseudo = self.words.get(lower)
+        if pseudo is None:
+            digest = hashlib.blake2b(lower.encode("utf-8"), key=self.salt, digest_size=32).digest()
+            pseudo = "".join(str(digest[i % 32] % 10) if c.isdigit() else _LETTERS[digest[i % 32] % 26]
+                             for i, c in enumerate(lower))
+            self.words[lower] = pseudo
+        if word.isupper() and len(word) > 1:
+            return pseudo.upper()
+        if word[0].isupper():
+            return pseudo[0].upper() + pseudo[1:]
+        return pseudo
+
+    def text(self, value):
+        cached = self.strings.get(value)
+        if cached is not None:
+            return cached
+        sanitized = _WORD.sub(self._word, value[-MAX_TEXT:])
+        if len(value) <= 512:
+            with self.lock:
+                self.strings[value] = sanitized
+        return sanitized
+
+    # Strings that came out of the mailbox are mapped the way they were
+    # stored; constants from the code (property URLs, filters, store names)
+    # are kept; anything else is sanitised
+    def argument(self, value):
+        mapped = self.strings.get(value)
+        if mapped is not None:
+            return mapped
+        if _CONSTANT_ARGUMENT.match(value):
+            return value
+        return self.text(value)
+
+
+# Methods whose result depends on how often they were called before
+CURSOR_METHODS = {"GetFirst": True, "GetLast": True, "GetNext": False, "GetPrevious": False}
+
+
+# Counts cursor calls per collection; GetFirst/GetLast start again at 0
+class CursorPositions:
+    def __init__(self):
+        self.positions = {}
+        self.lock = threading.Lock()
+
+    def next(self, parent, name):
+        with self.lock:
+            position = 0 if CURSOR_METHODS[name] else self.positions.get(parent, 0)
+            self.positions[parent] = position + 1
+            return position
+
+
+def _is_plain(value):
+    return value is None or isinstance(value, (str, int, float, bool, bytes, datetime.datetime))
+
+
+# Method arguments as a key; objects passed as arguments (e.g. a Recipient
+# to GetSharedDefaultFolder) are given as {"o": id}
+def _args_key(args):
+    return json.dumps(args, default=str)
+
+
+# ---- recording ---------------------------------------------------------------
+
+class Recorder:
+    def __init__(self, sanitizer=None):
+        self.sanitizer = sanitizer or Sanitizer()
+        self.lock = threading.Lock()
+        self.ids = {}      # (parent, op, name, args) -> object id
+        self.events = {}   # (parent, op, name, args) -> [result, count, total seconds]
+        self.cursors = CursorPositions()
+        self.started = time.time()
+
+    def wrap(self, obj):
+        return RecordingProxy(self, ROOT_ID, obj)
+
+    def _child_id(self, key):
+        with self.lock:
+            child = self.ids.get(key)
+            if child is None:
+                child = self.ids[key] = len(self.ids) + 1
+            return child
+
+    def _encode(self, key, value):
+        # Live sessions come wrapped by the call scheduler (com_scheduler.py),
+        # whose methods are ScheduledMethod objects
+        if isinstance(value, (types.MethodType, ScheduledMethod)):
+            return ["m"], None
+        if isinstance(value, datetime.datetime):
+            return ["t", value.isoformat()], None
+        if isinstance(value, str):
+            return ["v", self.sanitizer.text(value)], None
+        if isinstance(value, bytes):
+            return ["v", None], None
+        if _is_plain(value):
+            return ["v", value], None
+        child = self._child_id(key)
+        return ["o", child], RecordingProxy(self, child, value)
+
+    def _note(self, key, result, seconds):
+        with self.lock:
+            event = self.events.get(key)
+            if event is None:
+                self.events[key] = [result, 1, seconds]
+            else:
+                event[1] += 1
+                event[2] += seconds
+
+    # Run `func` (one object-model call), record it under `key` and return
+    # the result, wrapped again when it is an object
+    def call(self, key, func):
+        started = time.perf_counter()
+        try:
+            value = func()
+        except Exception as e:
+            self._note(key, ["e", type(e).__name__, self.sanitizer.text(str(e))],
+                       time.perf_counter() - started)
+            raise
+        seconds = time.perf_counter() - started
+        result, proxy = self._encode(key, value)
+        self._note(key, result, seconds)
+        if result[0] == "m":
+            return RecordingMethod(self, key[0], key[2], value)
+        return proxy if proxy is not None else value
+
+    def save(self, path):
+        with self.lock:
+            events = [[parent, op, name, args, result, count, round(total / count, 7)]
+                      for (parent, op, name, args), (result, count, total) in self.events.items()]
+        data = {"version": FORMAT_VERSION, "recorded": self.started, "events": events}
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        logging.info(f"Saved COM recording with {len(events)} distinct calls to {path}")
+        return len(events)
+
+
+class RecordingMethod:
+    def __init__(self, recorder, parent, name, method):
+        self._recorder = recorder
+        self._parent = parent
+        self._name = name
+        self._method = method
+
+    def __call__(self, *args):
+        sanitizer = self._recorder.sanitizer
+        keys, real = [], []
+        for arg in args:
+            if isinstance(arg, RecordingProxy):
+                keys.append({"o": arg._id})
+                real.append(arg._obj)
+            else:
+                keys.append(sanitizer.argument(arg) if isinstance(arg, str) else arg)
+                real.append(arg)
+        if self._name in CURSOR_METHODS:
+            keys.append({"cursor": self._recorder.cursors.next(self._parent, self._name)})
+        key = (self._parent, "call", self._name, _args_key(keys))
+        return self._recorder.call(key, lambda: self._method(*real))
+
+
+class RecordingProxy:
+    def __init__(self, recorder, object_id, obj):
+        object.__setattr__(self, "_recorder", recorder)
+        object.__setattr__(self, "_id", object_id)
+        object.__setattr__(self, "_obj", obj)
+
+    def __getattr__(self, name):
+        return self._recorder.call((self._id, "get", name, ""), lambda: getattr(self._obj, name))
+
+    def __setattr__(self, name, value):
+        setattr(self._obj, name, value)
+
+    def __bool__(self):
+        return self._recorder.call((self._id, "bool", "", ""), lambda: bool(self._obj))
+
+    def __iter__(self):
+        iterator = iter(self._obj)
+        index = 0
+        while True:
+            try:
+                item = self._recorder.call((self._id, "item", "", str(index)), lambda: next(iterator))
+            except StopIteration:
+                break
+            yield item
+            index += 1
+
+
+# A session that records everything done through it and saves it on close
+class RecordingSession:
+    def __init__(self, path):
+        self.path = path
+        self.recorder = Recorder()
+
+    def connect(self):
+        return self.recorder.wrap(connect_outlook())
+
+    def disconnect(self, namespace=None):
+        disconnect_outlook()
+
+    def close(self):
+        self.recorder.save(self.path)
+
+
+# ---- replay ------------------------------------------------------------------
+
+class ReplayedComError(Exception):
+    pass
+
+
+_ERRORS = {"AttributeError": AttributeError, "KeyError": KeyError, "IndexError": IndexError,
+           "StopIteration": StopIteration, "ValueError": ValueError, "TypeError": TypeError}
+
+
+class ReplaySession:
+    # speed 1.0 replays the recorded latencies, 2.0 twice as fast, 0 without delays
+    def __init__(self, path, speed=1.0):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported recording version: {data.get('version')}")
+        self.events = {(parent, op, name, args): (result, latency)
+                       for parent, op, name, args, result, count, latency in data["events"]}
+        self.scale = 1.0 / speed if speed else 0.0
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.cursors = CursorPositions()
+        self.missing = 0
+        logging.info(f"Loaded COM recording with {len(self.events)} distinct calls from {path}")
+
+    def connect(self):
+        return ReplayObject(self, ROOT_ID)
+
+    def disconnect(self, namespace=None):
+        pass
+
+    def close(self):
+        if self.missing:
+            logging.warning(f"Replay asked for {self.missing} calls that are not in the recording")
+
+    def _wait(self, latency):
+        if not self.scale:
+            return
+        owed = getattr(self.local, "owed", 0.0) + latency * self.scale
+        if owed >= MIN_SLEEP:
+            time.sleep(owed)
+            owed = 0.0
+        self.local.owed = owed
+
+    def lookup(self, key):
+        event = self.events.get(key)
+        if event is None:
+            with self.lock:
+                self.missing += 1
+            # Not recorded: the code took a path the recorded run did not
+            raise AttributeError(f"not in recording: {key}")
+        result, latency = event
+        self._wait(latency)
+
+        kind = result[0]
+        if kind == "v":
+            return result[1]
+        if kind == "t":
+            return datetime.datetime.fromisoformat(result[1])
+        if kind == "o":
+            return ReplayObject(self, result[1])
+        if kind == "m":
+            return ReplayMethod(self, key[0], key[2])
+        error = _ERRORS.get(result[1], ReplayedComError)
+        raise error(result[2])
+
+
+class ReplayMethod:
+    def __init__(self, session, parent, name):
+        self._session = session
+        self._parent = parent
+        self._name = name
+
+    def __call__(self, *args):
+        keys = [{"o": arg._id} if isinstance(arg, ReplayObject) else arg for arg in args]
+        if self._name in CURSOR_METHODS:
+            keys.append({"cursor": self._session.cursors.next(self._parent, self._name)})
+        return self._session.lookup((self._parent, "call", self._name, _args_key(keys)))
+
+
+class ReplayObject:
+    def __init__(self, session, object_id):
+        object.__setattr__(self, "_session", session)
+        object.__setattr__(self, "_id", object_id)
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return self._session.lookup((self._id, "get", name, ""))
+
+    def __setattr__(self, name, value):
+        pass
+
+    def __bool__(self):
+        key = (self._id, "bool", "", "")
+        return self._session.lookup(key) if key in self._session.events else True
+
+    def __iter__(self):
+        index = 0
+        while True:
+            try:
+                yield self._session.lookup((self._id, "item", "", str(index)))
+            except (StopIteration, AttributeError):
+                return
+            index += 1
+
+
+# The Outlook session to use for `options`: a live one, one that records to
+# options.record, or a replay of options.replay
+def session_for(options=None):
+    if getattr(options, "replay", None):
+        return ReplaySession(options.replay, getattr(options, "replay_speed", 1.0))
+    if getattr(options, "record", None):
+        return RecordingSession(options.record)
+    return LiveSession()
+
+
+class LiveSession:
+    def connect(self):
+        return connect_outlook()
+
+    def disconnect(self, namespace=None):
+        disconnect_outlook(namespace)
+
+    def close(self):
+        pass
+
+
+# Address rules for a run: a replay learns into throwaway rules, so pseudonymised
+# addresses never end up in the user's rules file. None means the usual file.
+def replay_rules(options=None):
+    if getattr(options, "replay", None):
+        return AddressRules()
+    return None
+
+
+# Likewise a replay caches signature roles in memory only
+def replay_role_cache(options=None):
+    if getattr(options, "replay", None):
+        return RoleCache()
+    return None
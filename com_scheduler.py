@@ -0,0 +1,245 @@
+import datetime
+import random
+import threading
+import time
+import types
+
+# Retries and throttling for Outlook object-model calls.
+#
+# When Exchange Online throttles the mailbox or Outlook is busy, calls fail
+# with RPC_E_CALL_REJECTED, "server busy" and similar errors that go away if
+# the call is simply made again a little later. Everything the extractors read
+# from Outlook goes through one CallScheduler: SCHEDULER.wrap(namespace)
+# returns a proxy, and every property read, method call and collection step
+# made through it (and through every object reached from it) is run by
+# CallScheduler.call().
+#
+# call() tells retryable errors (busy, rejected, network) from permanent ones
+# (no such property, access denied) by HRESULT. Retryable calls are made again
+# after a jittered exponential backoff. The number of calls allowed in flight
+# at once across all threads adapts AIMD-style: it halves on every rejection
+# and grows by one per `limit` successful calls, up to MAX_CONCURRENCY.
+
+MAX_RETRIES = 6
+BACKOFF_BASE = 0.1       # seconds before the first retry, doubled for each further one
+BACKOFF_CAP = 10.0       # longest wait before one retry
+MAX_CONCURRENCY = 8      # calls in flight at once when nothing is rejected
+MIN_CONCURRENCY = 1
+
+
+def _hresult(code):
+    return code - (1 << 32) if code & 0x80000000 else code
+
+
+RETRYABLE_HRESULTS = {
+    _hresult(0x80010001): "RPC_E_CALL_REJECTED",
+    _hresult(0x8001010A): "RPC_E_SERVERCALL_RETRYLATER",
+    _hresult(0x800706BA): "RPC_S_SERVER_UNAVAILABLE",
+    _hresult(0x800706BE): "RPC_S_CALL_FAILED",
+    _hresult(0x80040115): "MAPI_E_NETWORK_ERROR",
+    _hresult(0x8004010B): "MAPI_E_BUSY",
+    _hresult(0x80040401): "MAPI_E_TIMEOUT",
+    _hresult(0x8000000A): "E_PENDING",
+}
+
+# Errors that mean the server pushed back, as opposed to a flaky connection
+REJECTIONS = {_hresult(0x80010001), _hresult(0x8001010A), _hresult(0x8004010B)}
+
+
+# The HRESULT of a pywintypes.com_error, preferring the code in its
+# EXCEPINFO (DISP_E_EXCEPTION only says that the call raised something)
+def error_code(error):
+    if type(error).__name__ != "com_error" and not hasattr(error, "hresult"):
+        return None
+    args = getattr(error, "args", ())
+    code = getattr(error, "hresult", None) or (args[0] if args and isinstance(args[0], int) else None)
+    if len(args) > 2 and isinstance(args[2], tuple) and len(args[2]) > 5 and args[2][5]:
+        if args[2][5] in RETRYABLE_HRESULTS:
+            return args[2][5]
+    return code
+
+
+def is_retryable(error):
+    return error_code(error) in RETRYABLE_HRESULTS
+
+
+class CallScheduler:
+    def __init__(self, max_retries=MAX_RETRIES, max_concurrency=MAX_CONCURRENCY,
+                 backoff_base=BACKOFF_BASE, backoff_cap=BACKOFF_CAP):
+        self.max_retries = max_retries
+        self.max_concurrency = max_concurrency
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+
+        self.condition = threading.Condition()
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+
+        self.started = time.perf_counter()
+        self.calls = 0
+        self.retries = 0
+        self.rejections = 0
+        self.gave_up = 0
+        self.by_error = {}
+        self.waited = 0.0
+        # Calls answered on each thread, to measure the cost of one operation
+        self.local = threading.local()
+
+    def wrap(self, obj):
+        return ScheduledProxy(self, obj)
+
+    def _acquire(self):
+        with self.condition:
+            while self.in_flight >= int(self.limit):
+                self.condition.wait()
+            self.in_flight += 1
+
+    # Additive increase on success, multiplicative decrease on rejection
+    def _release(self, succeeded, rejected):
+        with self.condition:
+            self.in_flight -= 1
+            if rejected:
+                self.limit = max(MIN_CONCURRENCY, self.limit / 2)
+            elif succeeded:
+                self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+            self.condition.notify_all()
+
+    def _count(self):
+        with self.condition:
+            self.calls += 1
+        self.local.calls = getattr(self.local, "calls", 0) + 1
+
+    # Calls answered so far on the calling thread
+    def thread_calls(self):
+        return getattr(self.local, "calls", 0)
+
+    # Run func() (one object-model call), retrying busy errors
+    def call(self, func):
+        attempt = 0
+        while True:
+            self._acquire()
+            succeeded = rejected = False
+            try:
+                result = func()
+                succeeded = True
+                self._count()
+                return result
+            except Exception as e:
+                code = error_code(e)
+                if code not in RETRYABLE_HRESULTS:
+                    # A permanent error is still an answer from the server
+                    succeeded = True
+                    self._count()
+                    raise
+                rejected = code in REJECTIONS
+                with self.condition:
+                    self.by_error[RETRYABLE_HRESULTS[code]] = self.by_error.get(RETRYABLE_HRESULTS[code], 0) + 1
+                    if rejected:
+                        self.rejections += 1
+                    if attempt >= self.max_retries:
+                        self.calls += 1
+                        self.gave_up += 1
+                        raise
+                    self.retries += 1
+            finally:
+                self._release(succeeded, rejected)
+
+            # Full jitter keeps the threads from retrying in lockstep
+            delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+            with self.condition:
+                self.waited += delay
+            time.sleep(delay)
+            attempt += 1
+
+    def stats(self):
+        with self.condition:
+            now = time.perf_counter()
+            elapsed = now - self.started
+            return {
+                "at": now,
+                "calls": self.calls,
+                "retries": self.retries,
+                "rejections": self.rejections,
+                "gave_up": self.gave_up,
+                "retry_errors": dict(self.by_error),
+                "backoff_seconds": round(self.waited, 2),
+                "concurrency_limit": round(self.limit, 2),
+                "calls_per_second": round(self.calls / elapsed, 1) if elapsed > 0 else 0.0,
+            }
+
+    # Stats for the calls made since `before` (an earlier stats())
+    def stats_since(self, before):
+        now = self.stats()
+        seconds = now["at"] - before["at"]
+        delta = {key: now[key] - before[key] for key in ("calls", "retries", "rejections", "gave_up")}
+        delta["at"] = now["at"]
+        delta["backoff_seconds"] = round(now["backoff_seconds"] - before["backoff_seconds"], 2)
+        delta["retry_errors"] = {name: count - before["retry_errors"].get(name, 0)
+                                 for name, count in now["retry_errors"].items()
+                                 if count != before["retry_errors"].get(name, 0)}
+        delta["concurrency_limit"] = now["concurrency_limit"]
+        delta["calls_per_second"] = round(delta["calls"] / seconds, 1) if seconds > 0 else 0.0
+        return delta
+
+
+def format_scheduler_stats(stats):
+    text = (f"{stats['calls']} Outlook calls ({stats['calls_per_second']}/s), {stats['retries']} retries, "
+            f"{stats['rejections']} rejected, {stats['gave_up']} failed after retrying, "
+            f"{stats['backoff_seconds']}s backing off, concurrency limit {stats['concurrency_limit']}")
+    if stats["retry_errors"]:
+        text += " (" + ", ".join(f"{name} x{count}" for name, count in stats["retry_errors"].items()) + ")"
+    return text
+
+
+_PLAIN = (str, int, float, bool, bytes, tuple, datetime.datetime)
+
+
+def _unwrap(value):
+    return value._obj if isinstance(value, ScheduledProxy) else value
+
+
+class ScheduledMethod:
+    def __init__(self, scheduler, method):
+        self._scheduler = scheduler
+        self._method = method
+
+    def __call__(self, *args):
+        args = [_unwrap(arg) for arg in args]
+        return _wrap(self._scheduler, self._scheduler.call(lambda: self._method(*args)))
+
+
+def _wrap(scheduler, value):
+    if value is None or isinstance(value, _PLAIN):
+        return value
+    if isinstance(value, (types.MethodType, types.FunctionType, types.BuiltinFunctionType)):
+        return ScheduledMethod(scheduler, value)
+    return ScheduledProxy(scheduler, value)
+
+
+class ScheduledProxy:
+    def __init__(self, scheduler, obj):
+        object.__setattr__(self, "_scheduler", scheduler)
+        object.__setattr__(self, "_obj", obj)
+
+    def __getattr__(self, name):
+        return _wrap(self._scheduler, self._scheduler.call(lambda: getattr(self._obj, name)))
+
+    def __setattr__(self, name, value):
+        self._scheduler.call(lambda: setattr(self._obj, name, _unwrap(value)))
+
+    def __bool__(self):
+        return self._scheduler.call(lambda: bool(self._obj))
+
+    def __iter__(self):
+        iterator = self._scheduler.call(lambda: iter(self._obj))
+        while True:
+            try:
+                item = self._scheduler.call(lambda: next(iterator))
+            except StopIteration:
+                return
+            yield _wrap(self._scheduler, item)
+
+
+# The scheduler shared by all Outlook sessions of this process; Exchange
+# throttles per user, so every scan in the process shares one limit
+SCHEDULER = CallScheduler()
@@ -0,0 +1,242 @@
+import argparse
+import csv
+import glob
+import gzip
+import heapq
+import itertools
+import json
+import logging
+import os
+import platform
+import tempfile
+from datetime import datetime
+
+from extraction import LAST_SEEN_COLUMN, SEEN_COUNT_COLUMN, ContactAggregator
+
+# Mergeable export artifacts, and the tool that merges them.
+#
+# To build one contact list from many workstations, each export can also
+# write an artifact (--artifact): its contacts, one address per record,
+# normalised like the Excel export but not merged by person, sorted by
+# address and gzipped as JSON lines behind a one-line header. Every record
+# says how often the address was seen ("Times Seen"), in the newest email
+# when ("Last Seen") and in how many exports ("Exports", 1 in a fresh
+# artifact).
+#
+#   python contact_artifact.py company.csv \\server\share\contacts\*.jsonl.gz
+#
+# merges any number of artifacts in one streaming k-way merge: the sorted
+# inputs are read side by side, and the records of one address are combined
+# as they come, with the scan's best-record rule (the first record with a
+# role, otherwise the first one, in input order), their counts added up and
+# the latest "Last Seen" kept. Only one record per input is held at a time,
+# and at most MAX_OPEN_ARTIFACTS inputs are merged at once; more are merged
+# in rounds through temporary artifacts, so memory stays the same however
+# many inputs there are. The result is a CSV file or, for an output named
+# *.jsonl.gz, an artifact itself, so merges can be merged again.
+
+ARTIFACT_FORMAT = "outlook-contacts-artifact"
+ARTIFACT_VERSION = 1
+ARTIFACT_SUFFIX = ".contacts.jsonl.gz"
+EXPORTS_COLUMN = "Exports"
+ARTIFACT_COLUMNS = ["First Name", "Last Name", "Full Name", "Email", "Role", "Source", "Confidence",
+                    SEEN_COUNT_COLUMN, LAST_SEEN_COLUMN, EXPORTS_COLUMN]
+MAX_OPEN_ARTIFACTS = 64
+
+
+def _write_records(path, header, records):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    count = 0
+    with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+        f.write(json.dumps(header) + "\n")
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    os.replace(tmp_path, path)
+    return count
+
+
+# Records of a scan (run_extraction with options.artifact) as an artifact:
+# normalised, one per address, sorted by address
+def artifact_records(records):
+    import pandas as pd
+    from normalize import normalize_contacts
+
+    if not records:
+        return []
+    result_df = normalize_contacts(pd.DataFrame(records)).sort_values("Email", kind="stable")
+    result_df[EXPORTS_COLUMN] = 1
+    columns = [column for column in ARTIFACT_COLUMNS if column in result_df.columns]
+    return result_df[columns].to_dict("records")
+
+
+# Where the artifact of this computer's export goes: `directory`, or the
+# Desktop (temp directory when the Desktop cannot be written). The computer
+# name keeps the files of many workstations apart on a shared folder.
+def artifact_path(directory=None, file_prefix="outlook_contacts"):
+    if not directory:
+        desktop_path = os.path.join(os.path.expanduser("~"), "Desktop")
+        directory = desktop_path if os.access(desktop_path, os.W_OK) else tempfile.gettempdir()
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    host = platform.node() or "unknown"
+    return os.path.join(directory, f"{file_prefix}_{host}_{timestamp}{ARTIFACT_SUFFIX}")
+
+
+def write_artifact(records, path, mailbox="", partial=False):
+    rows = artifact_records(records)
+    header = {"format": ARTIFACT_FORMAT, "version": ARTIFACT_VERSION, "host": platform.node(),
+              "mailbox": mailbox, "created": datetime.now().isoformat(timespec="seconds"),
+              "partial": partial, "contacts": len(rows)}
+    _write_records(path, header, rows)
+    logging.info(f"Wrote an artifact of {len(rows)} contacts to {path}")
+    return path
+
+
+def read_header(path):
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline() or "{}")
+    if header.get("format") != ARTIFACT_FORMAT:
+        raise ValueError(f"{path} is not a contact artifact")
+    if header.get("version") != ARTIFACT_VERSION:
+        raise ValueError(f"{path} has artifact version {header.get('version')}, expected {ARTIFACT_VERSION}")
+    return header
+
+
+# The records of an artifact in file order, checked to be sorted by address
+def read_artifact(path):
+    read_header(path)
+    previous = None
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        f.readline()
+        for line in f:
+            record = json.loads(line)
+            if previous is not None and record["Email"] < previous:
+                raise ValueError(f"{path} is not sorted by address at {record['Email']}")
+            previous = record["Email"]
+            yield record
+
+
+# One record for all records of the same address, in input order
+def combine_records(records):
+    best = {}
+    times_seen = exports = 0
+    last_seen = ""
+    for record in records:
+        ContactAggregator._keep(best, record)
+        times_seen += record.get(SEEN_COUNT_COLUMN) or 0
+        exports += record.get(EXPORTS_COLUMN) or 1
+        last_seen = max(last_seen, record.get(LAST_SEEN_COLUMN) or "")
+    combined = dict(next(iter(best.values())))
+    combined[SEEN_COUNT_COLUMN] = times_seen
+    combined[LAST_SEEN_COLUMN] = last_seen
+    combined[EXPORTS_COLUMN] = exports
+    return combined
+
+
+# k-way merge of record streams sorted by address: one combined record per
+# address, sorted. heapq.merge keeps equal addresses in input order.
+def merge_streams(streams):
+    merged = heapq.merge(*streams, key=lambda record: record["Email"])
+    for _, records in itertools.groupby(merged, key=lambda record: record["Email"]):
+        yield combine_records(records)
+
+
+def _write_csv(path, records):
+    tmp_path = path + ".tmp"
+    count = 0
+    # utf-8-sig so that Excel opens it with the right encoding
+    with open(tmp_path, "w", encoding="utf-8-sig", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=ARTIFACT_COLUMNS, restval="", extrasaction="ignore")
+        writer.writeheader()
+        for record in records:
+            writer.writerow(record)
+            count += 1
+    os.replace(tmp_path, path)
+    return count
+
+
+def _merge_header(paths):
+    return {"format": ARTIFACT_FORMAT, "version": ARTIFACT_VERSION, "host": platform.node(), "mailbox": "",
+            "created": datetime.now().isoformat(timespec="seconds"), "merged_from": len(paths)}
+
+
+# Merge the artifacts at `paths` into `output_path` (CSV, or an artifact when
+# it ends in .jsonl.gz). Returns the number of contacts written.
+def merge_artifacts(paths, output_path, fan_in=MAX_OPEN_ARTIFACTS, temp_dir=None):
+    if not paths:
+        raise ValueError("No artifacts to merge")
+    for path in paths:
+        read_header(path)
+    fan_in = max(2, fan_in)
+    temporary = []
+    try:
+        # Rounds of at most `fan_in` inputs each, until one merge is left
+        while len(paths) > fan_in:
+            next_paths = []
+            for start in range(0, len(paths), fan_in):
+                group = paths[start:start + fan_in]
+                fd, path = tempfile.mkstemp(prefix="contacts_merge_", suffix=ARTIFACT_SUFFIX, dir=temp_dir)
+                os.close(fd)
+                temporary.append(path)
+                _write_records(path, _merge_header(group), merge_streams([read_artifact(p) for p in group]))
+                next_paths.append(path)
+            logging.info(f"Merged {len(paths)} artifacts into {len(next_paths)}")
+            paths = next_paths
+
+        records = merge_streams([read_artifact(path) for path in paths])
+        if output_path.lower().endswith(".jsonl.gz"):
+            count = _write_records(output_path, _merge_header(paths), records)
+        else:
+            count = _write_csv(output_path, records)
+    finally:
+        for path in temporary:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+    logging.info(f"Merged {count} contacts into {output_path}")
+    return count
+
+
+# Files, folders (all artifacts in them) and wildcard patterns, which the
+# Windows command prompt does not expand itself
+def expand_inputs(inputs):
+    paths = []
+    for item in inputs:
+        if os.path.isdir(item):
+            paths.extend(sorted(glob.glob(os.path.join(item, "*" + ARTIFACT_SUFFIX))))
+        elif glob.has_magic(item):
+            paths.extend(sorted(glob.glob(item)))
+        else:
+            paths.append(item)
+    return paths
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Merge contact artifacts from many exports into one list")
+    parser.add_argument("output", help="CSV file to write, or an artifact (*.jsonl.gz) to merge again later")
+    parser.add_argument("inputs", nargs="+",
+                        help="Artifacts, folders of artifacts or wildcard patterns")
+    parser.add_argument("--fan-in", type=int, default=MAX_OPEN_ARTIFACTS,
+                        help="Artifacts merged at once; more are merged in rounds")
+    parser.add_argument("--temp-dir", default=None,
+                        help="Where the intermediate artifacts of a merge in rounds are written")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    from run_log import setup_logging
+
+    args = parse_args(argv)
+    log_dir = os.path.join(os.path.expanduser("~"), "AppData", "Local", "OutlookContactExporter")
+    os.makedirs(log_dir, exist_ok=True)
+    setup_logging(os.path.join(log_dir, "merge_log.txt"))
+
+    paths = expand_inputs(args.inputs)
+    count = merge_artifacts(paths, args.output, args.fan_in, args.temp_dir)
+    print(f"{count} contacts from {len(paths)} artifacts written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
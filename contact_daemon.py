@@ -0,0 +1,391 @@
+import argparse
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from progress_channel import ProgressChannel
+from run_log import setup_logging
+
+# Local contact query service.
+#
+# A long-running process that keeps one Outlook session open, builds an
+# in-memory contact index with the normal extraction pipeline, refreshes it
+# incrementally (only items modified since the last refresh are read), and
+# answers queries on http://127.0.0.1:<port>/ with JSON:
+#
+#   GET  /health                          index size and refresh state
+#   GET  /search?q=jan&domain=contoso.com prefix search on names and addresses
+#   GET  /contacts?domain=contoso.com     all contacts, optionally one domain
+#   GET  /export?format=xlsx&merge=1      write a workbook (or format=json)
+#   POST /refresh                         start an incremental refresh now
+#
+# Where the contacts come from is a backend. OutlookBackend scans Outlook;
+# FileBackend reads a JSON or CSV file of contact records, so the service can
+# be run and tested on machines without Outlook.
+
+DEFAULT_PORT = 8765
+DEFAULT_REFRESH_INTERVAL = 300  # seconds between incremental refreshes
+DEFAULT_LIMIT = 50
+EXPORT_FORMATS = ("json", "xlsx")
+REFRESH_OVERLAP = timedelta(minutes=5)  # re-read items modified just before the last refresh
+
+
+# Progress is not shown anywhere, so nothing is queued
+class SilentProgress(ProgressChannel):
+    def set_status(self, text, percent=None):
+        logging.debug(text)
+
+    def _post_progress(self, now=None):
+        self.last_post = now or time.perf_counter()
+
+    def finish(self, kind, title, message):
+        logging.info(f"{title}: {message}")
+
+
+# ---- backends ----------------------------------------------------------------
+
+# Scans Outlook through the extraction pipeline. Every call runs on the
+# daemon's refresh thread, which owns the warm MAPI session.
+class OutlookBackend:
+    def __init__(self, options=None):
+        self.options = options
+        self.namespace = None
+
+    def fetch(self, since=None):
+        from extraction import connect_outlook, run_extraction
+
+        if self.namespace is None:
+            self.namespace = connect_outlook()
+            logging.info("Opened Outlook session")
+        try:
+            records, stats = run_extraction(self.namespace, SilentProgress(), self.options, since=since)
+        except Exception:
+            # Reconnect on the next refresh, e.g. after Outlook was restarted
+            self.close()
+            raise
+        return records, stats
+
+    def close(self):
+        if self.namespace is not None:
+            from extraction import disconnect_outlook
+            disconnect_outlook(self.namespace)
+            self.namespace = None
+
+
+# Reads contact records (dicts with "Full Name", "Email" and optionally
+# "First Name", "Last Name", "Role", "Source") from a .json or .csv file.
+# The file is only read again when it has changed.
+class FileBackend:
+    def __init__(self, path):
+        self.path = path
+        self.mtime = None
+
+    def fetch(self, since=None):
+        mtime = os.path.getmtime(self.path)
+        if since is not None and mtime == self.mtime:
+            return [], {"items_processed": 0}
+        self.mtime = mtime
+
+        if self.path.lower().endswith(".csv"):
+            import csv
+            with open(self.path, "r", encoding="utf-8", newline="") as f:
+                records = list(csv.DictReader(f))
+        else:
+            with open(self.path, "r", encoding="utf-8") as f:
+                records = json.load(f)
+        return records, {"items_processed": len(records)}
+
+    def close(self):
+        pass
+
+
+# ---- index -------------------------------------------------------------------
+
+# Normalised contacts by address, with a sorted list of (search key, email)
+# for prefix search on full name, first name, last name and address.
+class ContactIndex:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.contacts = {}
+        self.by_domain = {}
+        self.keys = []
+
+    def __len__(self):
+        return len(self.contacts)
+
+    # Add or update records; returns the number of contacts added or changed.
+    # As in the scan, a record with a role replaces one without.
+    def upsert(self, records):
+        if not records:
+            return 0
+        import pandas as pd
+        from normalize import normalize_contacts
+
+        df = normalize_contacts(pd.DataFrame(records)).fillna("")
+        changed = 0
+        with self.lock:
+            for record in df.to_dict("records"):
+                email = record["Email"]
+                current = self.contacts.get(email)
+                if current is None or (str(record.get("Role", "")) or not str(current.get("Role", ""))):
+                    if current != record:
+                        self.contacts[email] = record
+                        self.by_domain.setdefault(email.partition("@")[2], set()).add(email)
+                        changed += 1
+            if changed:
+                self._rebuild_keys()
+        return changed
+
+    def _rebuild_keys(self):
+        keys = []
+        for email, record in self.contacts.items():
+            keys.append((email, email))
+            for column in ("Full Name", "First Name", "Last Name"):
+                value = str(record.get(column, "")).strip().lower()
+                if value:
+                    keys.append((value, email))
+        keys.sort()
+        self.keys = keys
+
+    def search(self, prefix, domain=None, limit=DEFAULT_LIMIT):
+        prefix = prefix.strip().lower()
+        domain = (domain or "").lower()
+        results, seen = [], set()
+        with self.lock:
+            start = bisect.bisect_left(self.keys, (prefix,))
+            for key, email in self.keys[start:]:
+                if not key.startswith(prefix) or len(results) >= limit:
+                    break
+                if email in seen or (domain and not email.endswith("@" + domain)):
+                    continue
+                seen.add(email)
+                results.append(self.contacts[email])
+        return results
+
+    def all(self, domain=None, limit=None):
+        with self.lock:
+            if domain:
+                emails = sorted(self.by_domain.get(domain.lower(), ()))
+            else:
+                emails = sorted(self.contacts)
+            if limit:
+                emails = emails[:limit]
+            return [self.contacts[email] for email in emails]
+
+
+# ---- service -----------------------------------------------------------------
+
+class ContactService:
+    def __init__(self, backend, refresh_interval=DEFAULT_REFRESH_INTERVAL):
+        self.backend = backend
+        self.refresh_interval = refresh_interval
+        self.index = ContactIndex()
+        self.last_refresh = None
+        self.last_refresh_seconds = None
+        self.last_error = None
+        self.refresh_requested = threading.Event()
+        self.stopping = threading.Event()
+        self.refreshing = False
+        self.thread = None
+
+    def refresh(self):
+        started = datetime.now()
+        clock = time.perf_counter()
+        # Incremental after the first full scan
+        since = self.last_refresh - REFRESH_OVERLAP if self.last_refresh else None
+        self.refreshing = True
+        try:
+            records, stats = self.backend.fetch(since)
+            changed = self.index.upsert(records)
+            self.last_refresh = started
+            self.last_refresh_seconds = time.perf_counter() - clock
+            self.last_error = None
+            logging.info(f"Refresh {'since ' + str(since) if since else '(full)'}: "
+                         f"{stats.get('items_processed', 0)} items, {changed} contacts changed, "
+                         f"{len(self.index)} in index, {self.last_refresh_seconds:.1f}s")
+        except Exception as e:
+            self.last_error = str(e)
+            logging.error(f"Refresh failed: {e}")
+        finally:
+            self.refreshing = False
+
+    # All backend calls happen on this one thread, so a COM session opened by
+    # the backend stays in the apartment that created it
+    def _run(self):
+        try:
+            while not self.stopping.is_set():
+                self.refresh()
+                self.refresh_requested.wait(self.refresh_interval)
+                self.refresh_requested.clear()
+        finally:
+            self.backend.close()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="contact-refresh", daemon=True)
+        self.thread.start()
+
+    def request_refresh(self):
+        self.refresh_requested.set()
+
+    def stop(self):
+        self.stopping.set()
+        self.refresh_requested.set()
+        if self.thread:
+            self.thread.join(timeout=30)
+
+    def health(self):
+        return {
+            "status": "ok" if self.last_error is None else "error",
+            "contacts": len(self.index),
+            "refreshing": self.refreshing,
+            "last_refresh": self.last_refresh.isoformat(timespec="seconds") if self.last_refresh else None,
+            "last_refresh_seconds": self.last_refresh_seconds,
+            "last_error": self.last_error,
+        }
+
+    def export(self, fmt="json", domain=None, merge=True):
+        records = self.index.all(domain)
+        if fmt == "json":
+            return {"contacts": records}
+        if not records:
+            return {"file": None, "contacts": 0}
+        from extraction import prepare_contacts, save_contacts
+        result_df = prepare_contacts(records, merge)
+        return {"file": save_contacts(result_df), "contacts": len(result_df)}
+
+
+# A query parameter the client got wrong; answered with 400
+class BadRequest(Exception):
+    pass
+
+
+def _first(query, name, default=None):
+    values = query.get(name)
+    return values[0] if values else default
+
+
+def _limit(query):
+    value = _first(query, "limit")
+    if value is None:
+        return DEFAULT_LIMIT
+    try:
+        limit = int(value)
+    except ValueError:
+        raise BadRequest(f"limit must be a whole number, not {value!r}")
+    if limit < 1:
+        raise BadRequest(f"limit must be at least 1, not {limit}")
+    return limit
+
+
+def _export_format(query):
+    fmt = _first(query, "format", "json")
+    if fmt not in EXPORT_FORMATS:
+        raise BadRequest(f"format must be one of {', '.join(EXPORT_FORMATS)}, not {fmt!r}")
+    return fmt
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def _send(self, status, body):
+            data = json.dumps(body, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = parse_qs(url.query)
+            try:
+                limit = _limit(query)
+                domain = _first(query, "domain")
+                if url.path == "/health":
+                    self._send(200, service.health())
+                elif url.path == "/search":
+                    results = service.index.search(_first(query, "q", ""), domain, limit)
+                    self._send(200, {"count": len(results), "contacts": results})
+                elif url.path == "/contacts":
+                    results = service.index.all(domain, limit)
+                    self._send(200, {"count": len(results), "contacts": results})
+                elif url.path == "/export":
+                    merge = _first(query, "merge", "1") != "0"
+                    self._send(200, service.export(_export_format(query), domain, merge))
+                else:
+                    self._send(404, {"error": f"unknown path {url.path}"})
+            except BadRequest as e:
+                self._send(400, {"error": str(e)})
+            except Exception as e:
+                logging.error(f"Request {self.path} failed: {e}")
+                self._send(500, {"error": str(e)})
+
+        def do_POST(self):
+            if urlparse(self.path).path == "/refresh":
+                service.request_refresh()
+                self._send(202, {"refresh": "requested"})
+            else:
+                self._send(404, {"error": f"unknown path {self.path}"})
+
+        def log_message(self, format, *args):
+            logging.debug("HTTP " + format % args)
+
+    return Handler
+
+
+# Serve on localhost only; the API has no authentication
+def serve(service, port=DEFAULT_PORT):
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(service))
+    service.start()
+    logging.info(f"Contact service listening on http://127.0.0.1:{server.server_address[1]}/")
+    return server
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Local contact query service")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--refresh-interval", type=float, default=DEFAULT_REFRESH_INTERVAL,
+                        help="Seconds between incremental refreshes")
+    parser.add_argument("--backend", choices=["outlook", "file"], default="outlook")
+    parser.add_argument("--source", default=None,
+                        help="JSON or CSV file of contact records for the file backend")
+    parser.add_argument("--rules-file", default=None,
+                        help="Where learned X500-to-SMTP address rules are kept")
+    parser.add_argument("--role-cache-file", default=None,
+                        help="Where roles found in email signatures are cached between runs")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    log_dir = os.path.join(os.path.expanduser("~"), "AppData", "Local", "OutlookContactExporter")
+    os.makedirs(log_dir, exist_ok=True)
+    setup_logging(os.path.join(log_dir, "daemon_log.txt"))
+
+    if args.backend == "file":
+        if not args.source:
+            raise SystemExit("--source is required with --backend file")
+        backend = FileBackend(args.source)
+    else:
+        backend = OutlookBackend(args)
+
+    service = ContactService(backend, args.refresh_interval)
+    server = serve(service, args.port)
+    print(f"Listening on http://127.0.0.1:{server.server_address[1]}/ (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
+
+
+if __name__ == "__main__":
+    main()
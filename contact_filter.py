@@ -0,0 +1,233 @@
+import json
+import re
+import threading
+
+# Include/exclude filters applied while scanning.
+#
+# Unwanted contacts (colleagues, no-reply senders, mailing lists, whole
+# domains) used to be removed from the finished export, after each of them
+# had been resolved through the GAL and had its signature analysed. A
+# ContactFilter compiles the filter specification once (domain sets, one
+# combined regular expression for addresses and one for names) and is asked
+# about every sender and recipient as soon as the reader knows its address.
+# Dropped entries never reach the resolver or the role extractor; the body of
+# an email is not read when nobody on it is kept, and recipient lists are not
+# read at all when only senders are wanted.
+#
+# An entry known only by its Exchange (X500) address cannot be matched
+# against address patterns yet. Once the address rules (address_rules.py)
+# know the tenant's domain, the resolver checks the domain lists against it
+# before looking the entry up; otherwise the entry is kept (unless internal
+# addresses are excluded) and checked again once its SMTP address is known.
+#
+# Specification (a JSON file, extended by command line options):
+#   {"include_domains": [...], "exclude_domains": [...],
+#    "exclude_addresses": [regex, ...], "exclude_names": [regex, ...],
+#    "exclude_internal": false, "contacts": "all" | "senders" | "recipients",
+#    "include_folders": [...], "exclude_folders": [...], "exclude_automated": false}
+# Domains match subdomains too; patterns are searched case-insensitively.
+
+CONTACT_KINDS = ("all", "senders", "recipients")
+SENDER, RECIPIENT, CONTACT = "sender", "recipient", "contact"
+
+# No-reply senders, bounces and mailing list addresses
+AUTOMATED_PATTERNS = [
+    r"^(no-?reply|do-?not-?reply|donotreply|noreply-[^@]*|mailer-daemon|postmaster|bounces?)[@+]",
+    r"^[^@]*[-+.](bounces?|request|owner|unsubscribe)[@+]",
+    r"^(listserv|majordomo|mailman|lists?|newsletters?|notifications?)@",
+    r"@(lists?|bounces?|mailer)\.",
+]
+
+# Answers of check(): keep, drop, or decide once the SMTP address is known
+KEEP, DROP, UNDECIDED = True, False, None
+
+MAX_DECISIONS = 200000   # cached (address, name, role) decisions
+BODY_READ_CALLS = 2      # hasattr(item, "Body") and item.Body
+SMTP_READ_CALLS = 3      # recipient.PropertyAccessor.GetProperty(...)
+
+SPEC_KEYS = ("include_domains", "exclude_domains", "exclude_addresses", "exclude_names", "exclude_internal",
+             "contacts", "include_folders", "exclude_folders", "exclude_automated")
+
+
+def _domain(address):
+    return address.rpartition("@")[2].lower() if address and "@" in address else ""
+
+
+def _in_domains(domain, domains):
+    # a.b.example.com matches a.b.example.com, b.example.com and example.com
+    while domain:
+        if domain in domains:
+            return True
+        domain = domain.partition(".")[2]
+    return False
+
+
+def _pattern(patterns):
+    if not patterns:
+        return None
+    return re.compile("|".join(f"(?:{pattern})" for pattern in patterns), re.IGNORECASE)
+
+
+class ContactFilter:
+    def __init__(self, include_domains=(), exclude_domains=(), exclude_addresses=(), exclude_names=(),
+                 exclude_internal=False, contacts="all", include_folders=(), exclude_folders=(),
+                 exclude_automated=False):
+        if contacts not in CONTACT_KINDS:
+            raise ValueError(f"contacts must be one of {CONTACT_KINDS}")
+        self.include_domains = {domain.lower().lstrip("@") for domain in include_domains}
+        self.exclude_domains = {domain.lower().lstrip("@") for domain in exclude_domains}
+        patterns = list(exclude_addresses) + (AUTOMATED_PATTERNS if exclude_automated else [])
+        self.address_pattern = _pattern(patterns)
+        self.name_pattern = _pattern(list(exclude_names))
+        self.exclude_internal = exclude_internal
+        self.senders = contacts in ("all", "senders")
+        self.recipients = contacts in ("all", "recipients")
+        self.include_folders = {folder.lower() for folder in include_folders}
+        self.exclude_folders = {folder.lower() for folder in exclude_folders}
+
+        self.lock = threading.Lock()
+        self.decisions = {}
+        # What was not done because of the filter
+        self.dropped = 0                # entries dropped before resolution
+        self.dropped_resolved = 0       # entries dropped once their SMTP address was known
+        self.dropped_lookup_keys = set()
+        self.smtp_reads_skipped = 0
+        self.bodies_skipped = 0
+        self.recipient_lists_skipped = 0
+        self.messages_dropped = 0
+        self.folders_skipped = []
+
+    @classmethod
+    def from_spec(cls, spec):
+        unknown = set(spec) - set(SPEC_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown filter settings: {', '.join(sorted(unknown))}")
+        return cls(**spec)
+
+    def wants_folder(self, folder_name):
+        name = folder_name.lower()
+        if self.include_folders and name not in self.include_folders:
+            return False
+        return name not in self.exclude_folders
+
+    # KEEP, DROP or UNDECIDED for one address (SMTP, X500 or None) and
+    # display name seen as `role`
+    def check(self, address, name, role):
+        if role == SENDER and not self.senders or role == RECIPIENT and not self.recipients:
+            return DROP
+        key = (address, name, role)
+        decision = self.decisions.get(key, "")
+        if decision != "":
+            return decision
+
+        decision = KEEP
+        if name and self.name_pattern is not None and self.name_pattern.search(name):
+            decision = DROP
+        elif not address or address.lower().startswith("/o="):
+            # Only an Exchange address (or none) so far
+            if address and self.exclude_internal:
+                decision = DROP
+            elif self.include_domains or self.exclude_domains or self.address_pattern is not None:
+                decision = UNDECIDED
+        else:
+            domain = _domain(address)
+            if self.include_domains and not _in_domains(domain, self.include_domains):
+                decision = DROP
+            elif self.exclude_domains and _in_domains(domain, self.exclude_domains):
+                decision = DROP
+            elif self.address_pattern is not None and self.address_pattern.search(address):
+                decision = DROP
+
+        if len(self.decisions) >= MAX_DECISIONS:
+            self.decisions.clear()
+        self.decisions[key] = decision
+        return decision
+
+    # Called by the reader for an entry dict (see extraction.read_mail_item)
+    # before it is resolved; True when the entry is to be dropped
+    def drop_entry(self, entry, role):
+        if self.check(entry["email"], entry["name"], role) is not DROP:
+            return False
+        self._dropped(entry, role)
+        return True
+
+    # Called by the resolver before looking up an Exchange-only entry of the
+    # tenant whose SMTP domain is `tenant_domain`
+    def drop_tenant_entry(self, entry, role, tenant_domain):
+        domain = tenant_domain.lower()
+        if not (self.include_domains and not _in_domains(domain, self.include_domains)
+                or self.exclude_domains and _in_domains(domain, self.exclude_domains)):
+            return False
+        self._dropped(entry, role)
+        return True
+
+    def _dropped(self, entry, role):
+        with self.lock:
+            self.dropped += 1
+            # The GAL lookups the resolver would have made for it (senders
+            # with an SMTP address and Contacts folder items are never looked up)
+            if role == RECIPIENT or role == SENDER and entry["exchange_address"]:
+                if entry["exchange_address"]:
+                    self.dropped_lookup_keys.add(entry["exchange_address"].lower())
+                if entry["name"]:
+                    self.dropped_lookup_keys.add(entry["name"].lower())
+
+    # Called by the resolver once an entry's address is final
+    def drop_resolved(self, entry, role):
+        email = entry["email"]
+        if not email or "@" not in email or self.check(email, entry["name"], role) is not DROP:
+            return False
+        with self.lock:
+            self.dropped_resolved += 1
+        return True
+
+    # Lookups avoided: keys of dropped entries the resolver never looked up
+    # for anyone else. `lookup_cost(key)` is what such a lookup cost in this run.
+    def report(self, looked_up, lookup_cost):
+        saved = self.dropped_lookup_keys - set(looked_up)
+        saved_lookups = len(saved)
+        calls_saved = (sum(lookup_cost(key) for key in saved) + self.smtp_reads_skipped * SMTP_READ_CALLS
+                       + self.bodies_skipped * BODY_READ_CALLS)
+        return {
+            "dropped_before_resolution": self.dropped,
+            "dropped_after_resolution": self.dropped_resolved,
+            "messages_dropped": self.messages_dropped,
+            "gal_lookups_saved": saved_lookups,
+            "bodies_skipped": self.bodies_skipped,
+            "recipient_lists_skipped": self.recipient_lists_skipped,
+            "folders_skipped": list(self.folders_skipped),
+            "smtp_reads_skipped": self.smtp_reads_skipped,
+            "outlook_calls_saved": round(calls_saved),
+        }
+
+
+def format_filter_stats(report):
+    text = (f"{report['dropped_before_resolution']:,} senders/recipients filtered out before resolving, "
+            f"{report['dropped_after_resolution']:,} after; {report['gal_lookups_saved']:,} GAL lookups, "
+            f"{report['bodies_skipped']:,} email bodies and {report['recipient_lists_skipped']:,} recipient "
+            f"lists not read, about {report['outlook_calls_saved']:,} Outlook calls saved")
+    if report["folders_skipped"]:
+        text += f"; folders skipped: {', '.join(report['folders_skipped'])}"
+    return text
+
+
+# The filter described by options.filter_file and the filter command line
+# options, or None when nothing is filtered
+def filter_from_options(options):
+    spec = {}
+    if getattr(options, "filter_file", None):
+        with open(options.filter_file, "r", encoding="utf-8") as f:
+            spec = json.load(f)
+    for key in ("include_domains", "exclude_domains", "exclude_addresses", "exclude_names",
+                "include_folders", "exclude_folders"):
+        values = list(spec.get(key, [])) + list(getattr(options, key, None) or [])
+        if values:
+            spec[key] = values
+    for key in ("exclude_internal", "exclude_automated"):
+        if getattr(options, key, False):
+            spec[key] = True
+    if getattr(options, "contacts", None) not in (None, "all"):
+        spec["contacts"] = options.contacts
+    if not spec:
+        return None
+    return ContactFilter.from_spec(spec)
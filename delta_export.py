@@ -0,0 +1,155 @@
+import gzip
+import hashlib
+import logging
+import os
+
+from extraction import LAST_SEEN_COLUMN, SEEN_COUNT_COLUMN, save_contacts
+
+# Delta export: write only what changed since the previous export.
+#
+# The previous export is remembered as a compact index, one "email<TAB>hash"
+# line per contact sorted by address, gzipped. The hash covers the fields a
+# CRM cares about (every column except Source, Confidence and the sighting
+# counts of --artifact runs), so a contact whose name, role or other addresses
+# changed gets a new hash. The new export is hashed the same way and sorted,
+# and the two sorted lists are merged line by line: the old index is streamed
+# from disk and never loaded whole. Added and changed contacts are written
+# with their full row, removed ones with their address only; a "Change" column
+# says which is which. The index is replaced only after the delta file has
+# been written, so a failed run does not lose changes. A partial scan (stopped
+# by the time budget or cancelled) cannot tell removed contacts from ones it
+# did not get to: it reports no removals and leaves the index as it was.
+# Neither can a scan that skipped the rest of a saturated folder
+# (--saturation): it reports no removals either, and the index keeps the old
+# entries of the contacts it did not see next to the new ones.
+
+DELTA_INDEX_FILE_NAME = "export_index.tsv.gz"
+DEFAULT_DELTA_INDEX_PATH = os.path.join(os.path.expanduser("~"), "AppData", "Local", "OutlookContactExporter",
+                                        DELTA_INDEX_FILE_NAME)
+
+IGNORED_COLUMNS = ("Source", "Confidence", SEEN_COUNT_COLUMN, LAST_SEEN_COLUMN)
+CHANGE_COLUMN = "Change"
+ADDED, CHANGED, REMOVED = "added", "changed", "removed"
+
+
+# (email, hash) for every row of a prepared export, sorted by email
+def record_hashes(result_df):
+    columns = [column for column in result_df.columns if column not in IGNORED_COLUMNS and column != "Email"]
+    # Plain lists: iterating Arrow-backed string columns is much slower
+    emails = result_df["Email"].astype(str).str.lower().tolist()
+    values = [result_df[column].fillna("").astype(str).tolist() for column in columns]
+    hashes = {}
+    for email, *fields in zip(emails, *values):
+        if email not in hashes:
+            text = "\x1f".join(fields)
+            hashes[email] = hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+    return sorted(hashes.items())
+
+
+# (email, hash) lines of an index file, in file order (sorted by email)
+def read_index(path):
+    if not path or not os.path.exists(path):
+        return
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            email, _, record_hash = line.rstrip("\n").partition("\t")
+            if email:
+                yield email, record_hash
+
+
+def write_index(path, hashes):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8", compresslevel=6) as f:
+        f.writelines(f"{email}\t{record_hash}\n" for email, record_hash in hashes)
+    os.replace(tmp_path, path)
+
+
+# Merge two lists sorted by email into (change, email) for every difference
+def diff_sorted(old, new):
+    old = iter(old)
+    new = iter(new)
+    old_item = next(old, None)
+    new_item = next(new, None)
+    while old_item is not None or new_item is not None:
+        if new_item is None or (old_item is not None and old_item[0] < new_item[0]):
+            yield REMOVED, old_item[0]
+            old_item = next(old, None)
+        elif old_item is None or new_item[0] < old_item[0]:
+            yield ADDED, new_item[0]
+            new_item = next(new, None)
+        else:
+            if old_item[1] != new_item[1]:
+                yield CHANGED, new_item[0]
+            old_item = next(old, None)
+            new_item = next(new, None)
+
+
+# Old index entries merged with new ones, both sorted by email; for an
+# address in both, the new entry wins
+def merge_index(old, new):
+    new = iter(new)
+    new_item = next(new, None)
+    for old_item in old:
+        while new_item is not None and new_item[0] < old_item[0]:
+            yield new_item
+            new_item = next(new, None)
+        if new_item is None or new_item[0] != old_item[0]:
+            yield old_item
+    while new_item is not None:
+        yield new_item
+        new_item = next(new, None)
+
+
+# The rows of `result_df` that changed since the export recorded in
+# `index_path`, plus rows for removed addresses, and the new hashes.
+# Returns (delta_df, counts, hashes).
+def compute_delta(result_df, index_path, partial=False):
+    import pandas as pd
+
+    hashes = record_hashes(result_df)
+    changes = {}
+    removed = []
+    counts = {ADDED: 0, CHANGED: 0, REMOVED: 0}
+    for change, email in diff_sorted(read_index(index_path), hashes):
+        if change == REMOVED and partial:
+            continue
+        counts[change] += 1
+        if change == REMOVED:
+            removed.append(email)
+        else:
+            changes[email] = change
+
+    row_changes = [changes.get(email) for email in result_df["Email"].astype(str).str.lower().tolist()]
+    changed_rows = [change is not None for change in row_changes]
+    delta_df = result_df[changed_rows].copy()
+    delta_df.insert(0, CHANGE_COLUMN, [change for change in row_changes if change is not None])
+    if removed:
+        removed_df = pd.DataFrame({CHANGE_COLUMN: REMOVED, "Email": removed})
+        delta_df = pd.concat([delta_df, removed_df], ignore_index=True).fillna("")
+    return delta_df, counts, hashes
+
+
+# Write the delta file and update the index. `stopped_early` is a scan that
+# did not read every folder to the end (scan_coverage.ScanCoverage
+# .stopped_early). Returns (file path or None when nothing changed, counts).
+def write_delta(result_df, index_path=None, file_prefix="outlook_contacts_delta", partial=False,
+                stopped_early=False):
+    index_path = index_path or DEFAULT_DELTA_INDEX_PATH
+    first_export = not os.path.exists(index_path)
+    delta_df, counts, hashes = compute_delta(result_df, index_path, partial or stopped_early)
+
+    file_path = save_contacts(delta_df, file_prefix) if len(delta_df) else None
+    if stopped_early and not partial:
+        write_index(index_path, merge_index(read_index(index_path), hashes))
+    elif not partial:
+        write_index(index_path, hashes)
+
+    logging.info(f"Delta export{' (first, no previous index)' if first_export else ''}: "
+                 f"{counts[ADDED]} added, {counts[CHANGED]} changed, {counts[REMOVED]} removed"
+                 f"{' -> ' + file_path if file_path else ', nothing written'}")
+    return file_path, counts
+
+
+def format_delta(counts):
+    return f"{counts[ADDED]} added, {counts[CHANGED]} changed, {counts[REMOVED]} removed"
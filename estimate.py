@@ -0,0 +1,263 @@
+import hashlib
+import math
+import random
+import time
+
+# Quick estimate mode: instead of walking every item, read Items.Count per
+# folder, look at a small stratified sample of items and feed the addresses
+# we see into a HyperLogLog sketch. The sketch gives the number of distinct
+# addresses in the sample with fixed memory; the growth of that number as the
+# sample gets bigger is extrapolated to the full mailbox (Heaps' law).
+
+DEFAULT_SAMPLE_FRACTION = 0.02
+DEFAULT_MIN_PER_FOLDER = 20
+DEFAULT_MAX_PER_FOLDER = 500
+DEFAULT_TIME_BUDGET = 10  # seconds
+
+SMTP_PROPERTY = "http://schemas.microsoft.com/mapi/proptag/0x39FE001E"
+
+
+class HyperLogLog:
+    # Standard HyperLogLog (Flajolet et al. 2007) with 2^precision registers.
+    # precision=12 uses 4096 small ints and has ~1.6% standard error.
+    def __init__(self, precision=12):
+        if precision < 4 or precision > 16:
+            raise ValueError("precision must be between 4 and 16")
+        self.precision = precision
+        self.num_registers = 1 << precision
+        self.registers = bytearray(self.num_registers)
+
+        if self.num_registers == 16:
+            self.alpha = 0.673
+        elif self.num_registers == 32:
+            self.alpha = 0.697
+        elif self.num_registers == 64:
+            self.alpha = 0.709
+        else:
+            self.alpha = 0.7213 / (1 + 1.079 / self.num_registers)
+
+    def add(self, value):
+        digest = hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest()
+        x = int.from_bytes(digest, "big")
+
+        # First `precision` bits pick the register, the rest give the rank
+        index = x >> (64 - self.precision)
+        remaining = x & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - remaining.bit_length() + 1
+
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError("Cannot merge sketches with different precision")
+        for i in range(self.num_registers):
+            if other.registers[i] > self.registers[i]:
+                self.registers[i] = other.registers[i]
+
+    def count(self):
+        m = self.num_registers
+        harmonic_sum = 0.0
+        zeros = 0
+        for register in self.registers:
+            harmonic_sum += 2.0 ** -register
+            if register == 0:
+                zeros += 1
+
+        estimate = self.alpha * m * m / harmonic_sum
+
+        # Small range correction: fall back to linear counting
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+
+        return int(round(estimate))
+
+
+# Pick `sample_size` item indexes spread evenly over a 1-based collection of
+# `count` items: one random index inside each equal-width stratum.
+def stratified_indexes(count, sample_size, rng):
+    if count <= 0 or sample_size <= 0:
+        return []
+    if sample_size >= count:
+        return list(range(1, count + 1))
+
+    stride = count / sample_size
+    indexes = []
+    for i in range(sample_size):
+        low = int(i * stride)
+        high = max(low + 1, int((i + 1) * stride))
+        indexes.append(1 + rng.randrange(low, high))
+    return indexes
+
+
+# Read the addresses of one mail item using only cheap properties. No
+# resolution is attempted here - we only need something stable to count.
+def sample_item_addresses(item):
+    addresses = []
+    try:
+        if item.Class != 43:  # olMailItem
+            return addresses
+    except:
+        return addresses
+
+    try:
+        sender_email = item.SenderEmailAddress
+        if sender_email:
+            addresses.append(sender_email.lower())
+    except:
+        pass
+
+    try:
+        for recipient in item.Recipients:
+            try:
+                email = recipient.Address
+                if not email or "@" not in email:
+                    try:
+                        email = recipient.PropertyAccessor.GetProperty(SMTP_PROPERTY) or email
+                    except:
+                        pass
+                if email:
+                    addresses.append(email.lower())
+            except:
+                pass
+    except:
+        pass
+
+    return addresses
+
+
+# Fit distinct = k * items^beta through the (items, distinct) checkpoints
+# collected while sampling and extrapolate to `total_items`. Only the second
+# half of the sample is used for the fit: growth always slows down as the
+# sample saturates, and the early, steep part would overshoot badly.
+def extrapolate_unique(checkpoints, total_items):
+    points = [(n, d) for n, d in checkpoints if n > 0 and d > 0]
+    if not points:
+        return 0
+
+    sampled_items, sampled_unique = points[-1]
+    if total_items <= sampled_items:
+        return sampled_unique
+
+    tail = [(n, d) for n, d in points if n >= sampled_items / 2]
+    beta = 1.0
+    if len(tail) >= 2:
+        xs = [math.log(n) for n, _ in tail]
+        ys = [math.log(d) for _, d in tail]
+        mean_x = sum(xs) / len(xs)
+        mean_y = sum(ys) / len(ys)
+        var_x = sum((x - mean_x) ** 2 for x in xs)
+        if var_x > 0:
+            beta = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var_x
+
+    # Distinct counts can neither shrink nor grow faster than the item count
+    beta = min(max(beta, 0.0), 1.0)
+    return int(round(sampled_unique * (total_items / sampled_items) ** beta))
+
+
+def estimate_contacts(folders, sample_fraction=DEFAULT_SAMPLE_FRACTION,
+                      min_per_folder=DEFAULT_MIN_PER_FOLDER,
+                      max_per_folder=DEFAULT_MAX_PER_FOLDER,
+                      time_budget=DEFAULT_TIME_BUDGET, seed=None,
+                      status_callback=None):
+    rng = random.Random(seed)
+    started = time.perf_counter()
+
+    # Read Items.Count for every folder and plan the sample
+    folder_counts = {}
+    plan = []
+    for folder_name, folder in folders.items():
+        try:
+            items = folder.Items
+            count = items.Count
+        except:
+            continue
+
+        folder_counts[folder_name] = count
+        sample_size = int(math.ceil(count * sample_fraction))
+        sample_size = min(count, max(min_per_folder, min(max_per_folder, sample_size)))
+        for index in stratified_indexes(count, sample_size, rng):
+            plan.append((folder_name, items, index))
+
+    total_items = sum(folder_counts.values())
+
+    # Shuffle so that any prefix of the plan is itself a spread-out sample;
+    # this lets us stop at the time budget and still extrapolate sensibly.
+    rng.shuffle(plan)
+
+    sketch = HyperLogLog()
+    checkpoints = []
+    sampled_per_folder = {}
+    sampled_items = 0
+    addresses_seen = 0
+    checkpoint_every = max(1, len(plan) // 16)
+    sampling_started = time.perf_counter()
+
+    for folder_name, items, index in plan:
+        if time_budget and time.perf_counter() - started > time_budget:
+            break
+
+        try:
+            item = items.Item(index)
+        except:
+            continue
+
+        for address in sample_item_addresses(item):
+            sketch.add(address)
+            addresses_seen += 1
+
+        sampled_items += 1
+        sampled_per_folder[folder_name] = sampled_per_folder.get(folder_name, 0) + 1
+
+        if sampled_items % checkpoint_every == 0:
+            checkpoints.append((sampled_items, sketch.count()))
+            if status_callback:
+                status_callback(f"Sampled {sampled_items} of {len(plan)} items...")
+
+    sampling_seconds = time.perf_counter() - sampling_started
+    if not checkpoints or checkpoints[-1][0] != sampled_items:
+        checkpoints.append((sampled_items, sketch.count()))
+
+    # Sampling reads only the addresses of each item: no GAL lookups and no
+    # bodies for roles, which a real export does. The projection is a lower
+    # bound on the export's runtime, not an estimate of it.
+    items_per_sec = sampled_items / sampling_seconds if sampling_seconds > 0 else 0.0
+    projected_seconds = total_items / items_per_sec if items_per_sec > 0 else None
+
+    return {
+        "total_items": total_items,
+        "folder_counts": folder_counts,
+        "sampled_items": sampled_items,
+        "sampled_per_folder": sampled_per_folder,
+        "addresses_seen": addresses_seen,
+        "sample_unique": checkpoints[-1][1] if sampled_items else 0,
+        "estimated_unique_contacts": extrapolate_unique(checkpoints, total_items),
+        "items_per_sec": items_per_sec,
+        "projected_seconds": projected_seconds,
+        "elapsed_seconds": time.perf_counter() - started,
+    }
+
+
+def format_duration(seconds):
+    if seconds is None:
+        return "unknown"
+    seconds = int(round(seconds))
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}h {minutes:02d}m"
+    if minutes:
+        return f"{minutes}m {seconds:02d}s"
+    return f"{seconds}s"
+
+
+def format_estimate(result):
+    lines = [
+        f"Items in mailbox: {result['total_items']:,}",
+        f"Items sampled: {result['sampled_items']:,} "
+        f"({result['elapsed_seconds']:.1f}s)",
+        f"Estimated unique contacts: ~{result['estimated_unique_contacts']:,}",
+        f"Sampling speed: {result['items_per_sec']:.0f} items/sec (addresses only, without GAL lookups or roles)",
+        f"Projected full export time: at least {format_duration(result['projected_seconds'])}",
+    ]
+    return "\n".join(lines)
@@ -1,25 +1,21 @@
 import sys
 import os
 import subprocess
+import importlib.util
 import traceback
-import tempfile
-from datetime import datetime
+
+# Module that proves each pip package is installed
+PACKAGE_MODULES = {"pywin32": "win32com"}
 
 # Function to check and install required packages
 def ensure_packages():
-    required_packages = ["pywin32", "pandas", "openpyxl", "tkinter"]
+    required_packages = ["pywin32", "pandas", "pyarrow", "openpyxl", "tkinter"]
     missing_packages = []
     
-    # First try importing each package to see if it's already installed
+    # Look the packages up without importing them: importing pandas and
+    # win32com here would cost seconds before the window even appears
     for package in required_packages:
-        try:
-            if package == "pywin32":
-                __import__("win32com")
-            elif package == "tkinter":
-                __import__("tkinter")
-            else:
-                __import__(package)
-        except ImportError:
+        if importlib.util.find_spec(PACKAGE_MODULES.get(package, package)) is None:
             missing_packages.append(package)
     
     # If missing packages, install them
@@ -48,529 +44,196 @@ def ensure_packages():
             os.execv(sys.executable, [sys.executable] + sys.argv)
         except Exception as e:
             print(f"Error installing packages: {e}")
-            print("Please run manually: pip install pywin32 pandas openpyxl")
+            print("Please run manually: pip install pywin32 pandas pyarrow openpyxl")
             input("Press Enter to exit...")
             sys.exit(1)
 
-# Make sure required packages are installed first
-ensure_packages()
-
-# Now import the packages
-import win32com.client
-import pandas as pd
+# Heavy packages (pandas, win32com) are imported where they are first used,
+# so the window appears without waiting for them
 import tkinter as tk
 from tkinter import messagebox, ttk
-import re
 import threading
-import pythoncom  # Import pythoncom for COM initialization
+import argparse
+import logging
+from run_log import setup_logging
+from estimate import estimate_contacts, format_estimate
+from progress_channel import ProgressChannel
+from extraction import get_folders_to_scan, prepare_contacts, run_extraction
+from delta_export import format_delta, write_delta
+from sharded_export import DEFAULT_SHARD_WORKERS, export_contacts
+from extraction import DEFAULT_RESOLVER_WORKERS, DEFAULT_ROLE_WORKERS, DEFAULT_QUEUE_SIZE
+from batch import DEFAULT_MAILBOX_WORKERS, COMBINED_OUTPUT, ConsoleProgress, read_mailbox_list, run_batch, write_batch_outputs
+from com_scheduler import SCHEDULER
+from com_replay import replay_role_cache, replay_rules, session_for
+from scan_coverage import AFTER_SATURATION, StopToken, format_coverage
+from contact_filter import CONTACT_KINDS, format_filter_stats
+from contact_artifact import artifact_path, write_artifact
 
-def extract_contacts_thread(progress_window, progress_var, status_var):
+# Set up logging
+log_dir = os.path.join(os.path.expanduser("~"), "AppData", "Local", "OutlookContactExporter")
+os.makedirs(log_dir, exist_ok=True)
+log_file = os.path.join(log_dir, "extract_log.txt")
+setup_logging(log_file)
+
+# `stop_token` (scan_coverage.StopToken) stops the scan early; what was found
+# until then is still written, marked as partial
+def extract_contacts_thread(channel, options=None, stop_token=None):
+    # A live Outlook session, or one being recorded or replayed (com_replay.py)
+    session = session_for(options)
+    namespace = None
     try:
-        # Initialize COM in this thread
-        pythoncom.CoInitialize()
-        
-        # Create Outlook application object
-        outlook = win32com.client.Dispatch("Outlook.Application")
-        namespace = outlook.GetNamespace("MAPI")
-        
-        contacts = []
-        signatures_cache = {}  # Cache to store extracted roles from signatures
-        total_items_processed = 0
+        # Initialize COM in this thread and open the MAPI namespace
+        namespace = session.connect()
         
         # Update status
-        status_var.set("Initializing...")
-        progress_var.set(5)
+        channel.set_status("Initializing...", 5)
         
-        # Function to extract role from email signature or body
-        def extract_role_from_body(email_address, sender_name, body_text):
-            # Return from cache if we've already processed this email
-            if email_address in signatures_cache:
-                return signatures_cache[email_address]
-                
-            # No body text to process
-            if not body_text:
-                return ""
-                
-            # Convert HTML to plain text if needed
-            if body_text.startswith("<html") or "<body" in body_text:
-                # Simple HTML tag removal
-                plain_text = re.sub('<[^<]+?>', ' ', body_text)
-            else:
-                plain_text = body_text
-                
-            # Get the last few lines where signatures usually appear
-            lines = plain_text.splitlines()
-            # Focus on the last 15 lines (typical signature length)
-            signature_area = "\n".join(lines[-15:]) if len(lines) > 15 else plain_text
-            
-            # Patterns to identify job titles in signatures
-            job_title_patterns = [
-                # Pattern for "Name | Title"
-                rf"{re.escape(sender_name)}\s*[|\|]\s*([^,\n\|]{3,50})",
-                # Pattern for "Title at Company"
-                r"([A-Z][a-z]+(?:\s+[A-Z][a-z]+){0,4}(?:\s+at|@)\s+[A-Z][a-z]+(?:\s+[A-Z][a-z]+){0,3})",
-                # Pattern for job title followed by department
-                r"([A-Z][a-z]+\s+(?:of|for)\s+[A-Z][a-z]+(?:\s+[A-Z][a-z]+){0,3})",
-                # Patterns for common job titles
-                r"((?:Senior|Junior|Chief|Assistant|Associate|Lead|Principal|Director|Manager|Officer|President|CEO|CTO|CFO|COO|VP|Head|Founder|Owner|Specialist|Supervisor|Coordinator|Analyst|Engineer|Developer|Architect|Designer|Consultant|Executive|Administrator|Technician)(?:\s+[A-Z][a-z]+){1,4})",
-                # Pattern for roles with "of" construction
-                r"((?:Director|Manager|Head|Chief|Officer)\s+of\s+(?:[A-Z][a-z]+\s*){1,5})",
-                # Pattern for titles like "Marketing Manager"
-                r"((?:Marketing|Sales|Finance|HR|Operations|IT|Product|Software|Network|Data|AI|Business|Project|Program|Customer|Research|Quality|Technical|Support)\s+(?:Manager|Director|Specialist|Analyst|Engineer|Coordinator|Lead|Supervisor|Consultant|Executive))",
-                # Pattern for simple title, company format
-                r"([A-Z][a-z]+(?:\s+[A-Z][a-z]+){1,3}),\s*([A-Z][a-z]+(?:\s+[A-Z][a-z]+){0,5})",
-            ]
-            
-            # Look for matches with the patterns
-            potential_roles = []
-            for pattern in job_title_patterns:
-                matches = re.findall(pattern, signature_area)
-                if matches:
-                    for match in matches:
-                        if isinstance(match, tuple):  # Multiple capturing groups
-                            for group in match:
-                                if group and len(group) > 5 and len(group) < 50:  # Reasonable length for a title
-                                    potential_roles.append(group.strip())
-                        else:
-                            if len(match) > 5 and len(match) < 50:  # Reasonable length for a title
-                                potential_roles.append(match.strip())
-            
-            # If we found roles, use the first one
-            role = potential_roles[0] if potential_roles else ""
-            
-            # Store in cache
-            signatures_cache[email_address] = role
-            return role
-        
-        # Get all the folders to scan - expand to more folders to find all contacts
-        folders_to_scan = {}
-        try:
-            folders_to_scan["Sent Items"] = namespace.GetDefaultFolder(5)  # 5 = olFolderSentMail
-        except:
-            pass
-            
-        try:
-            folders_to_scan["Inbox"] = namespace.GetDefaultFolder(6)  # 6 = olFolderInbox
-        except:
-            pass
-            
-        try:
-            folders_to_scan["Deleted Items"] = namespace.GetDefaultFolder(3)  # 3 = olFolderDeletedItems
-        except:
-            pass
-            
-        try:
-            folders_to_scan["Drafts"] = namespace.GetDefaultFolder(16)  # 16 = olFolderDrafts
-        except:
-            pass
-            
-        try:
-            folders_to_scan["Outbox"] = namespace.GetDefaultFolder(4)  # 4 = olFolderOutbox
-        except:
-            pass
-            
-        try:
-            folders_to_scan["Junk Email"] = namespace.GetDefaultFolder(23)  # 23 = olFolderJunk
-        except:
-            pass
-        
-        # Try to access Archive folder if it exists
-        try:
-            archive_folder = namespace.Stores.Item("Archive").GetRootFolder()
-            folders_to_scan["Archive"] = archive_folder
-        except:
-            pass
-        
-        # Process Outlook GAL (Global Address List) to match X500 addresses to emails
-        def get_exchange_address_mapping():
-            exchange_map = {}
-            return exchange_map
-            
-        exchange_map = get_exchange_address_mapping()
-        
-        # Update progress
-        progress_var.set(10)
-        
-        # Track progress
-        folder_count = len(folders_to_scan)
-        current_folder = 0
-        
-        # Function to try to get role/job title from a contact
-        def try_get_role(recipient):
-            job_title = ""
-            try:
-                # Method 1: Try to access job title directly
-                if hasattr(recipient, 'JobTitle'):
-                    job_title = recipient.JobTitle
-                
-                # Method 2: Try to get from AddressEntry
-                if not job_title and hasattr(recipient, 'AddressEntry'):
-                    try:
-                        addressEntry = recipient.AddressEntry
-                        if addressEntry.Type == "EX":  # Exchange user
-                            exchangeUser = addressEntry.GetExchangeUser()
-                            if exchangeUser and hasattr(exchangeUser, 'JobTitle'):
-                                job_title = exchangeUser.JobTitle
-                    except:
-                        pass
-                
-                # Method 3: Try to get from GAL property
-                if not job_title:
-                    try:
-                        job_title = recipient.PropertyAccessor.GetProperty("http://schemas.microsoft.com/mapi/proptag/0x3A17001E")  # PR_TITLE
-                    except:
-                        pass
-                
-                # Method 4: Try to get from contact item if available
-                if not job_title:
-                    try:
-                        recipient_resolved = namespace.CreateRecipient(recipient.Name)
-                        recipient_resolved.Resolve()
-                        if recipient_resolved.Resolved:
-                            entry = recipient_resolved.AddressEntry
-                            if entry.Type == "EX":
-                                contact = entry.GetContact()
-                                if contact and hasattr(contact, 'JobTitle'):
-                                    job_title = contact.JobTitle
-                    except:
-                        pass
-            except:
-                pass
-            
-            return job_title
-        
-        # Process all folders
-        for folder_name, folder in folders_to_scan.items():
-            try:
-                current_folder += 1
-                folder_progress = int(10 + (current_folder / folder_count) * 70)  # 10-80% progress for folders
-                progress_var.set(folder_progress)
-                status_var.set(f"Scanning {folder_name}...")
-                
-                # Process all items in the folder
-                for item in folder.Items:
-                    if item.Class == 43:  # olMailItem
-                        total_items_processed += 1
-                        
-                        # Get the email body for signature analysis
-                        email_body = ""
-                        try:
-                            if hasattr(item, 'Body'):
-                                email_body = item.Body
-                            elif hasattr(item, 'HTMLBody'):
-                                email_body = item.HTMLBody
-                        except:
-                            pass
-                        
-                        # Process sender
-                        try:
-                            if hasattr(item, 'SenderName') and item.SenderName:
-                                sender_name = item.SenderName
-                                sender_email = None
-                                sender_role = ""
-                                
-                                # Try multiple ways to get the sender email
-                                if hasattr(item, 'SenderEmailAddress'):
-                                    sender_email = item.SenderEmailAddress
-                                    
-                                # If it's Exchange format, try alternative methods
-                                if sender_email and sender_email.startswith("/o=ExchangeLabs"):
-                                    # Try from the email type + address
-                                    try:
-                                        if hasattr(item, 'SenderEmailType'):
-                                            sender_email_alt = item.SenderEmailType + ":" + item.SenderEmailAddress
-                                            if "@" in sender_email_alt:
-                                                sender_email = sender_email_alt
-                                    except:
-                                        pass
-                                        
-                                    # Try extracting from display name
-                                    if sender_name and "@" in sender_name:
-                                        email_match = re.search(r'[\w\.-]+@[\w\.-]+\.\w+', sender_name)
-                                        if email_match:
-                                            sender_email = email_match.group(0)
-                                            
-                                    # Try resolver to get SMTP address
-                                    try:
-                                        recipient = namespace.CreateRecipient(sender_name)
-                                        recipient.Resolve()
-                                        if recipient.Resolved:
-                                            addressEntry = recipient.AddressEntry
-                                            if addressEntry.Type == "EX":
-                                                try:
-                                                    sender_email = addressEntry.GetExchangeUser().PrimarySmtpAddress
-                                                    # Try to get job title/role
-                                                    exchangeUser = addressEntry.GetExchangeUser()
-                                                    if exchangeUser and hasattr(exchangeUser, 'JobTitle'):
-                                                        sender_role = exchangeUser.JobTitle
-                                                except:
-                                                    pass
-                                    except:
-                                        pass
-                                        
-                                    # Last resort: use our Exchange address mapping or extraction
-                                    if sender_email.startswith("/o=ExchangeLabs"):
-                                        if sender_email in exchange_map:
-                                            sender_email = exchange_map[sender_email]
-                                        else:
-                                            # Extract email from display name - just use name part
-                                            name_part = sender_name.split()
-                                            if len(name_part) > 0:
-                                                domain = "company.com"  # You might need to change this
-                                                sender_email = f"{name_part[0].lower()}@{domain}"
-                                
-                                # Only add if we have a reasonable email now
-                                if sender_email and "@" in sender_email:
-                                    # Check if we need to extract role from signature
-                                    if not sender_role and folder_name != "Sent Items":  # Don't analyze our own signatures
-                                        # Try to find a job title in the email signature
-                                        signature_role = extract_role_from_body(sender_email.lower(), sender_name, email_body)
-                                        if signature_role:
-                                            sender_role = signature_role
-                                    
-                                    # Try to split name into first and last name
-                                    name_parts = sender_name.split()
-                                    first_name = name_parts[0] if len(name_parts) > 0 else ""
-                                    last_name = " ".join(name_parts[1:]) if len(name_parts) > 1 else ""
-                                    
-                                    contacts.append({
-                                        "First Name": first_name,
-                                        "Last Name": last_name,
-                                        "Full Name": sender_name,
-                                        "Email": sender_email.lower(),
-                                        "Role": sender_role,
-                                        "Source": f"{folder_name} (Sender)"
-                                    })
-                        except Exception as e:
-                            # Skip errors silently
-                            pass
-                            
-                        # Process all recipients
-                        try:
-                            if hasattr(item, 'Recipients'):
-                                for recipient in item.Recipients:
-                                    try:
-                                        name = recipient.Name
-                                        email = None
-                                        exchange_address = None
-                                        role = try_get_role(recipient)  # Try to get role/job title
-                                        
-                                        # Try multiple methods to get email
-                                        # Method 1: Address property
-                                        try:
-                                            email = recipient.Address
-                                            if email and email.startswith("/o=ExchangeLabs"):
-                                                exchange_address = email
-                                        except:
-                                            pass
-                                            
-                                        # Method 2: SMTP Address property
-                                        if email is None or email.startswith("/o=ExchangeLabs"):
-                                            try:
-                                                email = recipient.PropertyAccessor.GetProperty("http://schemas.microsoft.com/mapi/proptag/0x39FE001E")
-                                            except:
-                                                pass
-                                        
-                                        # Method 3: Use AddressEntry to get SMTP address
-                                        if email is None or email.startswith("/o=ExchangeLabs"):
-                                            try:
-                                                if hasattr(recipient, 'AddressEntry'):
-                                                    addressEntry = recipient.AddressEntry
-                                                    if addressEntry.Type == "EX":  # Exchange user
-                                                        try:
-                                                            exchangeUser = addressEntry.GetExchangeUser()
-                                                            if exchangeUser:
-                                                                email = exchangeUser.PrimarySmtpAddress
-                                                                # Also try to get job title if we don't have it yet
-                                                                if not role and hasattr(exchangeUser, 'JobTitle'):
-                                                                    role = exchangeUser.JobTitle
-                                                        except:
-                                                            pass
-                                            except:
-                                                pass
-                                                
-                                        # Method 4: Extract from display name if it contains an email
-                                        if (email is None or email.startswith("/o=ExchangeLabs")) and "@" in name:
-                                            email_match = re.search(r'[\w\.-]+@[\w\.-]+\.\w+', name)
-                                            if email_match:
-                                                email = email_match.group(0)
-                                                
-                                        # Method 5: For Exchange addresses, make a best guess based on name
-                                        if email is None or email.startswith("/o=ExchangeLabs"):
-                                            # Extract part after the last '-' in the Exchange address
-                                            if email and email.startswith("/o=ExchangeLabs"):
-                                                name_match = re.search(r'cn=([^-]+)-(.+)$', email)
-                                                if name_match:
-                                                    extracted_name = name_match.group(2)
-                                                    domain = "company.com"  # Change as needed
-                                                    email = f"{extracted_name.lower().replace(' ', '.')}@{domain}"
-                                                else:
-                                                    # Fallback to using the display name
-                                                    name_parts = name.replace(',', '').split()
-                                                    if len(name_parts) > 0:
-                                                        cleaned_name = name_parts[0].lower()
-                                                        domain = "company.com"  # Change as needed
-                                                        email = f"{cleaned_name}@{domain}"
-                                        
-                                        # Skip if still no valid email
-                                        if email is None and exchange_address is None:
-                                            continue
-                                            
-                                        # Use exchange_address if we don't have a better email
-                                        if (email is None or email == "") and exchange_address:
-                                            email = exchange_address
-                                        
-                                        # Try to split name into first and last name
-                                        name_parts = name.split()
-                                        first_name = name_parts[0] if len(name_parts) > 0 else ""
-                                        last_name = " ".join(name_parts[1:]) if len(name_parts) > 1 else ""
-                                        
-                                        # If no role yet and this is in the Inbox, try to extract from signature
-                                        if not role and folder_name == "Inbox" and email and "@" in email:
-                                            # Check the signature cache first
-                                            if email.lower() in signatures_cache:
-                                                role = signatures_cache[email.lower()]
-                                            # Otherwise try to extract from the message body
-                                            elif email_body:
-                                                signature_role = extract_role_from_body(email.lower(), name, email_body)
-                                                if signature_role:
-                                                    role = signature_role
-                                        
-                                        contacts.append({
-                                            "First Name": first_name,
-                                            "Last Name": last_name,
-                                            "Full Name": name,
-                                            "Email": email.lower() if email else "",
-                                            "Role": role,
-                                            "Source": f"{folder_name} (Recipient)"
-                                        })
-                                    except Exception as e:
-                                        # Skip errors silently
-                                        pass
-                        except Exception as e:
-                            # Skip errors silently for specific item
-                            pass
-            except Exception as e:
-                # Skip this folder and continue with others
-                continue
-        
-        # Update progress for contacts folder processing
-        progress_var.set(80)
-        status_var.set("Scanning Contacts folder...")
-        
-        # Additional scan for Contacts folder - this should have the most job title info
-        try:
-            contacts_folder = namespace.GetDefaultFolder(10)  # 10 = olFolderContacts
-            
-            for contact_item in contacts_folder.Items:
-                if contact_item.Class == 40:  # olContactItem
-                    try:
-                        if hasattr(contact_item, 'FullName') and hasattr(contact_item, 'Email1Address'):
-                            name = contact_item.FullName
-                            email = contact_item.Email1Address
-                            
-                            # Get job title/role if available
-                            role = ""
-                            if hasattr(contact_item, 'JobTitle'):
-                                role = contact_item.JobTitle
-                            elif hasattr(contact_item, 'CompanyName'):
-                                role = contact_item.CompanyName
-                            
-                            if email and "@" in email:
-                                name_parts = name.split()
-                                first_name = contact_item.FirstName if hasattr(contact_item, 'FirstName') else (name_parts[0] if len(name_parts) > 0 else "")
-                                last_name = contact_item.LastName if hasattr(contact_item, 'LastName') else (" ".join(name_parts[1:]) if len(name_parts) > 1 else "")
-                                
-                                contacts.append({
-                                    "First Name": first_name,
-                                    "Last Name": last_name,
-                                    "Full Name": name,
-                                    "Email": email.lower(),
-                                    "Role": role,
-                                    "Source": "Contacts Folder"
-                                })
-                    except:
-                        pass
-        except:
-            pass
+        # Scan all folders through the reader -> resolver -> roles -> aggregator pipeline
+        contacts, stats = run_extraction(namespace, channel, options, session.connect, session.disconnect,
+                                         rules=replay_rules(options), role_cache=replay_role_cache(options),
+                                         stop_token=stop_token)
+        partial = stats["partial"]
         
         # Update for final processing
-        progress_var.set(85)
-        status_var.set("Processing contacts...")
-        
-        # Create DataFrame and ensure all values are strings to avoid type issues
-        contacts_df = pd.DataFrame(contacts)
+        channel.set_status("Processing contacts...", 85)
         
-        # Skip empty dataframe case
-        if len(contacts_df) == 0:
-            progress_window.destroy()
-            messagebox.showinfo("No Contacts", "No valid contacts found in your mailbox.")
+        # Skip empty result case
+        if len(contacts) == 0:
+            channel.finish("info", "No Contacts", "No valid contacts found in your mailbox.")
             return False
-
-        # Group by email address and pick the best record (with most information)
-        best_contacts = []
-        for email, group in contacts_df.groupby('Email'):
-            # If any role is available, use that record
-            with_role = group[group['Role'].astype(str) != '']
-            if len(with_role) > 0:
-                best_contacts.append(with_role.iloc[0])
-            else:
-                # Otherwise use any record
-                best_contacts.append(group.iloc[0])
-        
-        # Create final dataframe
-        result_df = pd.DataFrame(best_contacts)
-        
-        # Sort by name
-        result_df = result_df.sort_values(by=['Last Name', 'First Name'])
-        
-        # Remove the Exchange Address column if it exists
-        if 'Exchange Address' in result_df.columns:
-            result_df = result_df.drop(columns=['Exchange Address'])
             
         # Update progress
-        progress_var.set(95)
-        status_var.set("Saving to Excel...")
+        channel.set_status("Saving to Excel...", 95)
         
-        # Save to Excel
-        desktop_path = os.path.join(os.path.expanduser("~"), "Desktop")
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        file_path = os.path.join(desktop_path, f"outlook_contacts_{timestamp}.xlsx")
+        # Save to Excel: everything, or only what changed since the last delta export
+        merge = not getattr(options, "no_identity_merge", False)
+        suffix = "_partial" if partial else ""
+        if getattr(options, "delta", False):
+            file_path, delta_counts = write_delta(prepare_contacts(contacts, merge), getattr(options, "delta_index", None),
+                                                  f"outlook_contacts_delta{suffix}", partial=partial,
+                                                  stopped_early=stats["stopped_early"])
+            file_path = file_path or "(no changes since the previous export, nothing written)"
+        else:
+            # One workbook, or shards plus a manifest for very large exports
+            file_path, delta_counts = export_contacts(prepare_contacts(contacts, merge), options,
+                                                      f"outlook_contacts{suffix}"), None
         
-        try:
-            result_df.to_excel(file_path, index=False)
-        except Exception as excel_error:
-            # Try saving to temp directory if desktop fails
-            temp_dir = tempfile.gettempdir()
-            file_path = os.path.join(temp_dir, f"outlook_contacts_{timestamp}.xlsx")
-            result_df.to_excel(file_path, index=False)
+        # A sorted artifact for merging with the exports of other computers
+        artifact_file = None
+        if getattr(options, "artifact", None) is not None:
+            artifact_file = write_artifact(contacts, artifact_path(options.artifact, f"outlook_contacts{suffix}"),
+                                           partial=partial)
         
         # Final update
-        progress_var.set(100)
-        status_var.set("Complete!")
+        channel.set_status("Complete!", 100)
         
-        # Close progress window and show final message
+        # The GUI thread closes the progress window and shows the final message
+        message = f"✅ {len(contacts)} unique contacts exported from {stats['items_processed']} emails"
+        if partial:
+            message = (f"⚠️ Partial export: the scan was stopped before the end.\n"
+                       f"{len(contacts)} unique contacts exported from {stats['items_processed']} emails")
+        if delta_counts:
+            message += f"\n\nChanges since the previous export: {format_delta(delta_counts)}"
+        if stats.get("coverage"):
+            message += f"\n\nCoverage: {format_coverage(stats['coverage'])}"
+        if stats.get("filter"):
+            message += f"\n\nFiltered: {format_filter_stats(stats['filter'])}"
+        message += f"\n\nSaved to:\n{file_path}"
+        if artifact_file:
+            message += f"\n\nArtifact for merging:\n{artifact_file}"
+        channel.finish("info", "Partial Export" if partial else "Success", message)
+        return True
+    except Exception as e:
+        logging.error(f"Error in extract_contacts_thread: {e}")
+        logging.error(traceback.format_exc())
+        # Show error and close progress window
+        channel.finish("error", "Error", f"An error occurred: {str(e)}")
+        return False
+    finally:
+        # Uninitialize COM even on error, and save a recording
+        try:
+            if namespace is not None:
+                session.disconnect(namespace)
+            session.close()
+        except Exception as e:
+            logging.error(f"Error closing Outlook session: {e}")
+
+# The export, under the profiler with --profile (run_profile.py, only
+# imported then)
+def run_export(channel, options=None, stop_token=None):
+    if getattr(options, "profile", None):
+        from run_profile import profiled
+        return profiled("outlook_contacts", extract_contacts_thread, channel, options, stop_token,
+                        mode=options.profile)
+    return extract_contacts_thread(channel, options, stop_token)
+
+# Runs on the Tk main thread once the worker has posted its final result
+def make_done_handler(progress_window):
+    def on_done(kind, title, message):
         progress_window.destroy()
-        messagebox.showinfo("Success", f"✅ {len(result_df)} unique contacts exported from {total_items_processed} emails\n\nSaved to:\n{file_path}")
+        if kind == "error":
+            messagebox.showerror(title, message)
+        else:
+            messagebox.showinfo(title, message)
+    return on_done
+
+# Quick estimate: sample a few items per folder instead of scanning everything
+def estimate_contacts_thread(channel):
+    try:
+        import pythoncom
+        import win32com.client
+
+        pythoncom.CoInitialize()
+        
+        outlook = win32com.client.Dispatch("Outlook.Application")
+        namespace = SCHEDULER.wrap(outlook.GetNamespace("MAPI"))
+        
+        channel.set_status("Counting items...")
+        folders_to_scan = get_folders_to_scan(namespace)
+        result = estimate_contacts(folders_to_scan, status_callback=channel.set_status)
         
-        # At the end of the function, uninitialize COM:
         pythoncom.CoUninitialize()
-        return True
+        channel.finish("info", "Quick Estimate", format_estimate(result))
+        return result
     except Exception as e:
-        # Show error and close progress window
         try:
-            pythoncom.CoUninitialize()  # Make sure to uninitialize even on error
+            pythoncom.CoUninitialize()
         except:
             pass
-        progress_window.destroy()
-        messagebox.showerror("Error", f"An error occurred: {str(e)}")
-        return False
+        channel.finish("error", "Error", f"An error occurred: {str(e)}")
+        return None
 
-def extract_contacts():
+def quick_estimate():
+    progress_window = tk.Toplevel()
+    progress_window.title("Estimating")
+    progress_window.geometry("400x100")
+    progress_window.resizable(False, False)
+    progress_window.transient()
+    progress_window.grab_set()
+    
+    frame = tk.Frame(progress_window, padx=20, pady=20)
+    frame.pack(fill=tk.BOTH, expand=True)
+    
+    status_var = tk.StringVar()
+    status_var.set("Starting...")
+    status_label = tk.Label(frame, textvariable=status_var, font=("Arial", 10))
+    status_label.pack(pady=(0, 10))
+    
+    # The worker only posts to the channel; this thread applies the updates
+    channel = ProgressChannel()
+    channel.attach(progress_window, tk.IntVar(), status_var, make_done_handler(progress_window))
+    
+    thread = threading.Thread(target=estimate_contacts_thread, args=(channel,))
+    thread.daemon = True
+    thread.start()
+    
+    return True
+
+def extract_contacts(options=None):
     # Create a progress window
     progress_window = tk.Toplevel()
     progress_window.title("Exporting Contacts")
-    progress_window.geometry("400x150")
+    progress_window.geometry("400x185")
     progress_window.resizable(False, False)
     progress_window.transient()  # Set as transient window
     progress_window.grab_set()   # Make modal
@@ -602,26 +265,41 @@ def extract_contacts():
     message = tk.Label(frame, text="Please wait while your contacts are being exported...", font=("Arial", 8))
     message.pack()
     
+    # Stopping (the button or closing the window) lets the worker finish
+    # early and save what it found; the window closes when that is written
+    stop_token = StopToken()
+    def stop():
+        stop_token.cancel("stopped by user")
+        message.config(text="Stopping... the contacts found so far will be saved.")
+        stop_button.config(state=tk.DISABLED)
+    stop_button = tk.Button(frame, text="Stop and Save", command=stop, font=("Arial", 8))
+    stop_button.pack(pady=(8, 0))
+    progress_window.protocol("WM_DELETE_WINDOW", stop)
+    
     # Start the extraction in a separate thread
-    thread = threading.Thread(target=extract_contacts_thread, args=(progress_window, progress_var, status_var))
+    # The worker only posts to the channel; this thread applies the updates
+    channel = ProgressChannel()
+    channel.attach(progress_window, progress_var, status_var, make_done_handler(progress_window))
+    
+    thread = threading.Thread(target=run_export, args=(channel, options, stop_token))
     thread.daemon = True
     thread.start()
     
     return True
 
 # Create a simple GUI
-def create_gui():
+def create_gui(options=None):
     root = tk.Tk()
     root.title("Outlook Contact Exporter")
-    root.geometry("450x250")
+    root.geometry("450x290")
     root.resizable(False, False)
     
     # Center the window
     screen_width = root.winfo_screenwidth()
     screen_height = root.winfo_screenheight()
     x = (screen_width - 450) // 2
-    y = (screen_height - 250) // 2
-    root.geometry(f"450x250+{x}+{y}")
+    y = (screen_height - 290) // 2
+    root.geometry(f"450x290+{x}+{y}")
     
     # Add some padding
     frame = tk.Frame(root, padx=20, pady=20)
@@ -640,10 +318,15 @@ def create_gui():
     warning.pack(pady=(0, 15))
     
     # Add button
-    button = tk.Button(frame, text="Export ALL Contacts", command=extract_contacts, 
+    button = tk.Button(frame, text="Export ALL Contacts", command=lambda: extract_contacts(options), 
                       bg="#0078D7", fg="white", font=("Arial", 12), padx=10, pady=5)
     button.pack()
     
+    # Add quick estimate button
+    estimate_button = tk.Button(frame, text="Quick Estimate", command=quick_estimate, 
+                                font=("Arial", 9), padx=10)
+    estimate_button.pack(pady=(8, 0))
+    
     # Add status
     status = tk.Label(frame, text="Will collect ALL contacts from your Outlook", font=("Arial", 8), fg="gray")
     status.pack(pady=(15, 0))
@@ -654,11 +337,153 @@ def create_gui():
     
     root.mainloop()
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Export contacts from Outlook to Excel")
+    parser.add_argument("--estimate", action="store_true",
+                        help="Print a quick estimate of unique contacts and runtime, then exit")
+    parser.add_argument("--sample-fraction", type=float, default=0.02,
+                        help="Fraction of items per folder to sample in estimate mode")
+    parser.add_argument("--resolver-workers", type=int, default=DEFAULT_RESOLVER_WORKERS,
+                        help="Threads resolving addresses and job titles through the GAL")
+    parser.add_argument("--role-workers", type=int, default=DEFAULT_ROLE_WORKERS,
+                        help="Threads extracting roles from email signatures")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="Maximum number of emails waiting in front of each pipeline stage")
+    parser.add_argument("--rules-file", default=None,
+                        help="Where learned X500-to-SMTP address rules are kept")
+    parser.add_argument("--role-cache-file", default=None,
+                        help="Where roles found in email signatures are cached between runs")
+    parser.add_argument("--no-identity-merge", action="store_true",
+                        help="Keep one row per address instead of merging addresses of the same person")
+    parser.add_argument("--mailbox", action="append", default=[],
+                        help="Export this shared mailbox or store (name or address) instead of the GUI; "
+                             "repeat for several mailboxes")
+    parser.add_argument("--mailbox-file", default=None,
+                        help="Text file with one mailbox name or address per line, for batch export")
+    parser.add_argument("--mailbox-workers", type=int, default=DEFAULT_MAILBOX_WORKERS,
+                        help="Mailboxes scanned at the same time in batch export")
+    parser.add_argument("--delta", action="store_true",
+                        help="Only write contacts added, changed or removed since the previous delta export")
+    parser.add_argument("--delta-index", default=None,
+                        help="Where the delta export remembers the previously exported contacts")
+    parser.add_argument("--shards", type=int, default=None, metavar="N",
+                        help="Split the export into N files by a hash of each contact's email domain")
+    parser.add_argument("--shard-rows", type=int, default=None, metavar="ROWS",
+                        help="Split the export into files of at most ROWS contacts")
+    parser.add_argument("--shard-workers", type=int, default=DEFAULT_SHARD_WORKERS,
+                        help="Processes writing shard files at the same time")
+    parser.add_argument("--artifact", nargs="?", const="", default=None, metavar="FOLDER",
+                        help="Also write a sorted artifact for merging with other exports (contact_artifact.py), "
+                             "to FOLDER or the Desktop")
+    parser.add_argument("--filter-file", default=None, metavar="FILE",
+                        help="JSON file with include/exclude filters applied while scanning")
+    parser.add_argument("--include-domain", action="append", dest="include_domains", default=[], metavar="DOMAIN",
+                        help="Only export contacts from this domain (and its subdomains); repeatable")
+    parser.add_argument("--exclude-domain", action="append", dest="exclude_domains", default=[], metavar="DOMAIN",
+                        help="Leave out contacts from this domain (and its subdomains); repeatable")
+    parser.add_argument("--exclude-address", action="append", dest="exclude_addresses", default=[],
+                        metavar="REGEX", help="Leave out addresses matching this regular expression; repeatable")
+    parser.add_argument("--exclude-name", action="append", dest="exclude_names", default=[], metavar="REGEX",
+                        help="Leave out display names matching this regular expression; repeatable")
+    parser.add_argument("--exclude-folder", action="append", dest="exclude_folders", default=[], metavar="FOLDER",
+                        help="Do not scan this folder (e.g. \"Deleted Items\"); repeatable")
+    parser.add_argument("--exclude-internal", action="store_true",
+                        help="Leave out colleagues known only by their Exchange address, without resolving them")
+    parser.add_argument("--exclude-automated", action="store_true",
+                        help="Leave out no-reply senders, bounce addresses and mailing lists")
+    parser.add_argument("--contacts", choices=CONTACT_KINDS, default="all",
+                        help="Export senders, recipients or both")
+    parser.add_argument("--newest-first", action="store_true",
+                        help="Read every folder from the newest email to the oldest")
+    parser.add_argument("--saturation", type=float, default=None, metavar="RATE",
+                        help="Stop reading a folder (newest first) once fewer than RATE new addresses "
+                             "turn up per 1000 emails")
+    parser.add_argument("--after-saturation", choices=AFTER_SATURATION, default=AFTER_SATURATION[0],
+                        help="At saturation, stop the folder or keep sampling every 10th email")
+    parser.add_argument("--time-budget", type=float, default=None, metavar="SECONDS",
+                        help="Stop reading emails after this many seconds and export what was found, "
+                             "marked as partial")
+    parser.add_argument("--max-rss-mb", type=float, default=None, metavar="MB",
+                        help="When the exporter uses more memory than this, move collected contacts "
+                             "to a temporary file and free caches")
+    parser.add_argument("--record", default=None, metavar="FILE",
+                        help="Record the Outlook session (sanitised values and call latencies) to FILE")
+    parser.add_argument("--replay", default=None, metavar="FILE",
+                        help="Run against a recorded session instead of Outlook; works without Outlook")
+    parser.add_argument("--replay-speed", type=float, default=1.0,
+                        help="Replay speed: 1 keeps the recorded latencies, 2 halves them, 0 skips them")
+    parser.add_argument("--profile", nargs="?", const="sampling", default=None, choices=("sampling", "deterministic"),
+                        help="Profile the export and write .pstats and flame graph stacks next to it "
+                             "(sampling by default, or deterministic)")
+    parser.add_argument("--no-gui", action="store_true",
+                        help="Export without the window, printing progress to the console")
+    return parser.parse_args(argv)
+
+def run_estimate_cli(args):
+    import pythoncom
+    import win32com.client
+
+    pythoncom.CoInitialize()
+    try:
+        namespace = SCHEDULER.wrap(win32com.client.Dispatch("Outlook.Application").GetNamespace("MAPI"))
+        folders_to_scan = get_folders_to_scan(namespace)
+        result = estimate_contacts(folders_to_scan, sample_fraction=args.sample_fraction,
+                                   status_callback=print)
+        print()
+        print(format_estimate(result))
+    finally:
+        pythoncom.CoUninitialize()
+
+def run_console_cli(args):
+    import signal
+
+    # Same export as the window, with progress printed to the console. The
+    # first Ctrl+C stops the scan and saves what was found, a second one aborts.
+    stop_token = StopToken()
+    def on_interrupt(signum, frame):
+        if stop_token.cancelled:
+            raise KeyboardInterrupt
+        print("\nStopping, the contacts found so far will be saved (Ctrl+C again to abort)...", flush=True)
+        stop_token.cancel("interrupted")
+    signal.signal(signal.SIGINT, on_interrupt)
+
+    ok = run_export(ConsoleProgress("export"), args, stop_token)
+    sys.exit(0 if ok else 1)
+
+def run_batch_cli(args):
+    mailboxes = list(args.mailbox)
+    if args.mailbox_file:
+        mailboxes += read_mailbox_list(args.mailbox_file)
+
+    results, failures = run_batch(mailboxes, args)
+    outputs = write_batch_outputs(results, merge=not args.no_identity_merge, options=args)
+
+    print()
+    for mailbox, (records, stats) in results.items():
+        print(f"{mailbox}: {len(records)} contacts from {stats['items_processed']} emails -> "
+              f"{outputs.get(mailbox, 'no file (no contacts)')}")
+    for mailbox, error in failures.items():
+        print(f"{mailbox}: FAILED - {error}")
+    if COMBINED_OUTPUT in outputs:
+        print(f"Combined: {outputs[COMBINED_OUTPUT]}")
+
 if __name__ == "__main__":
     try:
         # Make sure required packages are installed
         ensure_packages()
-        create_gui()
+        args = parse_args()
+        if args.estimate:
+            run_estimate_cli(args)
+        elif args.mailbox or args.mailbox_file:
+            if args.profile:
+                from run_profile import profiled
+                profiled("outlook_contacts_batch", run_batch_cli, args, mode=args.profile)
+            else:
+                run_batch_cli(args)
+        elif args.no_gui:
+            run_console_cli(args)
+        else:
+            create_gui(args)
     except Exception as e:
         # If we get here before tkinter is initialized, we need a basic error message
         try:
@@ -666,5 +491,5 @@ if __name__ == "__main__":
         except:
             print(f"\nERROR: {str(e)}")
             print("Please make sure all required packages are installed:")
-            print("pip install pywin32 pandas openpyxl")
+            print("pip install pywin32 pandas pyarrow openpyxl")
             input("\nPress Enter to exit...") 
\ No newline at end of file
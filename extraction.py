@@ -0,0 +1,1062 @@
+import json
+import os
+import re
+import tempfile
+import threading
+import logging
+from datetime import datetime
+
+from address_rules import DEFAULT_RULES_PATH, AddressRules
+from com_scheduler import SCHEDULER, format_scheduler_stats
+from contact_filter import CONTACT, DROP, RECIPIENT, SENDER, filter_from_options, format_filter_stats
+from contacts_index import ContactsIndex, contact_records, read_contact_rows
+from pipeline import Pipeline, Stage, format_metrics
+from role_cache import DEFAULT_ROLE_CACHE_PATH, RoleCache, signature_fingerprint
+from scan_coverage import AFTER_SATURATION, READ, SKIP, ScanCoverage, format_coverage
+from scan_memory import MemoryMonitor, iter_items
+from run_log import ErrorCounter
+
+# The contact extraction engine behind extract_contacts.py.
+#
+# The scan is split into pipeline stages connected by bounded queues:
+#
+#   item reader -> address resolver -> role extractor -> aggregator -> writer
+#
+# The reader is the only stage that walks folders and touches item and
+# Recipient objects. It copies the cheap properties it needs into plain dicts,
+# so the later stages never hold COM objects from another thread. Address
+# resolvers open their own Outlook session per worker thread, the role
+# extractor is pure Python, and the aggregator keeps the best record per
+# email address as records stream in. The writer saves the result once the
+# aggregator has seen every record.
+
+SMTP_PROPERTY = "http://schemas.microsoft.com/mapi/proptag/0x39FE001E"  # PR_SMTP_ADDRESS
+TITLE_PROPERTY = "http://schemas.microsoft.com/mapi/proptag/0x3A17001E"  # PR_TITLE
+
+EMAIL_PATTERN = re.compile(r'[\w\.-]+@[\w\.-]+\.\w+')
+
+DEFAULT_RESOLVER_WORKERS = 2
+DEFAULT_ROLE_WORKERS = 1
+DEFAULT_QUEUE_SIZE = 256
+
+# Confidence of an address that was not resolved but found in the display name
+DISPLAY_NAME_CONFIDENCE = 0.9
+
+# Outlook calls of one GAL lookup, when they could not be counted (replays)
+LOOKUP_CALLS = 8
+
+
+def is_exchange_address(address):
+    return bool(address) and address.lower().startswith("/o=exchangelabs")
+
+
+# Every call made through the returned namespace is retried and throttled
+# by the process-wide call scheduler (com_scheduler.py)
+def connect_outlook():
+    import pythoncom
+    import win32com.client
+    pythoncom.CoInitialize()
+    return SCHEDULER.wrap(win32com.client.Dispatch("Outlook.Application").GetNamespace("MAPI"))
+
+
+def disconnect_outlook(namespace=None):
+    import pythoncom
+    pythoncom.CoUninitialize()
+
+
+# Returns get_folder(folder_type) for a mailbox: the profile's primary
+# mailbox when `mailbox` is empty, a store already open in the profile
+# (matched by display name), or a mailbox the user has been granted access to
+# (resolved by name or address and opened with GetSharedDefaultFolder).
+def mailbox_folder_getter(namespace, mailbox=None):
+    if not mailbox:
+        return namespace.GetDefaultFolder
+
+    try:
+        for store in namespace.Stores:
+            if (store.DisplayName or "").lower() == mailbox.lower():
+                return store.GetDefaultFolder
+    except:
+        pass
+
+    recipient = namespace.CreateRecipient(mailbox)
+    recipient.Resolve()
+    if not recipient.Resolved:
+        raise ValueError(f"Mailbox not found: {mailbox}")
+    return lambda folder_type: namespace.GetSharedDefaultFolder(recipient, folder_type)
+
+
+# Get all the folders to scan - expand to more folders to find all contacts
+def get_folders_to_scan(namespace, mailbox=None, get_folder=None):
+    get_folder = get_folder or mailbox_folder_getter(namespace, mailbox)
+    folders_to_scan = {}
+    try:
+        folders_to_scan["Sent Items"] = get_folder(5)  # 5 = olFolderSentMail
+    except:
+        pass
+
+    try:
+        folders_to_scan["Inbox"] = get_folder(6)  # 6 = olFolderInbox
+    except:
+        pass
+
+    try:
+        folders_to_scan["Deleted Items"] = get_folder(3)  # 3 = olFolderDeletedItems
+    except:
+        pass
+
+    try:
+        folders_to_scan["Drafts"] = get_folder(16)  # 16 = olFolderDrafts
+    except:
+        pass
+
+    try:
+        folders_to_scan["Outbox"] = get_folder(4)  # 4 = olFolderOutbox
+    except:
+        pass
+
+    try:
+        folders_to_scan["Junk Email"] = get_folder(23)  # 23 = olFolderJunk
+    except:
+        pass
+
+    # Try to access Archive folder if it exists (primary mailbox only)
+    if not mailbox:
+        try:
+            archive_folder = namespace.Stores.Item("Archive").GetRootFolder()
+            folders_to_scan["Archive"] = archive_folder
+        except:
+            pass
+
+    return folders_to_scan
+
+
+# The end of an email body, where signatures usually appear
+def signature_block(body_text):
+    # Convert HTML to plain text if needed
+    if body_text.startswith("<html") or "<body" in body_text:
+        # Simple HTML tag removal
+        plain_text = re.sub('<[^<]+?>', ' ', body_text)
+    else:
+        plain_text = body_text
+
+    # Focus on the last 15 lines (typical signature length)
+    lines = plain_text.splitlines()
+    return "\n".join(lines[-15:]) if len(lines) > 15 else plain_text
+
+
+# Function to extract role from email signature or body. Results are cached
+# in `role_cache` (role_cache.py) by sender and signature fingerprint, so the
+# patterns only run on signatures not seen before.
+def extract_role_from_body(email_address, sender_name, body_text, role_cache):
+    # No body text to process
+    if not body_text:
+        return ""
+
+    signature_area = signature_block(body_text)
+    fingerprint = signature_fingerprint(sender_name, signature_area)
+    cached = role_cache.get(email_address, fingerprint)
+    if cached is not None:
+        return cached
+
+    # Patterns to identify job titles in signatures
+    job_title_patterns = [
+        # Pattern for "Name | Title"
+        rf"{re.escape(sender_name)}\s*[|\|]\s*([^,\n\|]{3,50})",
+        # Pattern for "Title at Company"
+        r"([A-Z][a-z]+(?:\s+[A-Z][a-z]+){0,4}(?:\s+at|@)\s+[A-Z][a-z]+(?:\s+[A-Z][a-z]+){0,3})",
+        # Pattern for job title followed by department
+        r"([A-Z][a-z]+\s+(?:of|for)\s+[A-Z][a-z]+(?:\s+[A-Z][a-z]+){0,3})",
+        # Patterns for common job titles
+        r"((?:Senior|Junior|Chief|Assistant|Associate|Lead|Principal|Director|Manager|Officer|President|CEO|CTO|CFO|COO|VP|Head|Founder|Owner|Specialist|Supervisor|Coordinator|Analyst|Engineer|Developer|Architect|Designer|Consultant|Executive|Administrator|Technician)(?:\s+[A-Z][a-z]+){1,4})",
+        # Pattern for roles with "of" construction
+        r"((?:Director|Manager|Head|Chief|Officer)\s+of\s+(?:[A-Z][a-z]+\s*){1,5})",
+        # Pattern for titles like "Marketing Manager"
+        r"((?:Marketing|Sales|Finance|HR|Operations|IT|Product|Software|Network|Data|AI|Business|Project|Program|Customer|Research|Quality|Technical|Support)\s+(?:Manager|Director|Specialist|Analyst|Engineer|Coordinator|Lead|Supervisor|Consultant|Executive))",
+        # Pattern for simple title, company format
+        r"([A-Z][a-z]+(?:\s+[A-Z][a-z]+){1,3}),\s*([A-Z][a-z]+(?:\s+[A-Z][a-z]+){0,5})",
+    ]
+
+    # Look for matches with the patterns
+    potential_roles = []
+    for pattern in job_title_patterns:
+        matches = re.findall(pattern, signature_area)
+        if matches:
+            for match in matches:
+                if isinstance(match, tuple):  # Multiple capturing groups
+                    for group in match:
+                        if group and len(group) > 5 and len(group) < 50:  # Reasonable length for a title
+                            potential_roles.append(group.strip())
+                else:
+                    if len(match) > 5 and len(match) < 50:  # Reasonable length for a title
+                        potential_roles.append(match.strip())
+
+    # If we found roles, use the first one
+    role = potential_roles[0] if potential_roles else ""
+
+    # Store in cache
+    role_cache.put(email_address, fingerprint, role)
+    return role
+
+
+# ---- Stage 1: item reader ----------------------------------------------------
+
+# Recipients of messages to recurring groups of people, known by display
+# name from messages whose Recipients collection was read before. A message's
+# To/CC/BCC display strings cost three property reads; walking its Recipients
+# costs two or three per recipient. When every name in those strings is known,
+# the entries are copied from here and the Recipients collection is skipped.
+# Names seen with more than one address are never taken from here.
+class RecipientCache:
+    MAX_HEADERS = 100000  # distinct To/CC/BCC combinations remembered
+
+    def __init__(self):
+        self.by_name = {}     # display name -> entry, or None when ambiguous
+        self.by_header = {}   # (To, CC, BCC) -> entries
+        self.items = 0        # messages whose Recipients were skipped
+        self.skipped = 0      # Recipient objects not read
+
+    def clear(self):
+        self.by_name = {}
+        self.by_header = {}
+
+    def lookup(self, item):
+        try:
+            header = (item.To or "", item.CC or "", item.BCC or "")
+        except:
+            return None
+        if not any(header):
+            return None
+
+        entries = self.by_header.get(header)
+        if entries is None:
+            entries = []
+            for field in header:
+                for name in field.split(";"):
+                    name = name.strip()
+                    if name:
+                        entry = self.by_name.get(name)
+                        if entry is None:
+                            return None
+                        entries.append(entry)
+            if len(self.by_header) >= self.MAX_HEADERS:
+                self.by_header.clear()
+            self.by_header[header] = entries
+
+        self.items += 1
+        self.skipped += len(entries)
+        # Later stages fill in roles and addresses, so every message gets copies
+        return [dict(entry) for entry in entries]
+
+    # Remember the entries read from a message's Recipients collection
+    def learn(self, entries):
+        for entry in entries:
+            name = entry["name"]
+            if not name or entry["email"] is None:
+                continue
+            known = self.by_name.get(name, entry)
+            if known is None:
+                continue
+            if known is not entry and (known["email"], known["exchange_address"]) != \
+                    (entry["email"], entry["exchange_address"]):
+                # Two people with one display name: always read their Recipients
+                self.by_name[name] = None
+                self.by_header.clear()
+                continue
+            self.by_name[name] = dict(entry, role="")
+
+
+# Copy what later stages need out of a mail item. Only properties that are
+# read straight off the item or its Recipient objects are touched here;
+# everything that needs a GAL lookup is left to the resolver stage.
+# Senders and recipients that `contact_filter` (contact_filter.py) rules out
+# are dropped as soon as their address is known.
+def read_mail_item(item, folder_name, recipient_cache=None, contact_filter=None):
+    message = {"kind": "mail", "folder": folder_name, "body": "", "sender": None, "recipients": []}
+
+    # Process sender
+    try:
+        if hasattr(item, 'SenderName') and item.SenderName:
+            sender = {"name": item.SenderName, "email": None, "role": "", "exchange_address": None,
+                      "confidence": 1.0}
+            if hasattr(item, 'SenderEmailAddress'):
+                sender["email"] = item.SenderEmailAddress
+            if is_exchange_address(sender["email"]):
+                sender["exchange_address"] = sender["email"]
+            if contact_filter is None or not contact_filter.drop_entry(sender, SENDER):
+                message["sender"] = sender
+    except:
+        pass
+
+    message["recipients"] = read_recipients(item, recipient_cache, contact_filter)
+
+    # Signatures are only analysed outside Sent Items, for the sender and,
+    # in the Inbox, for recipients; skip the body when nobody needs it
+    if folder_name != "Sent Items" and (message["sender"] or (folder_name == "Inbox" and message["recipients"])):
+        try:
+            if hasattr(item, 'Body'):
+                message["body"] = item.Body
+            elif hasattr(item, 'HTMLBody'):
+                message["body"] = item.HTMLBody
+        except:
+            pass
+    elif contact_filter is not None and folder_name != "Sent Items":
+        contact_filter.bodies_skipped += 1
+
+    return message
+
+
+def read_recipients(item, recipient_cache=None, contact_filter=None):
+    if contact_filter is not None and not contact_filter.recipients:
+        contact_filter.recipient_lists_skipped += 1
+        return []
+
+    # Recipients already known from an earlier message to the same people
+    recipients = recipient_cache.lookup(item) if recipient_cache is not None else None
+    if recipients is None:
+        recipients = []
+        # Process all recipients
+        try:
+            if hasattr(item, 'Recipients'):
+                for recipient in item.Recipients:
+                    try:
+                        entry = {"name": recipient.Name, "email": None, "role": "", "exchange_address": None,
+                                 "confidence": 1.0}
+
+                        # Method 1: Address property
+                        try:
+                            entry["email"] = recipient.Address
+                            if is_exchange_address(entry["email"]):
+                                entry["exchange_address"] = entry["email"]
+                        except:
+                            pass
+
+                        # Method 2: SMTP Address property, unless the entry is filtered out already
+                        if entry["email"] is None or is_exchange_address(entry["email"]):
+                            if contact_filter is not None and \
+                                    contact_filter.check(entry["email"], entry["name"], RECIPIENT) is DROP:
+                                contact_filter.smtp_reads_skipped += 1
+                                recipients.append(entry)
+                                continue
+                            try:
+                                smtp = recipient.PropertyAccessor.GetProperty(SMTP_PROPERTY)
+                                if smtp:
+                                    entry["email"] = smtp
+                            except:
+                                pass
+
+                        recipients.append(entry)
+                    except:
+                        pass
+        except:
+            pass
+
+        if recipient_cache is not None:
+            # Filtered entries are remembered too, so the next message to the same people is a hit
+            recipient_cache.learn(recipients)
+
+    if contact_filter is not None:
+        recipients = [entry for entry in recipients if not contact_filter.drop_entry(entry, RECIPIENT)]
+    return recipients
+
+
+# When an email was received (sent, for Sent Items) as "YYYY-MM-DD HH:MM:SS",
+# which sorts like the time itself; "" when Outlook does not say
+def item_time(item):
+    try:
+        return item.ReceivedTime.strftime("%Y-%m-%d %H:%M:%S")
+    except Exception:
+        return ""
+
+
+# Restrict filter for items modified at or after `since`
+def since_filter(since):
+    return f"[LastModificationTime] >= '{since.strftime('%m/%d/%Y %I:%M %p')}'"
+
+
+# Items of a folder; only those modified at or after `since` when given,
+# newest first when `newest_first` is set
+def folder_items(folder, since=None, newest_first=False):
+    items = folder.Items
+    if since is not None:
+        items = items.Restrict(since_filter(since))
+    if newest_first:
+        items.Sort("[ReceivedTime]", True)
+    return items
+
+
+# `coverage` (scan_coverage.ScanCoverage) decides which items are read when
+# the scan may stop early; `memory` (scan_memory.MemoryMonitor) samples memory
+# per folder; `contact_filter` (contact_filter.ContactFilter) drops unwanted
+# contacts before they are resolved. With `item_times` every email carries
+# its received time as message["time"], one more Outlook call per email.
+# `contacts_index` (contacts_index.ContactsIndex) is loaded from the Contacts
+# folder before the first email is read.
+def make_item_reader(namespace, folders_to_scan, channel, stats, errors, get_folder=None, since=None,
+                     newest_first=False, coverage=None, memory=None, recipient_cache=None, contact_filter=None,
+                     item_times=False, contacts_index=None):
+    get_folder = get_folder or namespace.GetDefaultFolder
+    if recipient_cache is None:
+        recipient_cache = RecipientCache()
+    if contacts_index is None:
+        contacts_index = ContactsIndex()
+    wants_contacts = contact_filter is None or contact_filter.wants_folder("Contacts")
+
+    def read_items(emit):
+        contacts_folder = None
+        if wants_contacts:
+            channel.set_status("Reading Contacts folder...", 8)
+            try:
+                contacts_folder = get_folder(10)  # 10 = olFolderContacts
+                contacts_index.load(contacts_folder, errors)
+            except Exception as e:
+                errors.record("Contacts", e)
+        stats["contacts_indexed"] = len(contacts_index)
+
+        # Count all items up front so progress can be reported per item
+        items_by_folder = {}
+        total_items = 0
+        for folder_name, folder in folders_to_scan.items():
+            if coverage is not None and coverage.should_stop():
+                break
+            try:
+                items_by_folder[folder_name] = folder_items(folder, since, newest_first)
+                total_items += items_by_folder[folder_name].Count
+            except Exception as e:
+                errors.record(folder_name, e)
+        channel.set_status("Scanning folders...", 10)
+        channel.set_total(total_items)
+        if coverage is not None:
+            coverage.total_items = total_items
+
+        # Process all folders
+        for folder_name, items in items_by_folder.items():
+            try:
+                channel.start_folder(folder_name)
+                if coverage is not None:
+                    coverage.start_folder(folder_name)
+                if memory is not None:
+                    memory.start_folder(folder_name)
+
+                for item in iter_items(items):
+                    if memory is not None:
+                        memory.tick()
+                    action = coverage.next_action() if coverage is not None else READ
+                    if action == SKIP:
+                        channel.advance()
+                        continue
+                    if action != READ:
+                        break
+                    channel.advance()
+                    try:
+                        if item.Class == 43:  # olMailItem
+                            stats["items_processed"] += 1
+                            message = read_mail_item(item, folder_name, recipient_cache, contact_filter)
+                            if item_times:
+                                message["time"] = item_time(item)
+                            if coverage is not None:
+                                coverage.observe(message)
+                            if message["sender"] or message["recipients"]:
+                                emit(message)
+                            elif contact_filter is not None:
+                                contact_filter.messages_dropped += 1
+                    except Exception as e:
+                        # Skip this item, counted for the run summary
+                        errors.record(folder_name, e)
+            except Exception as e:
+                # Skip this folder and continue with others
+                errors.record(folder_name, e)
+                continue
+            finally:
+                if memory is not None:
+                    memory.end_folder()
+            if coverage is not None and coverage.partial:
+                break
+
+        stats["recipient_cache_items"] = recipient_cache.items
+        stats["recipients_skipped"] = recipient_cache.skipped
+
+        if coverage is not None and coverage.partial:
+            return
+        if not wants_contacts:
+            contact_filter.folders_skipped.append("Contacts")
+            return
+        if contacts_folder is None:
+            return
+
+        channel.set_status("Scanning Contacts folder...", 80)
+
+        # The Contacts folder, with the most job title info, from the index
+        # (or only what changed since `since`)
+        rows = contacts_index.rows
+        if since is not None:
+            rows = read_contact_rows(contacts_folder, since_filter(since), errors)
+        for row in rows:
+            if coverage is not None and coverage.should_stop():
+                break
+            for record in contact_records(row):
+                if contact_filter is not None:
+                    entry = {"email": record["Email"], "name": record["Full Name"], "exchange_address": None}
+                    if contact_filter.drop_entry(entry, CONTACT):
+                        continue
+                emit({"kind": "contact", "record": record})
+
+    return read_items
+
+
+# ---- Stage 2: address resolver -----------------------------------------------
+
+# Resolves display names and X500 addresses through the GAL. Results are
+# cached by key for the whole run and shared by all resolver workers, so each
+# distinct person is looked up once instead of once per message. Resolved X500
+# addresses teach the AddressRules (address_rules.py) how this tenant builds
+# SMTP addresses, and those rules fill in the ones that do not resolve.
+# Entries that `contact_filter` could only judge by their SMTP address are
+# checked once it is known.
+class AddressResolver:
+    def __init__(self, connect=connect_outlook, disconnect=disconnect_outlook, rules=None, contact_filter=None,
+                 coverage=None, contacts_index=None):
+        self.connect = connect
+        self.disconnect = disconnect
+        self.rules = rules
+        self.contact_filter = contact_filter
+        # Once the scan stops early, messages still queued are not looked up
+        self.coverage = coverage
+        # People of the Contacts folder (contacts_index.py), never looked up
+        self.contacts_index = contacts_index
+        self.cache = {}
+        self.lock = threading.Lock()
+        self.lookups = 0
+        self.index_hits = 0
+        # [lookups, Outlook calls] by X500 address and by display name
+        self.lookup_calls = {"exchange": [0, 0], "name": [0, 0]}
+
+    def setup(self):
+        return self.connect()
+
+    def teardown(self, namespace):
+        if namespace is not None:
+            self.disconnect(namespace)
+
+    def lookup(self, namespace, key):
+        cache_key = key.lower()
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        smtp, job_title = "", ""
+        calls_before = SCHEDULER.thread_calls()
+        try:
+            with self.lock:
+                self.lookups += 1
+            recipient = namespace.CreateRecipient(key)
+            recipient.Resolve()
+            if recipient.Resolved:
+                entry = recipient.AddressEntry
+                if entry.Type == "EX":  # Exchange user
+                    try:
+                        exchange_user = entry.GetExchangeUser()
+                        if exchange_user:
+                            smtp = exchange_user.PrimarySmtpAddress or ""
+                            if hasattr(exchange_user, 'JobTitle'):
+                                job_title = exchange_user.JobTitle or ""
+                    except:
+                        pass
+
+                    if not job_title:
+                        try:
+                            job_title = entry.PropertyAccessor.GetProperty(TITLE_PROPERTY) or ""
+                        except:
+                            pass
+
+                    if not job_title:
+                        try:
+                            contact = entry.GetContact()
+                            if contact and hasattr(contact, 'JobTitle'):
+                                job_title = contact.JobTitle or ""
+                        except:
+                            pass
+        except:
+            pass
+
+        with self.lock:
+            counts = self.lookup_calls["exchange" if is_exchange_address(key) else "name"]
+            counts[0] += 1
+            counts[1] += SCHEDULER.thread_calls() - calls_before
+        result = (smtp, job_title)
+        self.cache[cache_key] = result
+        return result
+
+    # Average Outlook calls of one lookup of `key` in this run
+    def lookup_cost(self, key):
+        lookups, calls = self.lookup_calls["exchange" if is_exchange_address(key) else "name"]
+        return calls / lookups if calls else LOOKUP_CALLS
+
+    # Fill in email and role of one sender or recipient entry
+    def resolve_entry(self, namespace, entry, want_role):
+        email = entry["email"]
+        x500 = entry["exchange_address"]
+        needs_address = email is None or is_exchange_address(email)
+
+        # PR_SMTP_ADDRESS already mapped this X500 address: free training data
+        if x500 and not needs_address and self.rules:
+            self.rules.observe(x500, entry["name"], email)
+        if not needs_address and not want_role:
+            return
+
+        found = self.contacts_index.find(entry) if self.contacts_index is not None else None
+        if found is not None:
+            with self.lock:
+                self.index_hits += 1
+            if needs_address and found[0]:
+                entry["email"] = found[0]
+                needs_address = False
+            if not entry["role"] and found[1]:
+                entry["role"] = found[1]
+            # A contact known only by its Exchange address still needs one
+            if not needs_address:
+                return
+            want_role = want_role and not found[1]
+
+        smtp, job_title = "", ""
+        x500_failed = False
+        if x500:
+            if x500.lower() not in self.cache and self.rules and self.rules.should_skip_lookup(x500):
+                x500_failed = True
+            else:
+                smtp, job_title = self.lookup(namespace, x500)
+                if self.rules:
+                    if smtp:
+                        self.rules.observe(x500, entry["name"], smtp)
+                    else:
+                        self.rules.mark_unresolvable(x500)
+                x500_failed = not smtp
+
+        # An X500 address the GAL could not resolve is rewritten with the
+        # learned rule instead of trying again by display name
+        if needs_address and x500_failed:
+            guess, confidence = fallback_address(entry, self.rules)
+            if guess:
+                entry["email"] = guess
+                entry["confidence"] = confidence
+                needs_address = False
+                want_role = False
+
+        if (not smtp and needs_address) or (not job_title and want_role):
+            name_smtp, name_title = self.lookup(namespace, entry["name"])
+            smtp = smtp or name_smtp
+            job_title = job_title or name_title
+
+        if needs_address and smtp:
+            entry["email"] = smtp
+        if not entry["role"] and job_title:
+            entry["role"] = job_title
+
+    # Exchange-only entries of this tenant that the filter's domain lists
+    # rule out, known from the tenant's domain without a lookup
+    def _drop_tenant_entries(self, message):
+        domain = self.rules.rule["domain"]
+        sender = message["sender"]
+        if sender and sender["exchange_address"] and is_exchange_address(sender["email"]) and \
+                self.contact_filter.drop_tenant_entry(sender, SENDER, domain):
+            message["sender"] = None
+        message["recipients"] = [entry for entry in message["recipients"]
+                                 if not (entry["exchange_address"] and is_exchange_address(entry["email"])
+                                         and self.contact_filter.drop_tenant_entry(entry, RECIPIENT, domain))]
+
+    def __call__(self, message, emit, namespace):
+        if message["kind"] == "mail":
+            if self.contact_filter is not None and self.rules and self.rules.rule:
+                self._drop_tenant_entries(message)
+            sender = message["sender"]
+            # A stopped scan only drains the queue: learned rules, no lookups
+            if self.coverage is None or not self.coverage.partial:
+                if sender and is_exchange_address(sender["email"]):
+                    self.resolve_entry(namespace, sender, want_role=True)
+                for entry in message["recipients"]:
+                    self.resolve_entry(namespace, entry, want_role=True)
+
+            for entry in [sender] + message["recipients"]:
+                if entry and (entry["email"] is None or is_exchange_address(entry["email"])):
+                    guess, confidence = fallback_address(entry, self.rules)
+                    if guess:
+                        entry["email"] = guess
+                        entry["confidence"] = confidence
+
+            if self.contact_filter is not None:
+                if sender and self.contact_filter.drop_resolved(sender, SENDER):
+                    message["sender"] = None
+                message["recipients"] = [entry for entry in message["recipients"]
+                                         if not self.contact_filter.drop_resolved(entry, RECIPIENT)]
+        emit(message)
+
+
+# Last resort for addresses the GAL could not resolve. Returns
+# (email, confidence), or (None, 0.0) when nothing better than the X500
+# address is known; normalize.py then drops the entry.
+def fallback_address(entry, rules=None):
+    name = entry["name"] or ""
+
+    # Extract from display name if it contains an email
+    if "@" in name:
+        email_match = EMAIL_PATTERN.search(name)
+        if email_match:
+            return email_match.group(0), DISPLAY_NAME_CONFIDENCE
+
+    # Rewrite the Exchange address with the tenant's learned convention
+    if rules and entry["exchange_address"]:
+        return rules.guess(entry["exchange_address"], name)
+
+    return None, 0.0
+
+
+# ---- Stage 3: role extractor -------------------------------------------------
+
+class RoleExtractor:
+    def __init__(self, role_cache=None):
+        # Roles by sender and signature, kept between runs when a file is given
+        self.role_cache = role_cache if role_cache is not None else RoleCache()
+        # Latest role found for each address, for messages without a body
+        self.known_roles = {}
+
+    def _role(self, email, name, body):
+        email = email.lower()
+        if not body:
+            return self.known_roles.get(email, "")
+        role = extract_role_from_body(email, name, body, self.role_cache)
+        if role:
+            self.known_roles[email] = role
+        return role or self.known_roles.get(email, "")
+
+    def __call__(self, message, emit):
+        if message["kind"] == "mail":
+            folder_name = message["folder"]
+            body = message["body"]
+
+            sender = message["sender"]
+            if sender:
+                # Don't analyse our own signatures
+                if sender["email"] and "@" in sender["email"] and not sender["role"] and folder_name != "Sent Items":
+                    sender["role"] = self._role(sender["email"], sender["name"], body)
+
+            for entry in message["recipients"]:
+                email = entry["email"]
+                # If no role yet and this is in the Inbox, try to extract from signature
+                if not entry["role"] and folder_name == "Inbox" and email and "@" in email:
+                    entry["role"] = self._role(email, entry["name"], body)
+
+            # The body is not needed past this point
+            message["body"] = ""
+        emit(message)
+
+
+# ---- Stage 4: aggregator -----------------------------------------------------
+
+SEEN_COUNT_COLUMN = "Times Seen"
+LAST_SEEN_COLUMN = "Last Seen"
+
+# Keeps the best record per email address: the first record that has a role,
+# otherwise the first record seen. Names are split later, once per contact,
+# by the normalisation step in the writer.
+#
+# When memory runs short, request_spill() makes the aggregator write the
+# records it holds to a temporary file and start over; records() merges the
+# spilled records back in the order they were seen, which keeps the same rule.
+#
+# `on_record(record)` is called whenever a record becomes the best one for its
+# address, so contacts can be streamed while the scan runs: an address comes
+# again when a later record for it has a role.
+#
+# With `sightings`, the aggregator also counts how often each address was
+# seen and the latest email time it was seen at; records() adds them as the
+# "Times Seen" and "Last Seen" columns (see contact_artifact.py).
+class ContactAggregator:
+    def __init__(self, on_record=None, sightings=False):
+        self.best = {}
+        self.raw_records = 0
+        self.spill_files = []
+        self.spill_requested = False
+        self.on_record = on_record
+        # Addresses already streamed with a role, which a spill must not undo
+        self.streamed_roles = set()
+        self.sightings = {} if sightings else None   # email -> [times seen, last seen]
+
+    def add(self, record, seen_at=""):
+        self.raw_records += 1
+        if self.sightings is not None:
+            seen = self.sightings.get(record["Email"])
+            if seen is None:
+                self.sightings[record["Email"]] = [1, seen_at]
+            else:
+                seen[0] += 1
+                if seen_at > seen[1]:
+                    seen[1] = seen_at
+        if self._keep(self.best, record) and self.on_record is not None:
+            if str(record["Role"]):
+                self.streamed_roles.add(record["Email"])
+            elif record["Email"] in self.streamed_roles:
+                return
+            self.on_record(record)
+
+    # Returns True when `record` became the best one for its address
+    @staticmethod
+    def _keep(best, record):
+        current = best.get(record["Email"])
+        if current is None or (not str(current["Role"]) and str(record["Role"])):
+            best[record["Email"]] = record
+            return True
+        return False
+
+    # Called from other threads; the spill happens on the aggregator's thread
+    def request_spill(self):
+        self.spill_requested = True
+
+    def spill(self):
+        self.spill_requested = False
+        if not self.best:
+            return
+        fd, path = tempfile.mkstemp(prefix="contacts_spill_", suffix=".jsonl")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for record in self.best.values():
+                f.write(json.dumps(record) + "\n")
+        logging.info(f"Spilled {len(self.best)} contact records to {path}")
+        self.spill_files.append(path)
+        self.best = {}
+
+    def __call__(self, message, emit):
+        if self.spill_requested:
+            self.spill()
+        if message["kind"] == "contact":
+            self.add(message["record"])
+            return
+
+        folder_name = message["folder"]
+        seen_at = message.get("time", "")
+        sender = message["sender"]
+        if sender and sender["email"] and "@" in sender["email"]:
+            self.add({
+                "First Name": "",
+                "Last Name": "",
+                "Full Name": sender["name"],
+                "Email": sender["email"].lower(),
+                "Role": sender["role"],
+                "Source": f"{folder_name} (Sender)",
+                "Confidence": sender["confidence"]
+            }, seen_at)
+
+        for entry in message["recipients"]:
+            email = entry["email"]
+            # Skip if still no valid email
+            if email is None and entry["exchange_address"] is None:
+                continue
+            # Use exchange_address if we don't have a better email
+            if not email and entry["exchange_address"]:
+                email = entry["exchange_address"]
+
+            self.add({
+                "First Name": "",
+                "Last Name": "",
+                "Full Name": entry["name"],
+                "Email": email.lower() if email else "",
+                "Role": entry["role"],
+                "Source": f"{folder_name} (Recipient)",
+                "Confidence": entry["confidence"]
+            }, seen_at)
+
+    def records(self):
+        if self.spill_files:
+            self._merge_spills()
+        if self.sightings is None:
+            return list(self.best.values())
+        return [dict(record, **{SEEN_COUNT_COLUMN: self.sightings[record["Email"]][0],
+                                LAST_SEEN_COLUMN: self.sightings[record["Email"]][1]})
+                for record in self.best.values()]
+
+    def _merge_spills(self):
+        merged = {}
+        for path in self.spill_files:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    self._keep(merged, json.loads(line))
+            os.remove(path)
+        self.spill_files = []
+        for record in self.best.values():
+            self._keep(merged, record)
+        self.best = merged
+
+
+# ---- Stage 5: writer ---------------------------------------------------------
+
+# Clean addresses and split names for all contacts at once, merge addresses
+# of the same person and sort by name
+def prepare_contacts(records, merge=True):
+    import pandas as pd
+    from identity import merge_identities
+    from normalize import normalize_contacts
+
+    result_df = normalize_contacts(pd.DataFrame(records))
+
+    # One row per person, with their other addresses alongside
+    if merge:
+        result_df = merge_identities(result_df)
+
+    # Sort by name
+    return result_df.sort_values(by=['Last Name', 'First Name'])
+
+
+def save_contacts(result_df, file_prefix="outlook_contacts"):
+    # Save to Excel
+    desktop_path = os.path.join(os.path.expanduser("~"), "Desktop")
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    file_path = os.path.join(desktop_path, f"{file_prefix}_{timestamp}.xlsx")
+
+    try:
+        result_df.to_excel(file_path, index=False)
+    except Exception:
+        # Try saving to temp directory if desktop fails
+        temp_dir = tempfile.gettempdir()
+        file_path = os.path.join(temp_dir, f"{file_prefix}_{timestamp}.xlsx")
+        result_df.to_excel(file_path, index=False)
+
+    return file_path
+
+
+def write_contacts(records, merge=True):
+    return save_contacts(prepare_contacts(records, merge))
+
+
+# Run the whole scan and return (records, stats). The calling thread must
+# already be connected to Outlook through `namespace`; it runs the item
+# reader itself, while the other stages get their own threads. `mailbox`
+# selects another mailbox than the primary one (see mailbox_folder_getter);
+# `since` limits the scan to items modified since that datetime. With
+# options.saturation or options.time_budget the scan may stop early, and
+# stats["coverage"] says how much of the mailbox it covered. Cancelling
+# `stop_token` (scan_coverage.StopToken) stops it too; a scan stopped by the
+# budget or the token returns what it found with stats["partial"] set;
+# stats["stopped_early"] is also set when a saturated folder was skipped.
+# `on_record` streams contacts as they are found (see ContactAggregator).
+# options.artifact adds how often and when each contact was seen to the
+# records, for a mergeable artifact (contact_artifact.py).
+# Callers running several scans at once pass one shared AddressRules as
+# `rules` and one RoleCache as `role_cache`, and save them themselves.
+# `contact_filter` (contact_filter.ContactFilter) leaves out unwanted
+# contacts and folders; stats["filter"] says what that saved.
+def run_extraction(namespace, channel, options=None, connect=connect_outlook,
+                   disconnect=disconnect_outlook, mailbox=None, rules=None, since=None, role_cache=None,
+                   contact_filter=None, stop_token=None, on_record=None):
+    resolver_workers = getattr(options, "resolver_workers", DEFAULT_RESOLVER_WORKERS)
+    role_workers = getattr(options, "role_workers", DEFAULT_ROLE_WORKERS)
+    queue_size = getattr(options, "queue_size", DEFAULT_QUEUE_SIZE)
+    saturation = getattr(options, "saturation", None)
+    time_budget = getattr(options, "time_budget", None)
+    # Stopping at saturation only makes sense when the newest items come first
+    newest_first = getattr(options, "newest_first", False) or saturation is not None
+
+    rules_path = getattr(options, "rules_file", None) or DEFAULT_RULES_PATH
+
+    stats = {"items_processed": 0, "mailbox": mailbox or ""}
+    get_folder = mailbox_folder_getter(namespace, mailbox)
+    folders_to_scan = get_folders_to_scan(namespace, mailbox, get_folder)
+    if contact_filter is None:
+        contact_filter = filter_from_options(options)
+    if contact_filter is not None:
+        for folder_name in list(folders_to_scan):
+            if not contact_filter.wants_folder(folder_name):
+                del folders_to_scan[folder_name]
+                contact_filter.folders_skipped.append(folder_name)
+
+    errors = ErrorCounter()
+    own_rules = rules is None
+    if own_rules:
+        rules = AddressRules(rules_path).load()
+    guesses_before, skipped_before = rules.guesses, rules.skipped_lookups
+    own_role_cache = role_cache is None
+    if own_role_cache:
+        role_cache = RoleCache(getattr(options, "role_cache_file", None) or DEFAULT_ROLE_CACHE_PATH).load()
+    role_hits_before, role_misses_before = role_cache.hits, role_cache.misses
+    coverage = None
+    if saturation is not None or time_budget or stop_token is not None:
+        coverage = ScanCoverage(threshold=saturation, time_budget=time_budget,
+                                after_saturation=getattr(options, "after_saturation", AFTER_SATURATION[0]),
+                                stop_token=stop_token)
+    contacts_index = ContactsIndex()
+    resolver = AddressResolver(connect, disconnect, rules, contact_filter, coverage, contacts_index)
+    role_extractor = RoleExtractor(role_cache)
+    sightings = getattr(options, "artifact", None) is not None
+    aggregator = ContactAggregator(on_record, sightings)
+
+    recipient_cache = RecipientCache()
+    calls_before = SCHEDULER.stats()
+
+    # Past the memory ceiling, hand the aggregated records to disk and forget
+    # the recipients remembered by the reader
+    def spill():
+        aggregator.request_spill()
+        recipient_cache.clear()
+    memory = MemoryMonitor(getattr(options, "max_rss_mb", None), on_ceiling=spill)
+
+    pipeline = Pipeline(
+        make_item_reader(namespace, folders_to_scan, channel, stats, errors, get_folder, since,
+                         newest_first, coverage, memory, recipient_cache, contact_filter, sightings, contacts_index),
+        [
+            Stage("resolver", resolver, workers=resolver_workers, queue_size=queue_size,
+                  setup=resolver.setup, teardown=resolver.teardown),
+            Stage("roles", role_extractor, workers=role_workers, queue_size=queue_size),
+            # A single aggregator keeps the best-record rule race-free
+            Stage("aggregator", aggregator, workers=1, queue_size=queue_size),
+        ],
+        errors=errors,
+    )
+    pipeline.run()
+    if own_rules:
+        rules.save()
+    if own_role_cache:
+        role_cache.save()
+
+    stats["gal_lookups"] = resolver.lookups
+    stats["contacts_index_hits"] = resolver.index_hits
+    stats["address_rule"] = rules.rule
+    stats["guessed_addresses"] = rules.guesses - guesses_before
+    stats["skipped_lookups"] = rules.skipped_lookups - skipped_before
+    stats["role_cache_hits"] = role_cache.hits - role_hits_before
+    stats["role_cache_misses"] = role_cache.misses - role_misses_before
+    stats["raw_records"] = aggregator.raw_records
+    stats["stage_metrics"] = pipeline.metrics()
+    stats["bottleneck"] = pipeline.bottleneck()
+    stats["elapsed_seconds"] = pipeline.elapsed
+    stats["item_errors"] = errors.summary()
+    stats["partial"] = coverage is not None and coverage.partial
+    # Partial, or a saturated folder was not read to the end
+    stats["stopped_early"] = coverage is not None and coverage.stopped_early
+    # A token that was never used says nothing about coverage
+    measured = saturation is not None or time_budget or stats["partial"]
+    stats["coverage"] = coverage.report() if coverage is not None and measured else None
+    stats["folder_memory"] = memory.report()
+    stats["outlook_calls"] = SCHEDULER.stats_since(calls_before)
+    stats["memory_spills"] = memory.spills
+    stats["filter"] = None
+    if contact_filter is not None:
+        stats["filter"] = contact_filter.report(resolver.cache, resolver.lookup_cost)
+
+    logging.info(f"Pipeline finished in {pipeline.elapsed:.1f}s for {mailbox or 'primary mailbox'}, "
+                 f"{stats['items_processed']} emails, {aggregator.raw_records} raw records, "
+                 f"{resolver.lookups} GAL lookups")
+    logging.info("Stage metrics:\n" + format_metrics(stats["stage_metrics"]))
+    logging.info(f"Bottleneck stage: {stats['bottleneck']}")
+    logging.info(f"Address rule: {rules.rule}, {stats['guessed_addresses']} addresses guessed, "
+                 f"{stats['skipped_lookups']} GAL lookups skipped")
+    logging.info(f"Contacts index: {stats.get('contacts_indexed', 0)} contacts, "
+                 f"{resolver.index_hits} senders/recipients resolved from it without a GAL lookup")
+    logging.info(f"Recipients: {stats.get('recipients_skipped', 0)} Recipient objects skipped on "
+                 f"{stats.get('recipient_cache_items', 0)} emails to known recipients")
+    logging.info(f"Signature roles: {stats['role_cache_hits']} from cache, "
+                 f"{stats['role_cache_misses']} extracted, {len(role_cache)} cached")
+    logging.info(f"Outlook calls: {format_scheduler_stats(stats['outlook_calls'])}")
+    if stats["coverage"] is not None:
+        logging.info(f"Coverage: {format_coverage(stats['coverage'])}")
+    if stats["filter"] is not None:
+        logging.info(f"Filter: {format_filter_stats(stats['filter'])}")
+    errors.log_summary("Extraction")
+
+    return aggregator.records(), stats
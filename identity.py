@@ -0,0 +1,268 @@
+import re
+import unicodedata
+import zlib
+
+import numpy as np
+import pandas as pd
+
+# Fuzzy identity merge of normalised contacts.
+#
+# After normalize.py every row has a distinct address, but one person often
+# has several: work and personal mailboxes, plus-addressed variants,
+# "jane.doe@" next to "janedoe@", or a guessed address next to the real one.
+# This step groups rows that are likely the same person and emits one contact
+# per group, with the other addresses in "Other Emails".
+#
+# Comparing all pairs is quadratic, so rows are only compared inside blocks:
+#   - mailbox: the same local part (without "+tag" and punctuation) in the
+#     same domain
+#   - handle: a personal-looking local part such as "jane.doe" in any domain
+#   - name: MinHash signatures of the name's character 3-grams, bucketed by
+#     LSH bands; inside a bucket each row is compared with its next few
+#     neighbours only (sorted neighbourhood), so cost stays linear. A similar
+#     name alone is not enough: the addresses must also share their domain or
+#     their local part, so "John Smith" at two unrelated companies stays two
+#     people
+# Blocks larger than max_block (very common names, shared handles) are not
+# used for linking: they are far more likely to be different people. All
+# steps work on numpy arrays in chunks, so 1M rows need a few hundred MB.
+
+OTHER_EMAILS_COLUMN = "Other Emails"
+
+NUM_PERM = 32             # MinHash values per name
+BANDS = 8                 # LSH bands of NUM_PERM // BANDS values each
+NAME_THRESHOLD = 0.8      # estimated 3-gram Jaccard similarity to merge names
+HANDLE_NAME_THRESHOLD = 0.5  # names must not disagree when handles match
+WINDOW = 4                # neighbours compared inside an LSH bucket
+MAX_BLOCK = 25            # larger blocks are treated as different people
+CHUNK_SIZE = 100000
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.RandomState(7)
+_PERM_A = _rng.randint(1, _PRIME, size=NUM_PERM).astype(np.int64)
+_PERM_B = _rng.randint(0, _PRIME, size=NUM_PERM).astype(np.int64)
+
+_NON_ALNUM = re.compile(r"[^a-z0-9 ]+")
+_HANDLE = re.compile(r"^[a-z]{2,}[._\-][a-z]{2,}")
+
+
+def name_key(first, last, full):
+    name = f"{first} {last}" if (first or last) else full
+    if not name or "@" in name:
+        return ""
+    name = unicodedata.normalize("NFKD", name).encode("ascii", "ignore").decode("ascii")
+    tokens = _NON_ALNUM.sub(" ", name.lower()).split()
+    if len(tokens) < 2:
+        return ""
+    return " ".join(sorted(tokens))
+
+
+def address_keys(email):
+    local, _, domain = email.partition("@")
+    local = local.split("+", 1)[0]
+    canonical = re.sub(r"[^a-z0-9]", "", local)
+    handle = canonical if len(canonical) >= 6 and _HANDLE.match(local) else ""
+    return f"{canonical}@{domain}", handle
+
+
+# ---- MinHash -----------------------------------------------------------------
+
+def _shingle_hashes(key, cache):
+    padded = f" {key} "
+    hashes = []
+    for i in range(len(padded) - 2):
+        shingle = padded[i:i + 3]
+        value = cache.get(shingle)
+        if value is None:
+            value = cache[shingle] = zlib.crc32(shingle.encode("ascii")) % _PRIME
+        hashes.append(value)
+    return hashes
+
+
+# One row of NUM_PERM MinHash values per name key; rows without a name key
+# are all zeros and never used
+def minhash_signatures(keys):
+    signatures = np.zeros((len(keys), NUM_PERM), dtype=np.uint32)
+    cache = {}
+    for start in range(0, len(keys), CHUNK_SIZE):
+        chunk = keys[start:start + CHUNK_SIZE]
+        rows, flat, offsets = [], [], []
+        for i, key in enumerate(chunk):
+            if key:
+                rows.append(start + i)
+                offsets.append(len(flat))
+                flat.extend(_shingle_hashes(key, cache))
+        if not rows:
+            continue
+        flat = np.asarray(flat, dtype=np.int64)
+        offsets = np.asarray(offsets, dtype=np.int64)
+        for k in range(NUM_PERM):
+            permuted = (_PERM_A[k] * flat + _PERM_B[k]) % _PRIME
+            signatures[rows, k] = np.minimum.reduceat(permuted, offsets)
+    return signatures
+
+
+def _similarity(signatures, a, b):
+    return (signatures[a] == signatures[b]).mean(axis=1)
+
+
+# ---- linking -----------------------------------------------------------------
+
+# Connected components of the accepted pairs, by min-label propagation with
+# pointer jumping
+def _components(count, pairs):
+    labels = np.arange(count, dtype=np.int64)
+    if not pairs:
+        return labels
+    a = np.concatenate([p[0] for p in pairs])
+    b = np.concatenate([p[1] for p in pairs])
+    while True:
+        low = np.minimum(labels[a], labels[b])
+        before = labels.copy()
+        np.minimum.at(labels, a, low)
+        np.minimum.at(labels, b, low)
+        labels = labels[labels]
+        if np.array_equal(labels, before):
+            return labels
+
+
+# Link every row of an exact-key block to the first row of the block, for
+# blocks of 2..max_block rows. Returns (rows, firsts) of the candidate links.
+def _exact_block_links(keys, max_block):
+    keys = np.asarray(keys, dtype=object)
+    present = np.flatnonzero(keys != "")
+    if len(present) < 2:
+        return np.empty(0, np.int64), np.empty(0, np.int64)
+    codes, inverse, counts = np.unique(keys[present], return_inverse=True, return_counts=True)
+    usable = (counts[inverse] >= 2) & (counts[inverse] <= max_block)
+    rows = present[usable]
+    inverse = inverse[usable]
+    order = np.argsort(inverse, kind="stable")
+    rows, inverse = rows[order], inverse[order]
+    first_of = np.full(len(codes), -1, dtype=np.int64)
+    first_of[inverse[::-1]] = rows[::-1]
+    firsts = first_of[inverse]
+    keep = rows != firsts
+    return rows[keep], firsts[keep]
+
+
+# Integer codes of string keys, for comparing many pairs at once
+def _codes(keys):
+    if not len(keys):
+        return np.empty(0, np.int64)
+    return np.unique(np.asarray(keys, dtype=object), return_inverse=True)[1].astype(np.int64)
+
+
+# `domains` and `locals_` are codes of each row's domain and canonical local
+# part; a name link needs one of them to match
+def _name_links(signatures, has_name, domains, locals_, threshold, window, max_block):
+    rows = np.flatnonzero(has_name)
+    links = []
+    per_band = NUM_PERM // BANDS
+    for band in range(BANDS):
+        values = signatures[rows, band * per_band:(band + 1) * per_band].astype(np.uint64)
+        bucket = np.zeros(len(rows), dtype=np.uint64)
+        for column in range(per_band):
+            bucket = bucket * np.uint64(1000003) + values[:, column]
+
+        order = np.argsort(bucket, kind="stable")
+        sorted_bucket = bucket[order]
+        _, inverse, counts = np.unique(sorted_bucket, return_inverse=True, return_counts=True)
+        small = counts[inverse] <= max_block
+
+        for d in range(1, window + 1):
+            if d >= len(order):
+                break
+            same = (sorted_bucket[:-d] == sorted_bucket[d:]) & small[:-d]
+            a = rows[order[:-d][same]]
+            b = rows[order[d:][same]]
+            close = _similarity(signatures, a, b) >= threshold
+            close &= (domains[a] == domains[b]) | (locals_[a] == locals_[b])
+            links.append((a[close], b[close]))
+    return links
+
+
+# Returns an identity label per row: rows with the same label are one person
+def identity_labels(df, threshold=NAME_THRESHOLD, window=WINDOW, max_block=MAX_BLOCK):
+    count = len(df)
+    emails = df["Email"].fillna("").astype(str).tolist()
+    firsts = df["First Name"].fillna("").astype(str).tolist() if "First Name" in df else [""] * count
+    lasts = df["Last Name"].fillna("").astype(str).tolist() if "Last Name" in df else [""] * count
+    fulls = df["Full Name"].fillna("").astype(str).tolist()
+
+    names = [name_key(f, l, n) for f, l, n in zip(firsts, lasts, fulls)]
+    mailboxes, handles = zip(*(address_keys(e) for e in emails)) if count else ((), ())
+    has_name = np.array([bool(n) for n in names], dtype=bool)
+    signatures = minhash_signatures(names)
+
+    pairs = []
+
+    # Same mailbox: plus-addressing and punctuation variants
+    pairs.append(_exact_block_links(mailboxes, max_block))
+
+    # Same personal handle in different domains, unless the names disagree
+    a, b = _exact_block_links(handles, max_block)
+    both_named = has_name[a] & has_name[b]
+    agree = ~both_named | (_similarity(signatures, a, b) >= HANDLE_NAME_THRESHOLD)
+    pairs.append((a[agree], b[agree]))
+
+    # Similar names at the same domain or with the same local part
+    domains = _codes([mailbox.partition("@")[2] for mailbox in mailboxes])
+    locals_ = _codes([mailbox.partition("@")[0] for mailbox in mailboxes])
+    pairs.extend(_name_links(signatures, has_name, domains, locals_, threshold, window, max_block))
+
+    pairs = [p for p in pairs if len(p[0])]
+    return _components(count, pairs)
+
+
+# Merge rows of the same person into one contact. The row kept for each
+# person is the most confident one that has a name; it takes the first role
+# found in the group, and the group's other addresses go to "Other Emails".
+def merge_identities(df, **kwargs):
+    if df.empty:
+        out = df.copy()
+        out[OTHER_EMAILS_COLUMN] = ""
+        return out
+
+    work = df.reset_index(drop=True)
+    labels = identity_labels(work, **kwargs)
+
+    role = work["Role"].fillna("").astype(str) if "Role" in work else pd.Series("", index=work.index)
+    confidence = work["Confidence"] if "Confidence" in work else pd.Series(1.0, index=work.index)
+    named = ~work["Full Name"].fillna("").astype(str).str.contains("@", regex=False)
+
+    ranked = pd.DataFrame({
+        "label": labels,
+        "named": named.to_numpy(),
+        "confidence": confidence.to_numpy(),
+        "has_role": (role != "").to_numpy(),
+        "row": np.arange(len(work)),
+    }).sort_values(["label", "named", "confidence", "has_role", "row"],
+                   ascending=[True, False, False, False, True], kind="stable")
+    keep_rows = ranked.drop_duplicates("label")["row"].to_numpy()
+
+    out = work.iloc[keep_rows].copy()
+    out_labels = labels[keep_rows]
+
+    # Role: the best row's, else the first role in the group
+    group_roles = (pd.DataFrame({"label": labels, "role": role})
+                   .loc[role != ""].drop_duplicates("label").set_index("label")["role"])
+    if "Role" in out:
+        missing = out["Role"].fillna("").astype(str) == ""
+        out.loc[missing, "Role"] = pd.Series(out_labels[missing.to_numpy()], index=out.index[missing]) \
+            .map(group_roles).fillna("")
+
+    # Other addresses of each merged group
+    sizes = np.bincount(labels, minlength=len(work))
+    multi = sizes[labels] > 1
+    others = pd.Series("", index=out.index)
+    if multi.any():
+        members = pd.DataFrame({"label": labels[multi], "email": work["Email"].to_numpy()[multi]})
+        members = members[~np.isin(np.flatnonzero(multi), keep_rows)]
+        joined = members.sort_values("email").groupby("label")["email"].agg("; ".join)
+        others = pd.Series(out_labels, index=out.index).map(joined).fillna("")
+    out[OTHER_EMAILS_COLUMN] = others
+
+    out = out.sort_index(kind="stable")
+    out.index = df.index[out.index]
+    return out
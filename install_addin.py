@@ -48,7 +48,7 @@ def ensure_dependencies():
     print("Checking and installing required packages...")
     try:
         # First check if packages are already installed
-        reqs = {"pywin32": False, "pandas": False, "openpyxl": False}
+        reqs = {"pywin32": False, "pandas": False, "pyarrow": False, "openpyxl": False}
         installed_packages = [pkg.split('==')[0].lower() for pkg in subprocess.check_output([sys.executable, '-m', 'pip', 'freeze']).decode().split()]
         
         for pkg in installed_packages:
@@ -56,6 +56,8 @@ def ensure_dependencies():
                 reqs["pywin32"] = True
             elif pkg == "pandas":
                 reqs["pandas"] = True
+            elif pkg == "pyarrow":
+                reqs["pyarrow"] = True
             elif pkg == "openpyxl":
                 reqs["openpyxl"] = True
         
@@ -74,7 +76,7 @@ def ensure_dependencies():
         return True
     except Exception as e:
         print(f"Error installing packages: {e}")
-        print("Please run: pip install pywin32 pandas openpyxl")
+        print("Please run: pip install pywin32 pandas pyarrow openpyxl")
         return False
 
 def create_startup_shortcut():
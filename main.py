@@ -1,25 +1,24 @@
+import argparse
 import sys
 import os
 import subprocess
+import importlib.util
 import traceback
 import tempfile
 from datetime import datetime
 
+# Module that proves each pip package is installed
+PACKAGE_MODULES = {"pywin32": "win32com"}
+
 # Function to check and install required packages
 def ensure_packages():
-    required_packages = ["pywin32", "pandas", "openpyxl", "tkinter"]
+    required_packages = ["pywin32", "pandas", "pyarrow", "openpyxl", "tkinter"]
     missing_packages = []
     
-    # First try importing each package to see if it's already installed
+    # Look the packages up without importing them: importing pandas and
+    # win32com here would cost seconds before the window even appears
     for package in required_packages:
-        try:
-            if package == "pywin32":
-                __import__("win32com")
-            elif package == "tkinter":
-                __import__("tkinter")
-            else:
-                __import__(package)
-        except ImportError:
+        if importlib.util.find_spec(PACKAGE_MODULES.get(package, package)) is None:
             missing_packages.append(package)
     
     # If missing packages, install them
@@ -48,18 +47,16 @@ def ensure_packages():
             os.execv(sys.executable, [sys.executable] + sys.argv)
         except Exception as e:
             print(f"Error installing packages: {e}")
-            print("Please run: pip install pywin32 pandas openpyxl")
+            print("Please run: pip install pywin32 pandas pyarrow openpyxl")
             input("Press Enter to exit...")
             sys.exit(1)
 
-# Make sure required packages are installed first
-ensure_packages()
-
-# Now import the packages
-import win32com.client
-import pandas as pd
-import pythoncom
+# Heavy packages (pandas, win32com) are imported where they are first used,
+# so the window appears without waiting for them
 import logging
+from run_log import ErrorCounter, setup_logging
+from scan_memory import MemoryMonitor, iter_items
+from com_scheduler import SCHEDULER, format_scheduler_stats
 import tkinter as tk
 from tkinter import messagebox
 
@@ -67,10 +64,12 @@ from tkinter import messagebox
 log_dir = os.path.join(os.path.expanduser("~"), "AppData", "Local", "OutlookContactExporter")
 os.makedirs(log_dir, exist_ok=True)
 log_file = os.path.join(log_dir, "main_log.txt")
-logging.basicConfig(filename=log_file, level=logging.INFO, 
-                   format='%(asctime)s - %(levelname)s - %(message)s')
+setup_logging(log_file)
 
 def extract_sent_contacts():
+    import pythoncom
+    import win32com.client
+
     # Initialize COM in the current thread
     pythoncom.CoInitialize()
     
@@ -79,7 +78,9 @@ def extract_sent_contacts():
         
         # Try to create Outlook application object
         try:
-            outlook = win32com.client.Dispatch("Outlook.Application").GetNamespace("MAPI")
+            # Busy and throttling errors are retried by the call scheduler
+            outlook = SCHEDULER.wrap(win32com.client.Dispatch("Outlook.Application").GetNamespace("MAPI"))
+            calls_before = SCHEDULER.stats()
             logging.info("Connected to Outlook")
         except Exception as e:
             logging.error(f"Failed to connect to Outlook: {e}")
@@ -88,6 +89,10 @@ def extract_sent_contacts():
         
         # Initialize contacts list
         contacts = []
+        # Per-item failures are counted, not logged one by one
+        errors = ErrorCounter()
+        # Memory is sampled and logged per folder
+        memory = MemoryMonitor()
         
         # Try different approaches to get the Sent Items folder
         sent_folder = None
@@ -115,8 +120,11 @@ def extract_sent_contacts():
             # Process emails in Sent Items
             logging.info("Processing Sent Items folder")
             processed_count = 0
+            memory.start_folder("Sent Items")
             
-            for item in sent_folder.Items:
+            # One item at a time (GetFirst/GetNext), so references do not pile up
+            for item in iter_items(sent_folder.Items):
+                memory.tick()
                 processed_count += 1
                 if processed_count % 100 == 0:
                     logging.info(f"Processed {processed_count} emails so far")
@@ -151,30 +159,28 @@ def extract_sent_contacts():
                                 
                                 # Only proceed if we have a valid email
                                 if email and "@" in email:
-                                    # Try to split name into first and last name
-                                    name_parts = name.split()
-                                    first_name = name_parts[0] if len(name_parts) > 0 else ""
-                                    last_name = " ".join(name_parts[1:]) if len(name_parts) > 1 else ""
-                                    
                                     contacts.append({
-                                        "First Name": first_name,
-                                        "Last Name": last_name,
+                                        "First Name": "",
+                                        "Last Name": "",
                                         "Full Name": name,
-                                        "Email": email.lower()  # Normalize to lowercase
+                                        "Email": email
                                     })
                             except Exception as rec_err:
-                                logging.warning(f"Error processing recipient: {rec_err}")
+                                errors.record("Sent Items (recipient)", rec_err)
                                 continue
                     except Exception as item_err:
-                        logging.warning(f"Error processing email item: {item_err}")
+                        errors.record("Sent Items", item_err)
                         continue
+            memory.end_folder()
         
         # Try to get contacts from Inbox as well
         try:
             inbox = outlook.GetDefaultFolder(6)  # 6 = olFolderInbox
             logging.info("Processing Inbox for additional contacts")
+            memory.start_folder("Inbox")
             
-            for item in inbox.Items:
+            for item in iter_items(inbox.Items):
+                memory.tick()
                 if item.Class == 43:  # olMailItem
                     try:
                         # Get the sender
@@ -183,18 +189,16 @@ def extract_sent_contacts():
                             email = item.SenderEmailAddress
                             
                             if email and "@" in email:
-                                name_parts = name.split()
-                                first_name = name_parts[0] if len(name_parts) > 0 else ""
-                                last_name = " ".join(name_parts[1:]) if len(name_parts) > 1 else ""
-                                
                                 contacts.append({
-                                    "First Name": first_name,
-                                    "Last Name": last_name,
+                                    "First Name": "",
+                                    "Last Name": "",
                                     "Full Name": name,
-                                    "Email": email.lower()
+                                    "Email": email
                                 })
-                    except:
+                    except Exception as item_err:
+                        errors.record("Inbox", item_err)
                         continue
+            memory.end_folder()
         except Exception as inbox_err:
             logging.warning(f"Error accessing Inbox: {inbox_err}")
         
@@ -203,7 +207,7 @@ def extract_sent_contacts():
             contacts_folder = outlook.GetDefaultFolder(10)  # 10 = olFolderContacts
             logging.info("Processing Contacts folder")
             
-            for contact in contacts_folder.Items:
+            for contact in iter_items(contacts_folder.Items):
                 try:
                     if hasattr(contact, 'Email1Address') and contact.Email1Address:
                         email = contact.Email1Address
@@ -215,13 +219,17 @@ def extract_sent_contacts():
                             "First Name": first_name,
                             "Last Name": last_name,
                             "Full Name": name,
-                            "Email": email.lower()
+                            "Email": email
                         })
-                except:
+                except Exception as item_err:
+                    errors.record("Contacts", item_err)
                     continue
         except Exception as contacts_err:
             logging.warning(f"Error accessing Contacts folder: {contacts_err}")
         
+        errors.log_summary("Extraction")
+        logging.info(f"Outlook calls: {format_scheduler_stats(SCHEDULER.stats_since(calls_before))}")
+
         # Check if we found any contacts
         if not contacts:
             logging.warning("No contacts found in any folder")
@@ -230,7 +238,15 @@ def extract_sent_contacts():
             
         # Remove duplicates based on email address
         logging.info(f"Removing duplicates from {len(contacts)} contacts")
-        contacts_df = pd.DataFrame(contacts).drop_duplicates(subset=["Email"])
+        # pandas is only needed from here on
+        import pandas as pd
+        from identity import merge_identities
+        from normalize import normalize_contacts
+
+        # Clean addresses, split names and remove duplicates in one pass
+        contacts_df = normalize_contacts(pd.DataFrame(contacts))
+        # Merge addresses that belong to the same person
+        contacts_df = merge_identities(contacts_df)
         logging.info(f"Found {len(contacts_df)} unique contacts")
         
         # Save to Excel with timestamp to avoid overwriting
@@ -271,6 +287,25 @@ def extract_sent_contacts():
         # Clean up COM
         pythoncom.CoUninitialize()
 
+# "--profile", "--profile deterministic" or "--profile=deterministic" on the
+# command line profiles each export (run_profile.py); None when not given.
+# Parsed with the same definition as extract_contacts.py, so an unknown mode
+# exits with the same usage message.
+def profile_mode(argv):
+    parser = argparse.ArgumentParser(prog="main.py", description="Outlook Contact Exporter")
+    parser.add_argument("--profile", nargs="?", const="sampling", default=None, choices=("sampling", "deterministic"),
+                        help="Profile the export and write .pstats and flame graph stacks next to it "
+                             "(sampling by default, or deterministic)")
+    args, _ = parser.parse_known_args(argv)
+    return args.profile
+
+def run_export():
+    mode = profile_mode(sys.argv[1:])
+    if mode:
+        from run_profile import profiled
+        return profiled("outlook_contacts", extract_sent_contacts, mode=mode)
+    return extract_sent_contacts()
+
 def show_gui():
     root = tk.Tk()
     root.title("Outlook Contact Exporter")
@@ -297,7 +332,7 @@ def show_gui():
     description.pack(pady=(0, 20))
     
     # Add button
-    button = tk.Button(frame, text="Extract Contacts", command=extract_sent_contacts, 
+    button = tk.Button(frame, text="Extract Contacts", command=run_export, 
                       bg="#007bff", fg="white", font=("Arial", 12), padx=20, pady=5)
     button.pack()
     
@@ -308,7 +343,11 @@ def show_gui():
     root.mainloop()
 
 if __name__ == "__main__":
+    # Reject a bad --profile before anything starts
+    profile_mode(sys.argv[1:])
     try:
+        # Make sure required packages are installed
+        ensure_packages()
         logging.info("Application started")
         show_gui()
     except Exception as e:
@@ -321,5 +360,5 @@ if __name__ == "__main__":
         except:
             print(f"\nERROR: {str(e)}")
             print("Please make sure all required packages are installed:")
-            print("pip install pywin32 pandas openpyxl")
+            print("pip install pywin32 pandas pyarrow openpyxl")
             input("\nPress Enter to exit...")
@@ -0,0 +1,188 @@
+import logging
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Column-wise clean-up of exported contacts.
+#
+# The scanners only collect raw names and addresses. All cleaning happens here
+# in one pass over whole columns, instead of per hit inside the scan loops:
+#   - strip quotes and "Name <addr>" / "<addr>" wrappers
+#   - lower-case addresses, drop "SMTP:" / "mailto:" prefixes and rows whose
+#     address is not an address at all (no "@" or no dotted domain)
+#   - split "First Last" and "Last, First" names
+#
+# The columns are handled as Arrow string arrays with pyarrow.compute kernels:
+# pandas' own .str.split/.str.partition/.str.extract run a Python loop per
+# row and are several times slower on 500k rows. Steps that only concern a
+# few rows (wrappers, prefixes, commas) run on just those rows and are
+# scattered back with replace_with_mask. Those rows are found with NumPy on
+# the column's UTF-8 bytes (_contains) rather than with match_substring,
+# which searches every row on its own and cost more than the steps it
+# selects rows for.
+
+# One "@" with something before it and a dotted domain after it. Local parts
+# may legally hold almost anything, including non-ASCII letters, so they are
+# not checked further.
+EMAIL_REGEX = r"^[^@\s]+@[^@\s.]+(?:\.[^@\s.]+)+$"
+EMAIL_PREFIXES = ["smtp", "mailto", "sip"]
+
+QUOTES_AND_SPACE = " \t\r\n\"'"
+
+NAME_COLUMNS = ["First Name", "Last Name"]
+# Columns that always hold text, even when pandas made them float64 because
+# every value was missing (e.g. "Role" in an export where nobody has one)
+TEXT_COLUMNS = ["Full Name", "Email", "Role", "Source"] + NAME_COLUMNS
+
+
+def _text_array(series):
+    array = pa.array(series.fillna("").astype(str), type=pa.string())
+    return array.combine_chunks() if isinstance(array, pa.ChunkedArray) else array
+
+
+# Text columns are cleaned as strings; others, such as "Confidence", pass
+# through with their own type
+def _column_array(series, column):
+    if column in TEXT_COLUMNS:
+        return _text_array(series)
+    if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+        return pa.Array.from_pandas(series)
+    return _text_array(series)
+
+
+# Rows of a string array that contain the ASCII character `char`: one
+# comparison over the bytes of the whole column, whose hits are mapped to
+# their rows through the offsets. ASCII bytes never occur inside a
+# multi-byte UTF-8 character, so there are no false hits.
+def _contains(array, char):
+    _, offsets, data = array.buffers()
+    mask = np.zeros(len(array), dtype=bool)
+    if data is None or not len(array):
+        return mask
+    offsets = np.frombuffer(offsets, dtype=np.int32)[array.offset:array.offset + len(array) + 1]
+    data = np.frombuffer(data, dtype=np.uint8)[offsets[0]:offsets[-1]]
+    positions = np.flatnonzero(data == ord(char)) + offsets[0]
+    mask[np.searchsorted(offsets, positions, side="right") - 1] = True
+    return mask
+
+
+# Lower-case a string array. ascii_lower is several times cheaper than
+# utf8_lower and gives the same result while there are no non-ASCII bytes.
+def _lower(array):
+    data = array.buffers()[2]
+    if data is None or not (np.frombuffer(data, dtype=np.uint8) >= 0x80).any():
+        return pc.ascii_lower(array)
+    return pc.utf8_lower(array)
+
+
+# Split every string at the first `sep` into (head, tail); strings without
+# `sep` give (string, ""). Heads and tails are taken straight from the
+# split's values by their offsets, which is much cheaper than list_element
+# plus list_slice/binary_join.
+def _split_once(array, sep):
+    parts = pc.split_pattern(array, sep, max_splits=1)
+    offsets = parts.offsets.to_numpy()
+    values = parts.values
+    split = pa.array(np.diff(offsets) == 2)
+    return values.take(offsets[:-1]), pc.if_else(split, values.take(offsets[1:] - 1), "")
+
+
+# Apply `func` to the rows selected by `mask` (a NumPy bool array) only
+def _update_where(array, mask, func):
+    if not mask.any():
+        return array
+    mask = pa.array(mask)
+    return pc.replace_with_mask(array, mask, func(pc.filter(array, mask)))
+
+
+def normalize_email_array(emails):
+    emails = _lower(emails)
+
+    # Keep what is inside "Name <addr>" / "<addr>" wrappers
+    def unwrap(subset):
+        return _split_once(_split_once(subset, "<")[1], ">")[0]
+    emails = _update_where(emails, _contains(emails, "<"), unwrap)
+
+    emails = pc.utf8_trim(emails, QUOTES_AND_SPACE)
+
+    # "SMTP:" / "mailto:" / "sip:" prefixes
+    def drop_prefix(subset):
+        prefix, rest = _split_once(subset, ":")
+        known = pc.is_in(prefix, value_set=pa.array(EMAIL_PREFIXES))
+        return pc.if_else(known, rest, subset)
+    return _update_where(emails, _contains(emails, ":"), drop_prefix)
+
+
+def valid_email_mask(emails):
+    return pc.match_substring_regex(emails, EMAIL_REGEX)
+
+
+# Returns (full_name, first_name, last_name) arrays
+def split_name_array(names):
+    # Drop "<addr>" from "Jane Doe <jane@example.com>" and any quotes
+    names = _update_where(names, _contains(names, "<"),
+                          lambda subset: _split_once(subset, "<")[0])
+    names = pc.utf8_trim(names, QUOTES_AND_SPACE)
+
+    # "First Last"
+    first, last = _split_once(names, " ")
+
+    # "Last, First"
+    comma = _contains(names, ",")
+    if comma.any():
+        comma = pa.array(comma)
+        comma_last, comma_first = _split_once(pc.filter(names, comma), ",")
+        first = pc.replace_with_mask(first, comma, comma_first)
+        last = pc.replace_with_mask(last, comma, comma_last)
+
+    first = pc.utf8_trim(first, QUOTES_AND_SPACE)
+    last = pc.utf8_trim(last, QUOTES_AND_SPACE)
+
+    # Names that are really an email address carry no name information
+    usable = pa.array(~_contains(names, "@"))
+    return names, pc.if_else(usable, first, ""), pc.if_else(usable, last, "")
+
+
+# Normalise a contacts DataFrame with "Full Name" and "Email" columns (plus
+# optional "First Name", "Last Name" and "Role"). First/last names that are
+# already set, e.g. from the Contacts folder, are kept. Rows without a valid
+# address are dropped, and if normalising made two rows share an address,
+# the first row with a role wins, as in the scan.
+def normalize_contacts(df):
+    columns = list(df.columns) + [c for c in NAME_COLUMNS if c not in df.columns]
+    table = {column: _column_array(df[column], column) for column in df.columns}
+    for column in NAME_COLUMNS:
+        if column not in table:
+            table[column] = pa.nulls(len(df), pa.string()).fill_null("")
+
+    emails = normalize_email_array(table["Email"])
+    full_name, first, last = split_name_array(table["Full Name"])
+    known = pc.or_(pc.not_equal(table["First Name"], ""), pc.not_equal(table["Last Name"], ""))
+
+    table["Email"] = emails
+    table["Full Name"] = full_name
+    table["First Name"] = pc.if_else(known, table["First Name"], first)
+    table["Last Name"] = pc.if_else(known, table["Last Name"], last)
+
+    # Rank rows so that the best one per address has the smallest rank:
+    # rows with a role first, then original order
+    row = np.arange(len(df), dtype=np.int64)
+    rank = row
+    if "Role" in table:
+        rank = row + np.where(pc.equal(table["Role"], "").to_numpy(zero_copy_only=False), len(df), 0)
+    table["_rank"] = pa.array(rank)
+
+    mask = valid_email_mask(emails)
+    rejected = len(df) - pc.sum(mask).as_py() if len(df) else 0
+    if rejected:
+        logging.info(f"Dropped {rejected} contacts without a usable address")
+    valid = pa.table(table).filter(mask)
+    best = valid.group_by("Email").aggregate([("_rank", "min")])
+    winners = np.sort(best.column("_rank_min").to_numpy() % max(len(df), 1))
+
+    result = pa.table(table).take(pa.array(winners)).drop_columns(["_rank"])
+    out = result.to_pandas()
+    out.index = pd.Index(df.index).take(winners)
+    return out[columns]
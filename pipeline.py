@@ -0,0 +1,219 @@
+import logging
+import queue
+import threading
+import time
+
+# A small producer/consumer pipeline built on threads and bounded queues.
+#
+# A source function produces items; each Stage has its own input queue and
+# its own number of worker threads. Because the queues are bounded, a slow
+# stage makes the stages in front of it block on put() (backpressure) instead
+# of letting memory grow without limit. Queue depths are sampled while the
+# pipeline runs so the bottleneck can be read off the metrics afterwards.
+
+DEFAULT_QUEUE_SIZE = 256
+SAMPLE_INTERVAL = 0.25  # seconds between queue depth samples
+
+_STOP = object()
+
+
+class Stage:
+    # func(item, emit) processes one item and calls emit(out) for every item
+    # it wants to pass on. setup() runs once in every worker thread before the
+    # first item (e.g. to initialise COM) and its return value is passed as
+    # the third argument to func when given; teardown(context) runs at the end.
+    def __init__(self, name, func, workers=1, queue_size=DEFAULT_QUEUE_SIZE,
+                 setup=None, teardown=None):
+        self.name = name
+        self.func = func
+        self.workers = max(1, int(workers))
+        self.queue = queue.Queue(maxsize=max(1, int(queue_size)))
+        self.setup = setup
+        self.teardown = teardown
+
+        self.lock = threading.Lock()
+        self.items_in = 0
+        self.items_out = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.depth_samples = 0
+        self.depth_total = 0
+        self.depth_max = 0
+
+    def record_depth(self):
+        depth = self.queue.qsize()
+        self.depth_samples += 1
+        self.depth_total += depth
+        if depth > self.depth_max:
+            self.depth_max = depth
+
+    def metrics(self, elapsed):
+        mean_depth = self.depth_total / self.depth_samples if self.depth_samples else 0.0
+        capacity = self.workers * elapsed if elapsed > 0 else 0.0
+        return {
+            "stage": self.name,
+            "workers": self.workers,
+            "queue_size": self.queue.maxsize,
+            "items_in": self.items_in,
+            "items_out": self.items_out,
+            "errors": self.errors,
+            "mean_depth": mean_depth,
+            "max_depth": self.depth_max,
+            "fill_ratio": mean_depth / self.queue.maxsize,
+            "utilisation": self.busy_seconds / capacity if capacity else 0.0,
+        }
+
+
+class Pipeline:
+    # errors: an optional run_log.ErrorCounter that collects items skipped by
+    # failing stages instead of logging each one
+    def __init__(self, source, stages, source_name="reader", errors=None):
+        self.source = source
+        self.stages = stages
+        self.source_name = source_name
+        self.errors = errors
+        self.elapsed = 0.0
+        self.source_items = 0
+        self.source_error = None
+        self.stage_error = None
+
+    def _put(self, index, item):
+        if index < len(self.stages):
+            self.stages[index].queue.put(item)
+
+    def _run_source(self):
+        def emit(item):
+            self.source_items += 1
+            self._put(0, item)
+
+        try:
+            self.source(emit)
+        except Exception as e:
+            self.source_error = e
+            logging.error(f"Pipeline source '{self.source_name}' failed: {e}")
+        finally:
+            if self.stages:
+                for _ in range(self.stages[0].workers):
+                    self.stages[0].queue.put(_STOP)
+
+    def _run_worker(self, index, finished):
+        stage = self.stages[index]
+
+        def emit(item):
+            with stage.lock:
+                stage.items_out += 1
+            self._put(index + 1, item)
+
+        context = None
+        try:
+            if stage.setup:
+                context = stage.setup()
+
+            while True:
+                item = stage.queue.get()
+                if item is _STOP:
+                    break
+
+                started = time.perf_counter()
+                try:
+                    if stage.setup:
+                        stage.func(item, emit, context)
+                    else:
+                        stage.func(item, emit)
+                except Exception as e:
+                    with stage.lock:
+                        stage.errors += 1
+                    if self.errors is not None:
+                        self.errors.record(f"stage '{stage.name}'", e)
+                    else:
+                        logging.warning(f"Pipeline stage '{stage.name}' skipped an item: {e}")
+                with stage.lock:
+                    stage.items_in += 1
+                    stage.busy_seconds += time.perf_counter() - started
+        except Exception as e:
+            logging.error(f"Pipeline stage '{stage.name}' worker failed: {e}")
+            if self.stage_error is None:
+                self.stage_error = e
+            # Keep draining so upstream stages never block on a dead stage,
+            # counting every item dropped that way as an error
+            while stage.queue.get() is not _STOP:
+                with stage.lock:
+                    stage.errors += 1
+                if self.errors is not None:
+                    self.errors.record(f"stage '{stage.name}'", e)
+        finally:
+            if stage.teardown:
+                try:
+                    stage.teardown(context)
+                except Exception:
+                    pass
+
+            # The last worker of a stage to finish stops the next stage
+            with stage.lock:
+                finished[index] += 1
+                last = finished[index] == stage.workers
+            if last and index + 1 < len(self.stages):
+                for _ in range(self.stages[index + 1].workers):
+                    self.stages[index + 1].queue.put(_STOP)
+
+    def run(self):
+        started = time.perf_counter()
+        finished = [0] * len(self.stages)
+        threads = []
+
+        for index, stage in enumerate(self.stages):
+            for n in range(stage.workers):
+                thread = threading.Thread(target=self._run_worker, args=(index, finished),
+                                          name=f"{stage.name}-{n}")
+                thread.daemon = True
+                thread.start()
+                threads.append(thread)
+
+        done = threading.Event()
+
+        def monitor():
+            while not done.wait(SAMPLE_INTERVAL):
+                for stage in self.stages:
+                    stage.record_depth()
+
+        monitor_thread = threading.Thread(target=monitor, name="pipeline-monitor")
+        monitor_thread.daemon = True
+        monitor_thread.start()
+
+        # The source runs on the calling thread so it can keep using any
+        # thread-bound resources (such as a COM apartment) set up by the caller
+        self._run_source()
+
+        for thread in threads:
+            thread.join()
+        done.set()
+        monitor_thread.join()
+
+        self.elapsed = time.perf_counter() - started
+        if self.source_error:
+            raise self.source_error
+        # A worker that died took its share of the items with it
+        if self.stage_error:
+            raise self.stage_error
+
+    def metrics(self):
+        return [stage.metrics(self.elapsed) for stage in self.stages]
+
+    # The stage whose input queue stays fullest is the one the rest of the
+    # pipeline is waiting on.
+    def bottleneck(self):
+        metrics = self.metrics()
+        if not metrics:
+            return None
+        return max(metrics, key=lambda m: (m["fill_ratio"], m["utilisation"]))["stage"]
+
+
+def format_metrics(metrics):
+    lines = []
+    for m in metrics:
+        lines.append(
+            f"{m['stage']}: {m['items_in']} in, {m['items_out']} out, "
+            f"{m['workers']} worker(s), queue mean {m['mean_depth']:.1f} / max {m['max_depth']} "
+            f"of {m['queue_size']}, utilisation {m['utilisation']:.0%}, errors {m['errors']}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,121 @@
+import queue
+import time
+
+from estimate import format_duration
+
+# Progress reporting between the extraction worker thread and the Tk GUI.
+#
+# Tk is not thread-safe, so the worker never touches widgets or Tk variables.
+# It posts small events to a queue instead, and the Tk main loop drains the
+# queue with after() at a fixed frame rate. Per-item progress is throttled on
+# the worker side, so the queue only ever holds a handful of events no matter
+# how fast items are processed.
+
+DEFAULT_POST_INTERVAL = 0.1  # seconds between progress events from the worker
+DEFAULT_FRAME_MS = 100       # how often the GUI drains the queue
+
+
+class ProgressChannel:
+    def __init__(self, post_interval=DEFAULT_POST_INTERVAL, scan_range=(10, 80)):
+        self.events = queue.Queue()
+        self.post_interval = post_interval
+        self.scan_range = scan_range
+
+        self.total_items = 0
+        self.items_done = 0
+        self.current_folder = ""
+        self.scan_started = None
+        self.last_post = 0.0
+
+    # ---- worker side -------------------------------------------------------
+
+    def set_status(self, text, percent=None):
+        self.events.put(("status", text, percent))
+
+    def set_total(self, total_items):
+        self.total_items = total_items
+        self.scan_started = time.perf_counter()
+        self._post_progress()
+
+    def start_folder(self, folder_name):
+        self.current_folder = folder_name
+        self._post_progress()
+
+    def advance(self, count=1):
+        self.items_done += count
+        now = time.perf_counter()
+        if now - self.last_post >= self.post_interval:
+            self._post_progress(now)
+
+    def rate(self, now=None):
+        if self.scan_started is None:
+            return 0.0
+        elapsed = (now or time.perf_counter()) - self.scan_started
+        return self.items_done / elapsed if elapsed > 0 else 0.0
+
+    def _post_progress(self, now=None):
+        now = now or time.perf_counter()
+        self.last_post = now
+        self.events.put(("progress", self.items_done, self.total_items,
+                         self.current_folder, self.rate(now)))
+
+    # Final result, shown by the GUI thread once the queue is drained.
+    # kind is "info" or "error".
+    def finish(self, kind, title, message):
+        self.events.put(("done", kind, title, message))
+
+    # ---- GUI side ----------------------------------------------------------
+
+    def scan_percent(self, done, total):
+        low, high = self.scan_range
+        if total <= 0:
+            return low
+        return int(low + (high - low) * min(done, total) / total)
+
+    # Drain the queue from the Tk main loop. Only the newest progress event
+    # of each frame is applied; status and done events are applied in order.
+    def attach(self, widget, progress_var, status_var, on_done, frame_ms=DEFAULT_FRAME_MS):
+        def drain():
+            latest_progress = None
+            done_event = None
+            try:
+                while True:
+                    event = self.events.get_nowait()
+                    if event[0] == "progress":
+                        latest_progress = event
+                    elif event[0] == "status":
+                        _, text, percent = event
+                        # A newer status supersedes any queued progress
+                        latest_progress = None
+                        status_var.set(text)
+                        if percent is not None:
+                            progress_var.set(percent)
+                    elif event[0] == "done":
+                        done_event = event
+                        break
+            except queue.Empty:
+                pass
+
+            if latest_progress is not None:
+                _, done, total, folder, rate = latest_progress
+                progress_var.set(self.scan_percent(done, total))
+                status_var.set(format_progress(done, total, folder, rate))
+
+            if done_event is not None:
+                _, kind, title, message = done_event
+                on_done(kind, title, message)
+                return
+
+            widget.after(frame_ms, drain)
+
+        widget.after(frame_ms, drain)
+
+
+def format_progress(done, total, folder, rate):
+    text = f"Scanning {folder}... {done:,}/{total:,} items" if folder else f"{done:,}/{total:,} items"
+    if rate > 0:
+        text += f" ({rate:.0f}/s"
+        if total > done:
+            text += f", ETA {format_duration((total - done) / rate)}"
+        text += ")"
+    return text
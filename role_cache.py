@@ -0,0 +1,128 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Roles found in email signatures, kept between runs.
+#
+# Extracting a role means running a dozen regular expressions over the end of
+# every email body. A sender's signature rarely changes, so the result is
+# stored under the sender's address plus a fingerprint of the normalised
+# signature block. As long as the signature stays the same, later runs take
+# the role from here without any regex work; a changed signature (a new job
+# title, a new company) has a new fingerprint and is analysed again. Empty
+# results are cached too, since they are just as expensive to find.
+#
+# Keys are hashes, so the file holds no addresses. The cache keeps at most
+# MAX_ENTRIES entries, evicting the least recently used, and drops entries not
+# used for MAX_AGE_DAYS.
+
+ROLE_CACHE_FILE_NAME = "role_cache.json"
+DEFAULT_ROLE_CACHE_PATH = os.path.join(os.path.expanduser("~"), "AppData", "Local", "OutlookContactExporter",
+                                       ROLE_CACHE_FILE_NAME)
+
+MAX_ENTRIES = 50000
+MAX_AGE_DAYS = 180
+FORMAT_VERSION = 1
+
+
+# Hash of the signature block as the role patterns see it, with the name they
+# look for. Whitespace differences (wrapping, trailing blanks) do not count.
+def signature_fingerprint(sender_name, signature_area):
+    normalized = re.sub(r"\s+", " ", signature_area).strip()
+    text = f"{sender_name or ''}\n{normalized}"
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()[:16]
+
+
+def _key(email_address, fingerprint):
+    return hashlib.sha1(f"{email_address.lower()}|{fingerprint}".encode("utf-8")).hexdigest()[:20]
+
+
+def _today():
+    return int(time.time() // 86400)
+
+
+class RoleCache:
+    def __init__(self, path=None, max_entries=MAX_ENTRIES, max_age_days=MAX_AGE_DAYS):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_age_days = max_age_days
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # key -> [role, day last used], least recently used first
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return self
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != FORMAT_VERSION:
+                raise ValueError(f"unsupported version {data.get('version')}")
+            oldest = _today() - self.max_age_days
+            entries = sorted(data.get("entries", {}).items(), key=lambda kv: kv[1][1])
+            self.entries = OrderedDict((key, value) for key, value in entries if value[1] >= oldest)
+            expired = len(entries) - len(self.entries)
+            if expired:
+                self.dirty = True
+            self._evict()
+            logging.info(f"Loaded {len(self.entries)} cached signature roles ({expired} expired)")
+        except Exception as e:
+            logging.warning(f"Could not load role cache from {self.path}: {e}")
+        return self
+
+    def save(self):
+        if not self.path or not self.dirty:
+            return
+        with self.lock:
+            data = {"version": FORMAT_VERSION, "entries": dict(self.entries)}
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, separators=(",", ":"))
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        except Exception as e:
+            logging.warning(f"Could not save role cache to {self.path}: {e}")
+
+    # The cached role (possibly "") or None when this signature is new
+    def get(self, email_address, fingerprint):
+        key = _key(email_address, fingerprint)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            today = _today()
+            if entry[1] != today:
+                entry[1] = today
+                self.dirty = True
+            return entry[0]
+
+    def put(self, email_address, fingerprint, role):
+        key = _key(email_address, fingerprint)
+        with self.lock:
+            self.entries[key] = [role, _today()]
+            self.entries.move_to_end(key)
+            self.dirty = True
+            self._evict()
+
+    # Caller holds the lock (or is loading)
+    def _evict(self):
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+            self.dirty = True
@@ -0,0 +1,107 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+
+# Logging for the scans.
+#
+# Log records are put on an in-memory queue by a QueueHandler and written to
+# the log file by a QueueListener thread, so a scan never waits for the disk.
+# Per-item failures go through an ErrorCounter instead of one log line each:
+# a broken mailbox can fail on tens of thousands of items with the same error,
+# and the log only needs to say which error, where, and how often.
+
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+FIRST_ERRORS_LOGGED = 3    # occurrences of each error logged in full
+REPORT_INTERVAL = 30.0     # seconds between running totals of one error
+
+_listener = None
+_queue_handler = None
+
+
+# Route all logging through a queue to `log_file`. Safe to call more than once.
+def setup_logging(log_file, level=logging.INFO):
+    global _listener, _queue_handler
+    if _listener is not None:
+        return _listener
+
+    file_handler = logging.FileHandler(log_file, encoding="utf-8")
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    log_queue = queue.Queue(-1)
+    root = logging.getLogger()
+    _queue_handler = logging.handlers.QueueHandler(log_queue)
+    root.addHandler(_queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(log_queue, file_handler, respect_handler_level=True)
+    _listener.start()
+    # Write out whatever is still queued when the program exits
+    atexit.register(stop_logging)
+    return _listener
+
+
+# Flush the queue to the log file and stop the listener thread
+def stop_logging():
+    global _listener, _queue_handler
+    if _listener is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _listener.stop()
+        _listener = None
+        _queue_handler = None
+
+
+# Counts per-item errors by exception type and place (usually the folder).
+# The first few of each kind are logged with their message; after that only
+# a running total, at most once per REPORT_INTERVAL. log_summary() writes
+# the totals for the whole run.
+class ErrorCounter:
+    def __init__(self, first_logged=FIRST_ERRORS_LOGGED, report_interval=REPORT_INTERVAL):
+        self.first_logged = first_logged
+        self.report_interval = report_interval
+        self.lock = threading.Lock()
+        self.counts = {}
+        self.examples = {}
+        self.last_report = {}
+
+    def record(self, where, error):
+        key = (type(error).__name__, where)
+        message = str(error)[:200]
+        now = time.monotonic()
+
+        with self.lock:
+            count = self.counts.get(key, 0) + 1
+            self.counts[key] = count
+            if count == 1:
+                self.examples[key] = message
+
+            if count <= self.first_logged:
+                self.last_report[key] = now
+                report = f"{key[0]} in {where}: {message}"
+            elif now - self.last_report[key] >= self.report_interval:
+                self.last_report[key] = now
+                report = f"{key[0]} in {where}: {count} so far (latest: {message})"
+            else:
+                return
+
+        logging.warning(report)
+
+    def total(self):
+        return sum(self.counts.values())
+
+    def summary(self):
+        with self.lock:
+            items = sorted(self.counts.items(), key=lambda kv: -kv[1])
+            return [{"error": error, "where": where, "count": count, "example": self.examples[(error, where)]}
+                    for (error, where), count in items]
+
+    def log_summary(self, title="Scan"):
+        summary = self.summary()
+        if not summary:
+            logging.info(f"{title}: no item errors")
+            return
+        lines = [f"{s['count']:>8}  {s['error']} in {s['where']} (e.g. {s['example']})" for s in summary]
+        logging.warning(f"{title}: {self.total()} item errors\n" + "\n".join(lines))
@@ -0,0 +1,188 @@
+import collections
+import logging
+import marshal
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+# Profiling of one export run.
+#
+# Nothing here is imported unless profiling was asked for (--profile, or a
+# Ctrl+Shift click on the ribbon button), so normal runs pay nothing.
+#
+# Two modes:
+#   sampling       a background thread records the stack of every thread
+#                  every SAMPLE_INTERVAL seconds. Low overhead, and it sees
+#                  the pipeline's worker threads as well as the caller.
+#   deterministic  cProfile on the calling thread and every thread started
+#                  during the run (Python 3.11 and older; on 3.12+ cProfile
+#                  can only follow one thread), with exact call counts. The
+#                  sampler runs alongside it for the stacks.
+#
+# Each run writes two files next to the export: <name>.pstats, readable with
+# pstats, snakeviz and similar, and <name>.collapsed.txt with one
+# "thread;frame;frame;... count" line per distinct stack, the input format of
+# flamegraph.pl, speedscope and inferno. The sampling mode builds the pstats
+# file from its samples: times are samples times the interval, and call
+# counts are the number of samples a function appeared in.
+
+PROFILE_MODES = ("sampling", "deterministic")
+SAMPLE_INTERVAL = 0.005   # seconds between stack samples
+
+
+# Stage threads are named "resolver-0", "resolver-1", ...; one flame graph
+# root per stage reads better than one per thread
+def _thread_label(name):
+    return re.sub(r"[-_]\d+$", "", name or "thread").replace(";", ":")
+
+
+class StackSampler:
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = collections.Counter()   # (thread label, ((file, line, function), ...)) -> samples
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            if frames.keys() - names.keys():
+                names = {thread.ident: _thread_label(thread.name) for thread in threading.enumerate()}
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append((code.co_filename, code.co_firstlineno, code.co_name))
+                    frame = frame.f_back
+                stack.reverse()
+                self.stacks[(names.get(ident, "thread"), tuple(stack))] += 1
+            self.samples += 1
+
+    def collapsed_lines(self):
+        lines = []
+        for (thread, stack), count in self.stacks.most_common():
+            frames = [thread] + [f"{function} ({os.path.basename(filename)}:{line})".replace(";", ":")
+                                 for filename, line, function in stack]
+            lines.append(f"{';'.join(frames)} {count}\n")
+        return lines
+
+    # The samples as a pstats dictionary: {function: (cc, nc, tt, ct, callers)}
+    def pstats_dict(self):
+        self_samples = collections.Counter()
+        total_samples = collections.Counter()
+        edges = collections.defaultdict(collections.Counter)   # callee -> caller -> samples
+        for (_, stack), count in self.stacks.items():
+            if not stack:
+                continue
+            self_samples[stack[-1]] += count
+            for function in set(stack):
+                total_samples[function] += count
+            for caller, callee in set(zip(stack, stack[1:])):
+                edges[callee][caller] += count
+
+        stats = {}
+        for function, total in total_samples.items():
+            callers = {caller: (count, count, 0.0, count * self.interval)
+                       for caller, count in edges[function].items()}
+            stats[function] = (total, total, self_samples[function] * self.interval, total * self.interval, callers)
+        return stats
+
+
+class RunProfiler:
+    def __init__(self, mode=PROFILE_MODES[0], interval=SAMPLE_INTERVAL):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"mode must be one of {PROFILE_MODES}")
+        self.mode = mode
+        self.sampler = StackSampler(interval)
+        self.profile = None
+        self.thread_profiles = []
+        self.lock = threading.Lock()
+        self.seconds = 0.0
+
+    # Installed with threading.setprofile: the first event of every new
+    # thread starts a profiler for that thread
+    def _start_thread_profile(self, frame, event, arg):
+        import cProfile
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+        with self.lock:
+            self.thread_profiles.append(profile)
+        profile.enable()
+
+    def start(self):
+        self.seconds = time.perf_counter()
+        self.sampler.start()
+        if self.mode == "deterministic":
+            import cProfile
+            if sys.version_info < (3, 12):
+                threading.setprofile(self._start_thread_profile)
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def stop(self):
+        if self.profile is not None:
+            self.profile.disable()
+            threading.setprofile(None)
+        self.sampler.stop()
+        self.seconds = time.perf_counter() - self.seconds
+
+    # Write <prefix>.pstats and <prefix>.collapsed.txt; returns both paths
+    def save(self, prefix):
+        pstats_path = prefix + ".pstats"
+        collapsed_path = prefix + ".collapsed.txt"
+        if self.profile is not None:
+            import pstats
+            stats = pstats.Stats(self.profile)
+            for profile in self.thread_profiles:
+                profile.disable()
+                stats.add(profile)
+            stats.dump_stats(pstats_path)
+        else:
+            with open(pstats_path, "wb") as f:
+                marshal.dump(self.sampler.pstats_dict(), f)
+        with open(collapsed_path, "w", encoding="utf-8") as f:
+            f.writelines(self.sampler.collapsed_lines())
+        return pstats_path, collapsed_path
+
+
+# Where the profile of a run called `label` goes: the Desktop, like the
+# export, or the temp directory when the Desktop cannot be written
+def profile_prefix(label):
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    desktop_path = os.path.join(os.path.expanduser("~"), "Desktop")
+    directory = desktop_path if os.access(desktop_path, os.W_OK) else tempfile.gettempdir()
+    return os.path.join(directory, f"{label}_profile_{timestamp}")
+
+
+# Run func(*args) under the profiler and save the profile, even when it fails
+def profiled(label, func, *args, mode=PROFILE_MODES[0]):
+    profiler = RunProfiler(mode)
+    profiler.start()
+    try:
+        return func(*args)
+    finally:
+        profiler.stop()
+        try:
+            pstats_path, collapsed_path = profiler.save(profile_prefix(label))
+            logging.info(f"Profile ({mode}, {profiler.seconds:.1f}s, {profiler.sampler.samples} samples) "
+                         f"written to {pstats_path} and {collapsed_path}")
+        except Exception as e:
+            logging.error(f"Could not write the profile: {e}")
@@ -0,0 +1,162 @@
+import threading
+import time
+
+from estimate import extrapolate_unique
+
+# Early stop for long mailboxes.
+#
+# New contacts get rare deep into a mailbox's history. With the folders read
+# newest first, the reader counts how many addresses it has not seen before
+# turn up in each window of SATURATION_WINDOW items of a folder. Once that
+# falls below the threshold (new addresses per 1000 items), the folder is
+# saturated: the rest of it is either skipped or only every SAMPLE_STEP-th
+# item is read. A time budget stops the scan of all folders the same way.
+#
+# The distinct addresses found after each window are extrapolated to all
+# items with Heaps' law (estimate.extrapolate_unique), which gives the
+# estimated share of the mailbox's contacts that the scan found.
+#
+# A StopToken lets another thread (the progress window, Ctrl+C) stop the scan
+# the same way. A scan stopped by the time budget or a token is partial: the
+# contacts found so far are still written, marked as such.
+
+SATURATION_WINDOW = 1000   # items per measurement of the discovery rate
+SAMPLE_STEP = 10           # read every n-th item of a saturated folder in "sample" mode
+AFTER_SATURATION = ("stop", "sample")
+
+READ, SKIP, STOP_FOLDER, STOP_SCAN = "read", "skip", "stop folder", "stop scan"
+
+
+# Cooperative cancellation: cancel() from any thread, the scan checks
+# `cancelled` between items
+class StopToken:
+    def __init__(self):
+        self.event = threading.Event()
+        self.reason = None
+
+    def cancel(self, reason="cancelled"):
+        if not self.event.is_set():
+            self.reason = reason
+            self.event.set()
+
+    @property
+    def cancelled(self):
+        return self.event.is_set()
+
+
+class ScanCoverage:
+    def __init__(self, total_items=0, threshold=None, after_saturation="stop", time_budget=None,
+                 window=SATURATION_WINDOW, sample_step=SAMPLE_STEP, stop_token=None):
+        if after_saturation not in AFTER_SATURATION:
+            raise ValueError(f"after_saturation must be one of {AFTER_SATURATION}")
+        self.total_items = total_items
+        self.threshold = threshold
+        self.after_saturation = after_saturation
+        self.deadline = time.perf_counter() + time_budget if time_budget else None
+        self.stop_token = stop_token
+        self.window = window
+        self.sample_step = sample_step
+
+        self.seen = set()
+        self.checkpoints = []      # (items read, distinct addresses)
+        self.items_read = 0
+        self.items_skipped = 0
+        self.saturated = {}        # folder -> items of it read when it saturated
+        self.out_of_time = False
+        self.cancelled = False
+
+        self.folder = None
+        self.folder_position = 0
+        self.window_items = 0
+        self.window_new = 0
+
+    def start_folder(self, folder_name):
+        self.folder = folder_name
+        self.folder_position = 0
+        self.window_items = 0
+        self.window_new = 0
+
+    # What to do with the next item of the current folder: READ it, SKIP it
+    # (sampling a saturated folder), STOP_FOLDER or STOP_SCAN (out of time
+    # or cancelled)
+    def next_action(self):
+        if self.should_stop():
+            return STOP_SCAN
+        position = self.folder_position
+        self.folder_position += 1
+        if self.folder in self.saturated:
+            if self.after_saturation == "stop":
+                return STOP_FOLDER
+            if position % self.sample_step:
+                self.items_skipped += 1
+                return SKIP
+        return READ
+
+    # Count the addresses of one message that was read
+    def observe(self, message):
+        self.items_read += 1
+        self.window_items += 1
+        for entry in [message.get("sender")] + message.get("recipients", []):
+            if entry:
+                key = (entry.get("email") or entry.get("name") or "").lower()
+                if key and key not in self.seen:
+                    self.seen.add(key)
+                    self.window_new += 1
+
+        if self.window_items >= self.window:
+            self.checkpoints.append((self.items_read, len(self.seen)))
+            rate = self.window_new * 1000.0 / self.window_items
+            if self.threshold is not None and rate < self.threshold and self.folder not in self.saturated:
+                self.saturated[self.folder] = self.folder_position
+            self.window_items = 0
+            self.window_new = 0
+
+    # True once the time budget is used up or the stop token was cancelled
+    def should_stop(self):
+        if self.stop_token is not None and self.stop_token.cancelled:
+            self.cancelled = True
+        elif self.deadline is not None and time.perf_counter() >= self.deadline:
+            self.out_of_time = True
+        return self.out_of_time or self.cancelled
+
+    @property
+    def stopped_early(self):
+        return bool(self.saturated) or self.partial
+
+    # Stopped before reading everything it meant to
+    @property
+    def partial(self):
+        return self.out_of_time or self.cancelled
+
+    def report(self):
+        found = len(self.seen)
+        checkpoints = self.checkpoints + [(self.items_read, found)]
+        if self.stopped_early and self.total_items > self.items_read:
+            estimated = max(found, extrapolate_unique(checkpoints, self.total_items))
+        else:
+            estimated = found
+        return {
+            "items_total": self.total_items,
+            "items_read": self.items_read,
+            "items_skipped": self.items_skipped,
+            "item_coverage": self.items_read / self.total_items if self.total_items else 1.0,
+            "addresses_found": found,
+            "addresses_estimated": estimated,
+            "contact_coverage": found / estimated if estimated else 1.0,
+            "saturated_folders": dict(self.saturated),
+            "out_of_time": self.out_of_time,
+            "cancelled": self.stop_token.reason if self.cancelled else None,
+            "partial": self.partial,
+        }
+
+
+def format_coverage(report):
+    text = (f"read {report['items_read']:,} of {report['items_total']:,} emails "
+            f"({report['item_coverage']:.0%}), found {report['addresses_found']:,} of an estimated "
+            f"{report['addresses_estimated']:,} addresses ({report['contact_coverage']:.0%})")
+    reasons = [f"{folder} saturated after {count:,} emails" for folder, count in report["saturated_folders"].items()]
+    if report["out_of_time"]:
+        reasons.append("time budget used up")
+    if report.get("cancelled"):
+        reasons.append(f"stopped ({report['cancelled']})")
+    return text + (f"; {', '.join(reasons)}" if reasons else "")
@@ -0,0 +1,124 @@
+import gc
+import logging
+import os
+import sys
+import time
+
+# Memory-bounded scanning of large folders.
+#
+# `for item in folder.Items` keeps the collection's enumerator alive for the
+# whole folder, and every item, Recipients collection and AddressEntry read
+# through it holds a COM wrapper until Python gets round to freeing it. On
+# folders with hundreds of thousands of items both Outlook and this process
+# grow until Outlook fails with "out of memory or system resources".
+#
+# iter_items() walks a folder with Items.GetFirst/GetNext and lets go of each
+# item before fetching the next. MemoryMonitor samples the resident set size
+# every SAMPLE_INTERVAL items, runs the garbage collector so COM wrappers
+# caught in reference cycles are released in bounded batches, records
+# start/peak/end memory per folder, and calls `on_ceiling` whenever memory is
+# above the configured ceiling so the scan can spill what it holds.
+
+SAMPLE_INTERVAL = 1000   # items between memory samples (and garbage collections)
+
+
+# Resident set size of this process in bytes, or None when unknown
+def current_rss():
+    try:
+        if sys.platform == "win32":
+            import ctypes
+            from ctypes import wintypes
+
+            class ProcessMemoryCounters(ctypes.Structure):
+                _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                            ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                            ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+            counters = ProcessMemoryCounters()
+            counters.cb = ctypes.sizeof(counters)
+            process = ctypes.windll.kernel32.GetCurrentProcess()
+            if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+                return counters.WorkingSetSize
+            return None
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        return None
+
+
+# Items of a collection one at a time through GetFirst/GetNext, without an
+# enumerator; collections without them (e.g. in tests) are iterated normally
+def iter_items(items):
+    if not hasattr(items, "GetFirst"):
+        yield from items
+        return
+    item = items.GetFirst()
+    while item is not None:
+        yield item
+        # Drop our reference before asking for the next one
+        item = None
+        item = items.GetNext()
+
+
+def _mb(value):
+    return round(value / (1024 * 1024), 1) if value is not None else None
+
+
+class MemoryMonitor:
+    def __init__(self, ceiling_mb=None, sample_interval=SAMPLE_INTERVAL, on_ceiling=None):
+        self.ceiling = ceiling_mb * 1024 * 1024 if ceiling_mb else None
+        self.sample_interval = sample_interval
+        self.on_ceiling = on_ceiling
+        self.folders = {}
+        self.folder = None
+        self.count = 0
+        self.spills = 0
+
+    def start_folder(self, folder_name):
+        self.folder = folder_name
+        self.count = 0
+        rss = current_rss()
+        self.folders[folder_name] = {"items": 0, "rss_start_mb": _mb(rss), "rss_peak_mb": _mb(rss),
+                                     "rss_end_mb": None, "spills": 0, "seconds": time.perf_counter()}
+
+    # Call once per item of the current folder
+    def tick(self):
+        self.count += 1
+        if self.count % self.sample_interval == 0:
+            self.sample()
+
+    def sample(self):
+        gc.collect()
+        rss = current_rss()
+        folder = self.folders.get(self.folder)
+        if folder is None or rss is None:
+            return rss
+        folder["items"] = self.count
+        folder["rss_peak_mb"] = max(folder["rss_peak_mb"] or 0, _mb(rss))
+        if self.ceiling and rss > self.ceiling:
+            self.spills += 1
+            folder["spills"] += 1
+            logging.warning(f"Memory {_mb(rss)}MB is above the {_mb(self.ceiling)}MB ceiling "
+                            f"in {self.folder} after {self.count} items, spilling")
+            if self.on_ceiling:
+                self.on_ceiling()
+            gc.collect()
+        return rss
+
+    def end_folder(self):
+        folder = self.folders.get(self.folder)
+        if folder is None:
+            return
+        # The last tick may just have taken a sample
+        rss = self.sample() if self.count % self.sample_interval else current_rss()
+        folder["items"] = self.count
+        folder["rss_end_mb"] = _mb(rss)
+        folder["seconds"] = round(time.perf_counter() - folder["seconds"], 1)
+        logging.info(f"Memory in {self.folder}: {folder['items']} items, {folder['rss_start_mb']}MB at start, "
+                     f"{folder['rss_peak_mb']}MB peak, {folder['rss_end_mb']}MB at end, {folder['spills']} spills")
+
+    def report(self):
+        return dict(self.folders)
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from extraction import save_contacts
+
+# Exports too large for one workbook.
+#
+# An .xlsx sheet holds at most 1,048,576 rows, and openpyxl needs minutes for
+# a few hundred thousand. A large export is therefore split into shards,
+# either by a stable hash of each contact's email domain (all contacts of a
+# company land in the same file) or by row count (files keep the name
+# order), or both: domain shards larger than the row limit are split again.
+# The shards are written at the same time by a pool of worker processes, since
+# writing a workbook is pure Python and would not run in parallel on threads.
+# All files go into one folder together with manifest.json, which lists every
+# shard with its row count, size and SHA-256 checksum, so a downstream import
+# can check that it has everything.
+
+EXCEL_MAX_ROWS = 1048575   # data rows below the header row
+DEFAULT_SHARD_WORKERS = 4
+MANIFEST_FILE_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def _domain_shard(domain, shards):
+    # Not hash(): string hashes differ between processes and runs
+    digest = hashlib.blake2b(domain.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % shards
+
+
+# Split `result_df` into a list of (shard key, DataFrame). `shards` domain
+# hash buckets and/or at most `shard_rows` rows per piece; rows keep their
+# order within each piece
+def split_contacts(result_df, shards=None, shard_rows=None):
+    shard_rows = min(shard_rows or EXCEL_MAX_ROWS, EXCEL_MAX_ROWS)
+    if shards and shards > 1:
+        domains = result_df["Email"].astype(str).str.lower().str.rpartition("@")[2]
+        buckets = {domain: _domain_shard(domain, shards) for domain in domains.unique()}
+        keys = domains.map(buckets)
+        groups = [(f"d{key:03d}", group) for key, group in result_df.groupby(keys.values, sort=True)]
+    else:
+        groups = [("", result_df)]
+
+    pieces = []
+    for key, group in groups:
+        if len(group) <= shard_rows:
+            pieces.append((key, group))
+            continue
+        for start in range(0, len(group), shard_rows):
+            part = f"r{start // shard_rows + 1:03d}"
+            pieces.append((f"{key}-{part}" if key else part, group.iloc[start:start + shard_rows]))
+    return pieces
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Runs in a worker process: write one shard and describe it for the manifest
+def write_shard(shard_df, file_path):
+    shard_df.to_excel(file_path, index=False)
+    return {"file": os.path.basename(file_path), "rows": len(shard_df),
+            "bytes": os.path.getsize(file_path), "sha256": file_checksum(file_path)}
+
+
+def _output_dir(file_prefix, timestamp):
+    for parent in (os.path.join(os.path.expanduser("~"), "Desktop"), tempfile.gettempdir()):
+        output_dir = os.path.join(parent, f"{file_prefix}_{timestamp}")
+        try:
+            os.makedirs(output_dir, exist_ok=True)
+            return output_dir
+        except OSError:
+            continue
+    raise OSError(f"Could not create an output folder for {file_prefix}")
+
+
+# Write the shards of `result_df` and their manifest. Returns the manifest path.
+def write_shards(result_df, file_prefix="outlook_contacts", shards=None, shard_rows=None,
+                 workers=DEFAULT_SHARD_WORKERS, output_dir=None):
+    if output_dir is None:
+        output_dir = _output_dir(file_prefix, datetime.now().strftime("%Y%m%d_%H%M%S"))
+    pieces = split_contacts(result_df, shards, shard_rows)
+    paths = [os.path.join(output_dir, f"{file_prefix}_{key or 'all'}.xlsx") for key, _ in pieces]
+
+    workers = max(1, min(workers or 1, len(pieces), os.cpu_count() or 1))
+    if workers == 1:
+        entries = [write_shard(piece, path) for (_, piece), path in zip(pieces, paths)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(write_shard, piece, path) for (_, piece), path in zip(pieces, paths)]
+            entries = [future.result() for future in futures]
+    for (key, _), entry in zip(pieces, entries):
+        entry["shard"] = key
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "sharding": {"domain_shards": shards or None, "shard_rows": shard_rows or None},
+        "columns": [str(column) for column in result_df.columns],
+        "total_rows": len(result_df),
+        "shards": entries,
+    }
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE_NAME)
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+    logging.info(f"Wrote {len(result_df)} contacts as {len(entries)} shards with {workers} writer processes "
+                 f"to {output_dir}")
+    return manifest_path
+
+
+# Check every shard listed in a manifest against its row count and checksum.
+# Returns a list of problems, empty when the export is complete.
+def verify_manifest(manifest_path):
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    output_dir = os.path.dirname(manifest_path)
+    problems = []
+    for entry in manifest["shards"]:
+        path = os.path.join(output_dir, entry["file"])
+        if not os.path.exists(path):
+            problems.append(f"{entry['file']}: missing")
+        elif file_checksum(path) != entry["sha256"]:
+            problems.append(f"{entry['file']}: checksum mismatch")
+    if sum(entry["rows"] for entry in manifest["shards"]) != manifest["total_rows"]:
+        problems.append("shard row counts do not add up to the total")
+    return problems
+
+
+def wants_shards(options, rows):
+    return bool(getattr(options, "shards", None) or getattr(options, "shard_rows", None)) or rows > EXCEL_MAX_ROWS
+
+
+# Save an export as one workbook, or as shards plus a manifest when the
+# options ask for it or the export does not fit in one sheet. Returns the
+# workbook or manifest path.
+def export_contacts(result_df, options=None, file_prefix="outlook_contacts"):
+    if not wants_shards(options, len(result_df)):
+        return save_contacts(result_df, file_prefix)
+    return write_shards(result_df, file_prefix, shards=getattr(options, "shards", None),
+                        shard_rows=getattr(options, "shard_rows", None),
+                        workers=getattr(options, "shard_workers", None) or DEFAULT_SHARD_WORKERS)
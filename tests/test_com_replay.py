@@ -0,0 +1,38 @@
+import unittest
+import unicodedata
+
+from com_replay import Sanitizer
+
+NAMES = [
+    "Иван Петров <ivan.petrov@пример.рф>",
+    "王伟 <wang.wei@example.cn>",
+    "Jörg Müller",
+    "José García, Directora de Ventas",
+    "Ελένη Παπαδοπούλου",
+    "محمد الأحمد",
+    "Ngô Bảo Châu",
+    "Ærøskøbing ØST",
+]
+
+
+class SanitizerTest(unittest.TestCase):
+    def test_no_non_ascii_letter_survives(self):
+        sanitizer = Sanitizer(salt=b"0" * 16)
+        for name in NAMES:
+            sanitized = sanitizer.text(name)
+            leaked = [c for c in sanitized if ord(c) > 127 and unicodedata.category(c).startswith("L")]
+            self.assertEqual(leaked, [], f"{name!r} -> {sanitized!r}")
+
+    def test_words_keep_length_case_and_punctuation(self):
+        sanitizer = Sanitizer(salt=b"0" * 16)
+        sanitized = sanitizer.text("Jörg Müller <jorg.muller@firma.de>")
+        self.assertRegex(sanitized, r"^[A-Z][a-z]{3} [A-Z][a-z]{5} <[a-z]{4}\.[a-z]{6}@[a-z]{5}\.[a-z]{2}>$")
+        self.assertEqual(sanitizer.text("ΑΘΗΝΑ").upper(), sanitizer.text("ΑΘΗΝΑ"))
+
+    def test_same_word_maps_the_same_way(self):
+        sanitizer = Sanitizer(salt=b"0" * 16)
+        self.assertEqual(sanitizer.text("Иван"), sanitizer.text("Иван Петров").split()[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
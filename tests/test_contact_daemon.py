@@ -0,0 +1,95 @@
+import json
+import os
+import tempfile
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+
+from contact_daemon import ContactService, FileBackend, serve
+
+RECORDS = [
+    {"Full Name": "Jane Doe", "Email": "Jane.Doe@Contoso.com", "Role": "Engineer"},
+    {"Full Name": "Doe, John", "Email": "SMTP:john.doe@contoso.com", "Role": ""},
+    {"Full Name": "Ann Lee", "Email": "ann.lee@fabrikam.com", "Role": ""},
+    {"Full Name": "nobody", "Email": "not an address", "Role": ""},
+]
+
+
+class ContactDaemonTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(cls.directory.name, "contacts.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(RECORDS, f)
+
+        cls.service = ContactService(FileBackend(path), refresh_interval=3600)
+        cls.server = serve(cls.service, port=0)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base = f"http://127.0.0.1:{cls.server.server_address[1]}"
+
+        deadline = time.monotonic() + 30
+        while cls.service.last_refresh is None and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.service.stop()
+        cls.directory.cleanup()
+
+    def get(self, path):
+        try:
+            with urllib.request.urlopen(self.base + path, timeout=30) as response:
+                return response.status, json.load(response)
+        except urllib.error.HTTPError as e:
+            return e.code, json.load(e)
+
+    def test_health(self):
+        status, body = self.get("/health")
+        self.assertEqual(status, 200)
+        self.assertEqual(body["status"], "ok")
+        self.assertEqual(body["contacts"], 3)
+
+    def test_search(self):
+        status, body = self.get("/search?q=doe&domain=contoso.com")
+        self.assertEqual(status, 200)
+        self.assertEqual(sorted(c["Email"] for c in body["contacts"]),
+                         ["jane.doe@contoso.com", "john.doe@contoso.com"])
+
+        status, body = self.get("/search?q=ann&limit=1")
+        self.assertEqual([c["Email"] for c in body["contacts"]], ["ann.lee@fabrikam.com"])
+
+    def test_contacts(self):
+        status, body = self.get("/contacts?domain=fabrikam.com")
+        self.assertEqual(status, 200)
+        self.assertEqual(body["count"], 1)
+        self.assertEqual(body["contacts"][0]["First Name"], "Ann")
+
+        status, body = self.get("/contacts?limit=2")
+        self.assertEqual(body["count"], 2)
+
+    def test_export_json(self):
+        status, body = self.get("/export?format=json")
+        self.assertEqual(status, 200)
+        self.assertEqual(len(body["contacts"]), 3)
+        john = [c for c in body["contacts"] if c["Email"] == "john.doe@contoso.com"][0]
+        self.assertEqual((john["First Name"], john["Last Name"]), ("John", "Doe"))
+
+    def test_bad_parameters(self):
+        for path in ("/search?q=a&limit=abc", "/contacts?limit=0", "/export?format=pdf"):
+            status, body = self.get(path)
+            self.assertEqual(status, 400, path)
+            self.assertIn("error", body)
+
+    def test_unknown_path(self):
+        status, _ = self.get("/nothing")
+        self.assertEqual(status, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
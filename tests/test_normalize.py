@@ -0,0 +1,29 @@
+import unittest
+
+import pandas as pd
+
+from normalize import normalize_contacts
+
+
+class NormalizeContactsTest(unittest.TestCase):
+    def test_role_column_without_any_role(self):
+        df = pd.DataFrame([{"Full Name": "Jane Doe", "Email": "Jane.Doe@Example.com", "Role": float("nan")}])
+        out = normalize_contacts(df)
+        self.assertEqual(out["Email"].tolist(), ["jane.doe@example.com"])
+        self.assertEqual(out["Role"].tolist(), [""])
+        self.assertEqual((out["First Name"].iloc[0], out["Last Name"].iloc[0]), ("Jane", "Doe"))
+
+    def test_first_row_with_a_role_wins(self):
+        df = pd.DataFrame([
+            {"Full Name": "Doe, Jane", "Email": "SMTP:JANE@example.com", "Role": ""},
+            {"Full Name": "Jane Doe <jane@example.com>", "Email": "<jane@example.com>", "Role": "Engineer"},
+            {"Full Name": "nobody", "Email": "not an address", "Role": ""},
+        ])
+        out = normalize_contacts(df)
+        self.assertEqual(out.index.tolist(), [1])
+        self.assertEqual(out["Role"].tolist(), ["Engineer"])
+        self.assertEqual(out["Full Name"].tolist(), ["Jane Doe"])
+
+
+if __name__ == "__main__":
+    unittest.main()
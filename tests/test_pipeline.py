@@ -0,0 +1,40 @@
+import threading
+import unittest
+
+from pipeline import Pipeline, Stage
+from run_log import ErrorCounter
+
+
+class PipelineTest(unittest.TestCase):
+    def test_items_reach_the_last_stage(self):
+        out = []
+        pipeline = Pipeline(lambda emit: [emit(i) for i in range(100)],
+                            [Stage("double", lambda item, emit: emit(item * 2), workers=3),
+                             Stage("collect", lambda item, emit: out.append(item))])
+        pipeline.run()
+        self.assertEqual(sorted(out), [i * 2 for i in range(100)])
+
+    def test_failed_setup_counts_dropped_items_and_raises(self):
+        calls = []
+        lock = threading.Lock()
+
+        def setup():
+            with lock:
+                calls.append(1)
+                if len(calls) == 1:
+                    raise RuntimeError("connect failed")
+
+        out = []
+        errors = ErrorCounter()
+        resolver = Stage("resolver", lambda item, emit, context: emit(item), workers=2, setup=setup)
+        pipeline = Pipeline(lambda emit: [emit(i) for i in range(500)],
+                            [resolver, Stage("collect", lambda item, emit: out.append(item))], errors=errors)
+
+        with self.assertRaisesRegex(RuntimeError, "connect failed"):
+            pipeline.run()
+        self.assertEqual(len(out) + resolver.errors, 500)
+        self.assertEqual(sum(entry["count"] for entry in errors.summary()), resolver.errors)
+
+
+if __name__ == "__main__":
+    unittest.main()